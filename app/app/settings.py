@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
@@ -48,6 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TracingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SQLStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -92,6 +97,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Cached recipe, tag and ingredient list responses
+RECIPE_CACHE_ALIAS = 'default'
+# The response cache needs a backend shared by all workers; allow the
+# process-local default only when the API runs in a single process.
+RECIPE_CACHE_ALLOW_LOCAL = bool(
+    int(os.environ.get('RECIPE_CACHE_ALLOW_LOCAL', 0))
+)
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+
+# Text search configuration of the recipe full-text search vector
+RECIPE_SEARCH_CONFIG = 'english'
+
+# Serialize recipe lists from values() rows instead of model instances.
+RECIPE_FAST_LIST = bool(int(os.environ.get('RECIPE_FAST_LIST', 0)))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -134,6 +168,14 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = BASE_DIR / 'vol/web/static'
 MEDIA_ROOT = BASE_DIR / 'vol/web/media'
 
+# Recipe image processing worker pool
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+# Process uploads inline after commit instead of in the worker pool.
+RECIPE_IMAGE_PROCESS_EAGER = False
+# Images pending or processing for longer are requeued by the
+# requeue_recipe_images command.
+RECIPE_IMAGE_STALE_MINUTES = 15
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -146,8 +188,95 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # 'rest_framework.authentication.BasicAuthenticatison',
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'user.authentication.CachedTokenAuthentication',
+    ],
+    # Keyset pagination is opt-in per request via `cursor`/`page_size`.
+    'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 100,
+    # orjson for JSON, MessagePack via `Accept`/`Content-Type`.
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'TEST_REQUEST_RENDERER_CLASSES': [
+        'rest_framework.renderers.MultiPartRenderer',
+        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
+}
+
+# Clients allowed to scrape /internal/metrics/
+INTERNAL_IPS = os.environ.get('INTERNAL_IPS', '127.0.0.1').split(',')
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                           2.5, 5.0, 10.0)
+
+# Statements slower than this are written to the SQL slow log
+SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+# Recent durations kept per fingerprint for percentiles
+SQL_STATS_SAMPLES = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        # Slow log records are JSON objects, one per line.
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'sql_slow_log': {
+            'class': 'logging.FileHandler',
+            'filename': os.environ['SQL_SLOW_LOG'],
+            'formatter': 'message',
+        } if os.environ.get('SQL_SLOW_LOG') else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.sqlstats': {
+            'handlers': ['sql_slow_log'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Staff requests sending this header are profiled (core.profiling)
+REQUEST_PROFILE_HEADER = 'X-Profile'
+REQUEST_PROFILE_KEEP = 100
+
+# Request tracing (core.tracing): traces of requests slower than
+# TRACE_SLOW_MS, failing with a server error or drawn at TRACE_SAMPLE_RATE
+# are appended to TRACE_EXPORT_FILE as OTLP/JSON lines. Server-Timing is
+# only sent to staff users and INTERNAL_IPS unless TRACE_SERVER_TIMING is on.
+TRACE_SERVER_TIMING = bool(int(os.environ.get('TRACE_SERVER_TIMING', 0)))
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', 500))
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+TRACE_EXPORT_FILE = os.environ.get('TRACE_EXPORT_FILE') or None
+TRACE_MAX_SPANS = 1000
+
+# Token -> user lookup cache of user.authentication. Without a shared
+# cache, revoking a token only reaches the process that handled it, so
+# the cache is off unless SHARED_CACHE_ALIAS is set or ALLOW_LOCAL says
+# the API runs in a single process.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    # Set to a CACHES alias to share lookups between processes.
+    'SHARED_CACHE_ALIAS': os.environ.get('TOKEN_AUTH_SHARED_CACHE') or None,
+    'SHARED_TTL': 300,
+    'ALLOW_LOCAL': bool(
+        int(os.environ.get('TOKEN_AUTH_CACHE_ALLOW_LOCAL', 0))
+    ),
 }
 
 # spectacular configurations
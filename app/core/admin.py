@@ -3,6 +3,9 @@ Django admin customization
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import Http404, HttpResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from . import models
 
@@ -43,3 +46,49 @@ class UserAdmin(BaseUserAdmin):
 admin.site.register(models.Recipe)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.ImageBlob)
+admin.site.register(models.ImportCheckpoint)
+
+
+@admin.register(models.RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Define the admin pages for request profiles"""
+    list_display = ['created_at', 'method', 'path', 'status_code',
+                    'duration_ms', 'query_count', 'query_ms', 'user',
+                    'download_link']
+    list_filter = ['method', 'status_code']
+    search_fields = ['path']
+    exclude = ['stats']
+    readonly_fields = ['user', 'method', 'path', 'status_code',
+                       'duration_ms', 'query_count', 'query_ms', 'queries',
+                       'report', 'created_at', 'download_link']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/',
+                 self.admin_site.admin_view(self.download),
+                 name='core_requestprofile_download'),
+        ] + super().get_urls()
+
+    @admin.display(description=_('pstats'))
+    def download_link(self, obj):
+        url = reverse('admin:core_requestprofile_download', args=(obj.pk,))
+        return format_html('<a href="{}">{}</a>', url, _('Download'))
+
+    def download(self, request, pk):
+        """Return the profile as a `.prof` file for pstats or snakeviz."""
+        profile = self.get_object(request, str(pk))
+        if profile is None or not self.has_view_permission(request, profile):
+            raise Http404
+        response = HttpResponse(bytes(profile.stats),
+                                content_type='application/octet-stream')
+        response['Content-Disposition'] = (
+            f'attachment; filename="request-profile-{profile.pk}.prof"'
+        )
+        return response
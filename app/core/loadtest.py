@@ -0,0 +1,469 @@
+"""
+In-process load driver for the recipe and user APIs.
+
+Each worker thread holds a `Session`: an API client authenticated as one
+of the users of the dataset. Workers draw route names from a shared,
+weighted schedule in which every route appears at least once per cycle,
+prepare the request (creating anything it consumes, unmeasured) and then
+time the request, counting the database queries it runs.
+"""
+import hashlib
+import io
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+
+DEFAULT_PASSWORD = 'seed-pass-1234'
+SEARCH_WORDS = ('chicken', 'lemon', 'rice', 'tomato', 'garlic')
+
+# Route name, Session method and relative weight in the schedule.
+ROUTES = (
+    ('recipe-list', 'recipe_list', 10),
+    ('recipe-list-filtered', 'recipe_list_filtered', 4),
+    ('recipe-list-search', 'recipe_list_search', 3),
+    ('recipe-list-sparse', 'recipe_list_sparse', 2),
+    ('recipe-detail', 'recipe_detail', 10),
+    ('recipe-create', 'recipe_create', 2),
+    ('recipe-update', 'recipe_update', 2),
+    ('recipe-delete', 'recipe_delete', 1),
+    ('recipe-facets', 'recipe_facets', 2),
+    ('recipe-export', 'recipe_export', 1),
+    ('recipe-bulk', 'recipe_bulk', 1),
+    ('recipe-upload-image', 'recipe_upload_image', 1),
+    ('recipe-image-precheck', 'recipe_image_precheck', 1),
+    ('tag-list', 'tag_list', 3),
+    ('tag-autocomplete', 'tag_autocomplete', 3),
+    ('tag-update', 'tag_update', 1),
+    ('tag-delete', 'tag_delete', 1),
+    ('ingredient-list', 'ingredient_list', 3),
+    ('ingredient-autocomplete', 'ingredient_autocomplete', 3),
+    ('ingredient-update', 'ingredient_update', 1),
+    ('ingredient-delete', 'ingredient_delete', 1),
+    ('user-create', 'user_create', 1),
+    ('user-token-create', 'token_create', 1),
+    ('user-token-discard', 'token_discard', 1),
+    ('user-token-cache-stats', 'token_cache_stats', 1),
+    ('user-me', 'me', 3),
+    ('user-me-update', 'me_update', 1),
+)
+ROUTE_NAMES = tuple(name for name, _, _ in ROUTES)
+
+Call = namedtuple('Call', 'method path data format client expect',
+                  defaults=(None, None, None, (200,)))
+Result = namedtuple('Result', 'route seconds status queries ok')
+
+
+def make_image():
+    """Return the bytes and SHA-256 of a small PNG to upload."""
+    file = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 80, 40)).save(file, format='PNG')
+    content = file.getvalue()
+    return content, hashlib.sha256(content).hexdigest()
+
+
+def percentile(values, p):
+    """Return the nearest-rank `p`th percentile of sorted `values`."""
+    if not values:
+        return None
+    rank = max(int(round(p / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(results, elapsed):
+    """Return the throughput, latency and query summary of `results`."""
+    latencies = sorted(result.seconds * 1000 for result in results)
+    queries = [result.queries for result in results]
+    return {
+        'requests': len(results),
+        'errors': sum(not result.ok for result in results),
+        'rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': (round(sum(latencies) / len(latencies), 3)
+                     if latencies else None),
+            **{
+                f'p{p}': (round(percentile(latencies, p), 3)
+                          if latencies else None)
+                for p in (50, 95, 99)
+            },
+            'max': round(latencies[-1], 3) if latencies else None,
+        },
+        'queries': {
+            'mean': (round(sum(queries) / len(queries), 2)
+                     if queries else None),
+            'max': max(queries) if queries else None,
+        },
+    }
+
+
+class Session:
+    """A worker's authenticated client and the objects it works on."""
+
+    def __init__(self, run, user, staff, password, host, seed):
+        self.run = run
+        self.user = user
+        self.password = password
+        self.rng = random.Random(seed)
+        self.host = host
+        self.client = self.make_client(user)
+        self.staff_client = self.make_client(staff)
+        self.anonymous = self.make_client()
+        self.created = []
+        self.scratch = self.scratch_recipe()
+        self.image_sha256 = None
+        self.recipes = list(Recipe.objects.filter(user=user).values_list(
+            'id', flat=True
+        )[:1000])
+        self.tags = list(Tag.objects.filter(user=user).values_list(
+            'id', 'name'
+        )[:1000])
+        self.ingredients = list(Ingredient.objects.filter(
+            user=user
+        ).values_list('id', 'name')[:1000])
+
+    def make_client(self, user=None):
+        """Return a client authenticated with the token of `user`."""
+        client = APIClient(raise_request_exception=False,
+                           SERVER_NAME=self.host)
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def scratch_recipe(self):
+        """Create a recipe the run may change and delete."""
+        recipe = Recipe.objects.create(user=self.user, title='Load test',
+                                       time_minutes=5, price='1.00')
+        self.created.append(recipe.pk)
+        return recipe
+
+    def make_upload(self):
+        """Return the image file to upload."""
+        content, self.upload_sha256 = make_image()
+        file = io.BytesIO(content)
+        file.name = 'loadtest.png'
+        return file
+
+    def make_email(self):
+        """Return an unused email for a user created by this run."""
+        return f'loadtest-{self.run}-{uuid.uuid4().hex[:12]}@example.com'
+
+    def request(self, call):
+        """Send `call` and return its response with the body read."""
+        client = call.client or self.client
+        response = getattr(client, call.method)(
+            call.path, call.data, format=call.format
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def recipe_list(self):
+        return Call('get', reverse('recipe:recipe-list'))
+
+    def recipe_list_filtered(self):
+        if not self.tags:
+            return self.recipe_list()
+        tag_id, _ = self.rng.choice(self.tags)
+        return Call('get', reverse('recipe:recipe-list'),
+                    {'tags_in': tag_id})
+
+    def recipe_list_search(self):
+        return Call('get', reverse('recipe:recipe-list'),
+                    {'search': self.rng.choice(SEARCH_WORDS)})
+
+    def recipe_list_sparse(self):
+        return Call('get', reverse('recipe:recipe-list'),
+                    {'fields': 'id,title,price'})
+
+    def recipe_detail(self):
+        return Call('get', reverse('recipe:recipe-detail',
+                                   args=(self.rng.choice(self.recipes),)))
+
+    def recipe_payload(self):
+        """Return a recipe payload reusing the user's names."""
+        return {
+            'title': f'Load test {self.rng.randint(1, 10 ** 6)}',
+            'time_minutes': self.rng.randint(5, 120),
+            'price': f'{self.rng.uniform(1, 50):.2f}',
+            'tags': [{'name': name} for _, name in self.rng.sample(
+                self.tags, min(len(self.tags), 2)
+            )],
+            'ingredients': [{'name': name} for _, name in self.rng.sample(
+                self.ingredients, min(len(self.ingredients), 4)
+            )],
+        }
+
+    def recipe_create(self):
+        return Call('post', reverse('recipe:recipe-list'),
+                    self.recipe_payload(), 'json', expect=(201,))
+
+    def recipe_update(self):
+        return Call('patch', reverse('recipe:recipe-detail',
+                                     args=(self.scratch.pk,)),
+                    {'time_minutes': self.rng.randint(5, 120)}, 'json')
+
+    def recipe_delete(self):
+        pk = self.scratch_recipe().pk
+        self.created.remove(pk)
+        return Call('delete', reverse('recipe:recipe-detail', args=(pk,)),
+                    expect=(204,))
+
+    def recipe_facets(self):
+        return Call('get', reverse('recipe:recipe-facets'))
+
+    def recipe_export(self):
+        return Call('get', reverse('recipe:recipe-export'))
+
+    def recipe_bulk(self):
+        items = [self.recipe_payload() for _ in range(5)]
+        return Call('post', reverse('recipe:recipe-bulk'), items, 'json')
+
+    def recipe_upload_image(self):
+        return Call('post', reverse('recipe:recipe-upload-image',
+                                    args=(self.scratch.pk,)),
+                    {'image': self.make_upload()}, 'multipart')
+
+    def recipe_image_precheck(self):
+        # Unknown until an upload of this session has been processed.
+        sha256 = self.image_sha256 or '0' * 64
+        return Call('post', reverse('recipe:recipe-image-precheck',
+                                    args=(self.scratch.pk,)),
+                    {'sha256': sha256}, 'json', expect=(200, 404))
+
+    def attr_list(self, basename):
+        return Call('get', reverse(f'recipe:{basename}-list'))
+
+    def attr_autocomplete(self, basename, objects):
+        _, name = self.rng.choice(objects) if objects else (None, 'a')
+        return Call('get', reverse(f'recipe:{basename}-list'),
+                    {'q': name[:3]})
+
+    def attr_update(self, basename, objects):
+        if not objects:
+            return self.attr_list(basename)
+        pk, name = self.rng.choice(objects)
+        return Call('patch', reverse(f'recipe:{basename}-detail',
+                                     args=(pk,)),
+                    {'name': name}, 'json')
+
+    def attr_delete(self, basename, model):
+        obj = model.objects.create(user=self.user,
+                                   name=f'loadtest {uuid.uuid4().hex}')
+        return Call('delete', reverse(f'recipe:{basename}-detail',
+                                      args=(obj.pk,)),
+                    expect=(204,))
+
+    def tag_list(self):
+        return self.attr_list('tag')
+
+    def tag_autocomplete(self):
+        return self.attr_autocomplete('tag', self.tags)
+
+    def tag_update(self):
+        return self.attr_update('tag', self.tags)
+
+    def tag_delete(self):
+        return self.attr_delete('tag', Tag)
+
+    def ingredient_list(self):
+        return self.attr_list('ingredient')
+
+    def ingredient_autocomplete(self):
+        return self.attr_autocomplete('ingredient', self.ingredients)
+
+    def ingredient_update(self):
+        return self.attr_update('ingredient', self.ingredients)
+
+    def ingredient_delete(self):
+        return self.attr_delete('ingredient', Ingredient)
+
+    def user_create(self):
+        return Call('post', reverse('user:create'), {
+            'email': self.make_email(),
+            'password': 'loadtest-pass-1234',
+            'name': 'Load test',
+        }, 'json', self.anonymous, expect=(201,))
+
+    def token_create(self):
+        return Call('post', reverse('user:token-create'), {
+            'email': self.user.email,
+            'password': self.password,
+        }, 'json', self.anonymous)
+
+    def token_discard(self):
+        user = get_user_model().objects.create_user(
+            self.make_email(), None
+        )
+        return Call('post', reverse('user:token-discard'),
+                    client=self.make_client(user), expect=(204,))
+
+    def token_cache_stats(self):
+        return Call('get', reverse('user:token-cache-stats'),
+                    client=self.staff_client)
+
+    def me(self):
+        return Call('get', reverse('user:me'))
+
+    def me_update(self):
+        return Call('patch', reverse('user:me'), {'name': self.user.name},
+                    'json')
+
+    def run_route(self, name, method):
+        """Prepare and send one request of route `name`."""
+        call = getattr(self, method)()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = self.request(call)
+            seconds = time.perf_counter() - start
+        self.after(name, response)
+        return Result(name, seconds, response.status_code,
+                      len(ctx.captured_queries),
+                      response.status_code in call.expect)
+
+    def after(self, name, response):
+        """Remember what a request created for later requests."""
+        # A partly applied bulk batch (207) created recipes too.
+        if response.status_code >= 300 and response.status_code != 207:
+            return
+        if name == 'recipe-create':
+            self.created.append(response.data['id'])
+        elif name == 'recipe-bulk':
+            self.created.extend(item['id'] for item in response.data
+                                if item.get('status') == 'created')
+        elif name == 'recipe-upload-image':
+            self.image_sha256 = self.upload_sha256
+
+    def close(self):
+        """Delete the recipes this session created."""
+        Recipe.objects.filter(pk__in=self.created).delete()
+
+
+class LoadTest:
+    """
+    Drive `concurrency` sessions through the weighted route schedule.
+
+    The run stops after `requests` requests or `duration` seconds,
+    whichever comes first. Users it creates are deleted in `cleanup()`.
+    """
+
+    def __init__(self, users, concurrency=4, requests=None, duration=None,
+                 routes=None, password=DEFAULT_PASSWORD, host='localhost',
+                 seed=0):
+        if not users:
+            raise ValueError('At least one user is required.')
+        if requests is None and duration is None:
+            raise ValueError('Give a number of requests or a duration.')
+        self.users = users
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.routes = [
+            route for route in ROUTES if routes is None or route[0] in routes
+        ]
+        self.password = password
+        self.host = host
+        self.seed = seed
+        self.run_id = uuid.uuid4().hex[:8]
+        self._counter = count()
+        self._lock = threading.Lock()
+        self._schedule = self.iter_schedule()
+        self._deadline = None
+
+    def iter_schedule(self):
+        """Yield route names forever, every route once per cycle or more."""
+        rng = random.Random(self.seed)
+        cycle = [(name, method) for name, method, weight in self.routes
+                 for _ in range(weight)]
+        while True:
+            rng.shuffle(cycle)
+            yield from cycle
+
+    def next_route(self):
+        """Return the next scheduled route, or None when the run is over."""
+        with self._lock:
+            if self.requests is not None and \
+                    next(self._counter) >= self.requests:
+                return None
+            if self._deadline is not None and \
+                    time.monotonic() >= self._deadline:
+                return None
+            return next(self._schedule)
+
+    def run(self):
+        """Run the load test and return the summary of its requests."""
+        User = get_user_model()
+        self.staff = User.objects.create_user(
+            f'loadtest-{self.run_id}-staff@example.com', None, is_staff=True
+        )
+        if self.duration is not None:
+            self._deadline = time.monotonic() + self.duration
+        start = time.perf_counter()
+        if self.concurrency == 1:
+            # In the calling thread, so test transactions see its writes.
+            results = self.work(0)
+        else:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                results = [
+                    result for worker in executor.map(
+                        self.work, range(self.concurrency)
+                    ) for result in worker
+                ]
+        elapsed = time.perf_counter() - start
+        return {
+            'total': summarize(results, elapsed),
+            'routes': {
+                name: summarize(
+                    [result for result in results if result.route == name],
+                    elapsed
+                )
+                for name, _, _ in self.routes
+            },
+            'statuses': self.count_statuses(results),
+        }
+
+    def work(self, index):
+        """Send requests from one session until the run is over."""
+        session = Session(
+            self.run_id, self.users[index % len(self.users)], self.staff,
+            self.password, self.host, self.seed + index
+        )
+        results = []
+        try:
+            while True:
+                route = self.next_route()
+                if route is None:
+                    return results
+                results.append(session.run_route(*route))
+        finally:
+            session.close()
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    @staticmethod
+    def count_statuses(results):
+        """Return `{route: {status: count}}` of the unexpected statuses."""
+        statuses = {}
+        for result in results:
+            if not result.ok:
+                route = statuses.setdefault(result.route, {})
+                route[str(result.status)] = route.get(str(result.status),
+                                                      0) + 1
+        return statuses
+
+    def cleanup(self):
+        """Delete the users created by the run, with their objects."""
+        get_user_model().objects.filter(
+            email__startswith=f'loadtest-{self.run_id}-'
+        ).delete()
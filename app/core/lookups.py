@@ -0,0 +1,22 @@
+"""
+Custom lookups for model queries.
+"""
+from django.db.models import CharField
+from django.db.models.lookups import IStartsWith
+
+
+@CharField.register_lookup
+class TrigramPrefix(IStartsWith):
+    """
+    Case-insensitive prefix match written as `ILIKE 'value%'`.
+
+    Unlike `istartswith`, which compares `UPPER()` of both sides, this can
+    be served by a `gin_trgm_ops` index on the column.
+    """
+    lookup_name = 'trigram_prefix'
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(rhs_params)
+        return f'{lhs_sql} ILIKE {rhs_sql}', params
@@ -0,0 +1,109 @@
+"""
+Django command to compare the regular and fast recipe list serializers.
+"""
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from core.models import Recipe, Tag, Ingredient
+from recipe.fastpath import FastListSerializer
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to benchmark serializing the recipe list."""
+    help = "time the recipe list serializer against the fast path."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1000,
+            help='Recipes in the benchmark list.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per path; the fastest one is reported.'
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        # The data is written in a transaction that is always rolled back.
+        with transaction.atomic():
+            self.create_data(options['recipes'])
+            request = APIRequestFactory().get('/api/recipe/recipes/')
+            context = {'request': request}
+            queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+            def serialize():
+                recipes = queryset.prefetch_related(
+                    Prefetch('tags', queryset=Tag.objects.order_by('pk')),
+                    Prefetch('ingredients',
+                             queryset=Ingredient.objects.order_by('pk'))
+                )
+                data = RecipeSerializer(recipes, many=True,
+                                        context=context).data
+                return JSONRenderer().render(data)
+
+            def fast_serialize():
+                fast = FastListSerializer(RecipeSerializer(context=context))
+                rows = fast.get_values(queryset)
+                return JSONRenderer().render(fast.to_representation(rows))
+
+            slow, slow_body = self.time(serialize, options['repeat'])
+            fast, fast_body = self.time(fast_serialize, options['repeat'])
+            transaction.set_rollback(True)
+
+        if fast_body != slow_body:
+            raise CommandError('The fast path output differs.')
+        self.stdout.write(f'serializer: {slow * 1000:.1f} ms')
+        self.stdout.write(f'fast path: {fast * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'speedup: {slow / fast:.1f}x'))
+
+    def create_data(self, count):
+        """Create a throwaway user with `count` tagged recipes."""
+        self.user = get_user_model().objects.create_user(
+            email='benchmark@example.com',
+            password='benchmark'
+        )
+        tags = Tag.objects.bulk_create([
+            Tag(user=self.user, name=f'Tag {n}') for n in range(20)
+        ])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(user=self.user, name=f'Ingredient {n}')
+            for n in range(50)
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'Recipe {n}', time_minutes=n % 90,
+                   price=Decimal(n % 5000) / 100,
+                   link=f'http://example.com/{n}')
+            for n in range(count)
+        ])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk,
+                                tag_id=tags[(n + i) % len(tags)].pk)
+            for n, recipe in enumerate(recipes) for i in range(3)
+        ])
+        Recipe.ingredients.through.objects.bulk_create([
+            Recipe.ingredients.through(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredients[(n + i) % len(ingredients)].pk
+            )
+            for n, recipe in enumerate(recipes) for i in range(5)
+        ])
+
+    def time(self, func, repeat):
+        """Return the fastest of `repeat` runs of `func` and its result."""
+        best, result = None, None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
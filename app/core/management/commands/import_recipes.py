@@ -0,0 +1,334 @@
+"""
+Django command to bulk import recipes from NDJSON or CSV files.
+"""
+import csv
+import io
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from core.models import ImportCheckpoint, Recipe, Tag, Ingredient
+from recipe.serializers import get_or_create_named
+from recipe.signals import invalidate_user_cache
+
+RECIPE_FIELDS = ('title', 'description', 'time_minutes', 'price', 'link')
+RELATIONS = (('tags', Tag), ('ingredients', Ingredient))
+# Nested names in CSV cells, as written by the CSV export.
+NAME_SEPARATOR = '|'
+
+
+def read_ndjson(file):
+    """Yield one record per non-empty line, None for invalid JSON."""
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def read_csv(file):
+    """Yield one record per CSV row."""
+    yield from csv.DictReader(file)
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def parse_names(value):
+    """Return the unique names of a list, `{'name': ...}` list or cell."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(NAME_SEPARATOR)
+    names = (
+        item.get('name') if isinstance(item, dict) else item
+        for item in value
+    )
+    return list(dict.fromkeys(
+        str(name).strip() for name in names
+        if name is not None and str(name).strip()
+    ))
+
+
+def copy_value(value):
+    """Return `value` in the text format of Postgres `COPY`."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+class Command(BaseCommand):
+    """Django command to import recipes with their tags and ingredients."""
+    help = "bulk import recipes from an NDJSON or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON or CSV file to import.')
+        parser.add_argument(
+            '--user',
+            help='Email of the owner of records without a `user` field.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Input format; guessed from the file extension by default.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Records imported per transaction.'
+        )
+        parser.add_argument(
+            '--method',
+            choices=('copy', 'bulk'),
+            default='copy',
+            help='Load rows with COPY or with bulk_create().'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint name; defaults to the absolute file path.'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and import from the first record.'
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        reader = READERS[options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson'
+        )]
+        self.use_copy = (options['method'] == 'copy' and
+                         connection.vendor == 'postgresql')
+        self.users = {}
+        self.named = {}
+        self.valid_names = {}
+        self.default_user = None
+        if options['user']:
+            self.default_user = self.get_user(options['user'])
+            if self.default_user is None:
+                raise CommandError(f'Unknown user: {options["user"]}')
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            name=options['checkpoint'] or os.path.abspath(path)
+        )
+        if options['restart']:
+            checkpoint.position = 0
+            checkpoint.save()
+
+        position = checkpoint.position
+        imported = skipped = 0
+        start = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as file:
+            records = reader(file)
+            if position:
+                self.stdout.write(f'Resuming after record {position}')
+                for _ in islice(records, position):
+                    pass
+
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                # The checkpoint commits with the rows it accounts for.
+                with transaction.atomic():
+                    count = self.import_chunk(chunk, position)
+                    position += len(chunk)
+                    ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                        position=position
+                    )
+                imported += count
+                skipped += len(chunk) - count
+                self.report(position, imported, skipped, start)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {imported} recipes imported, {skipped} skipped, '
+            f'{self.rate(imported, start):.0f} rows/s'
+        ))
+
+    def rate(self, count, start):
+        """Return the rows per second imported since `start`."""
+        return count / max(time.monotonic() - start, 1e-9)
+
+    def report(self, position, imported, skipped, start):
+        """Write the progress line of a committed chunk."""
+        self.stdout.write(
+            f'{position} records read, {imported} imported, '
+            f'{skipped} skipped, {self.rate(imported, start):.0f} rows/s'
+        )
+
+    def get_user(self, email):
+        """Return the user with `email` or None, cached for the import."""
+        if email not in self.users:
+            self.users[email] = get_user_model().objects.filter(
+                email=email
+            ).first()
+        return self.users[email]
+
+    def build_recipe(self, record):
+        """Return the column values and related names of a record."""
+        if not isinstance(record, dict):
+            raise ValidationError('Expected a JSON object.')
+        email = record.get('user')
+        user = self.get_user(email) if email else self.default_user
+        if user is None:
+            raise ValidationError({'user': [
+                'Unknown user.' if email else 'No user given.'
+            ]})
+
+        values = {'user_id': user.pk}
+        errors = {}
+        for name in RECIPE_FIELDS:
+            field = Recipe._meta.get_field(name)
+            value = record.get(name)
+            if value is None:
+                value = field.get_default()
+            elif isinstance(value, float):
+                # A float's repr keeps the decimal places the source had.
+                value = repr(value)
+            try:
+                values[field.attname] = field.clean(value, None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+
+        related = {}
+        for name, model in RELATIONS:
+            related[name] = parse_names(record.get(name))
+            try:
+                self.validate_names(model, related[name])
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return values, related
+
+    def validate_names(self, model, names):
+        """Validate names not seen earlier in the import."""
+        valid = self.valid_names.setdefault(model, set())
+        field = model._meta.get_field('name')
+        for name in names:
+            if name not in valid:
+                field.clean(name, None)
+                valid.add(name)
+
+    def import_chunk(self, records, offset):
+        """Load the valid `records` and return how many were imported."""
+        built = []
+        for number, record in enumerate(records, start=offset + 1):
+            try:
+                built.append(self.build_recipe(record))
+            except ValidationError as exc:
+                errors = (exc.message_dict if hasattr(exc, 'error_dict')
+                          else exc.messages)
+                self.stderr.write(f'Record {number} skipped: {errors}')
+        if not built:
+            return 0
+
+        pks = self.save_recipes([values for values, _ in built])
+        for name, model in RELATIONS:
+            rows = set()
+            for pk, (values, related) in zip(pks, built):
+                objects = self.get_named(model, values['user_id'],
+                                         related[name])
+                rows.update((pk, objects[item]) for item in related[name])
+            through = getattr(Recipe, name).through
+            self.save_links(through, f'{model._meta.model_name}_id',
+                            sorted(rows))
+            # COPY bypasses the signals that keep these up to date.
+            model.objects.add_recipe_counts(Counter(pk for _, pk in rows))
+
+        Recipe.objects.filter(pk__in=pks).update_search_vector()
+        for user_id in {values['user_id'] for values, _ in built}:
+            invalidate_user_cache(user_id)
+        return len(pks)
+
+    def get_named(self, model, user_id, names):
+        """Return `{name: pk}` of the user's `model` objects, creating them."""
+        known = self.named.setdefault((model, user_id), {})
+        missing = [name for name in names if name not in known]
+        if missing:
+            user = get_user_model()(pk=user_id)
+            objects = get_or_create_named(model, user, missing)
+            known.update((name, obj.pk) for name, obj in objects.items())
+        return known
+
+    def save_recipes(self, rows):
+        """Insert recipes from column values and return their ids."""
+        if not self.use_copy:
+            recipes = Recipe.objects.bulk_create(
+                [Recipe(**values) for values in rows], batch_size=1000
+            )
+            return [recipe.pk for recipe in recipes]
+
+        table = Recipe._meta.db_table
+        with connection.cursor() as cursor:
+            # COPY returns no ids, so reserve them from the sequence.
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [table, Recipe._meta.pk.column, len(rows)]
+            )
+            pks = [pk for pk, in cursor.fetchall()]
+
+        # Columns not in the input hold the same defaults on every row.
+        fields = Recipe._meta.concrete_fields
+        template = Recipe()
+        defaults = {
+            field.attname: copy_value(
+                field.get_prep_value(field.pre_save(template, True))
+            )
+            for field in fields
+        }
+        buffer = io.StringIO()
+        for pk, values in zip(pks, rows):
+            values[Recipe._meta.pk.attname] = pk
+            buffer.write('\t'.join(
+                copy_value(values[field.attname])
+                if field.attname in values else defaults[field.attname]
+                for field in fields
+            ) + '\n')
+        self.copy(table, [field.column for field in fields], buffer)
+        return pks
+
+    def save_links(self, through, column, rows):
+        """Insert the `(recipe_id, column)` through rows."""
+        if not self.use_copy:
+            through.objects.bulk_create(
+                [through(recipe_id=pk, **{column: obj_pk})
+                 for pk, obj_pk in rows],
+                batch_size=1000
+            )
+            return
+
+        buffer = io.StringIO()
+        for pk, obj_pk in rows:
+            buffer.write(f'{pk}\t{obj_pk}\n')
+        self.copy(through._meta.db_table, ['recipe_id', column], buffer)
+
+    def copy(self, table, columns, buffer):
+        """Load the rows in `buffer` into `table` with COPY."""
+        buffer.seek(0)
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {quote(table)} '
+                f'({", ".join(quote(column) for column in columns)}) '
+                f'FROM STDIN',
+                buffer
+            )
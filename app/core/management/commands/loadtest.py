@@ -0,0 +1,108 @@
+"""
+Django command to load test the recipe and user APIs in-process.
+"""
+import json
+import subprocess
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.loadtest import DEFAULT_PASSWORD, ROUTE_NAMES, LoadTest
+from core.models import Recipe, Tag, Ingredient
+
+
+def get_commit():
+    """Return the git commit of the code under test, if known."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to report API throughput and latency as JSON."""
+    help = "load test every recipe and user route and report as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Run as the users seeded by seed_dataset with this prefix.'
+        )
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='Total requests; defaults to 1000 without --duration.'
+        )
+        parser.add_argument('--duration', type=float,
+                            help='Seconds to run for.')
+        parser.add_argument(
+            '--routes',
+            nargs='+',
+            choices=ROUTE_NAMES,
+            metavar='ROUTE',
+            help='Only load these routes.'
+        )
+        parser.add_argument('--host', default='localhost',
+                            help='Host header of the requests.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report to a file.')
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        users = list(get_user_model().objects.filter(
+            email__startswith=options['prefix'],
+            email__endswith='@example.com',
+        ).order_by('pk')[:options['concurrency']])
+        if not users:
+            raise CommandError(
+                f'No users with the prefix {options["prefix"]!r}; '
+                f'run seed_dataset first.'
+            )
+        requests = options['requests']
+        if requests is None and options['duration'] is None:
+            requests = 1000
+
+        load_test = LoadTest(
+            users,
+            concurrency=options['concurrency'],
+            requests=requests,
+            duration=options['duration'],
+            routes=options['routes'],
+            password=options['password'],
+            host=options['host'],
+            seed=options['seed'],
+        )
+        started_at = timezone.now()
+        try:
+            summary = load_test.run()
+        finally:
+            load_test.cleanup()
+
+        report = {
+            'commit': get_commit(),
+            'started_at': started_at.isoformat(),
+            'options': {
+                name: options[name] for name in (
+                    'prefix', 'concurrency', 'duration', 'routes', 'seed'
+                )
+            },
+            'dataset': {
+                'users': get_user_model().objects.count(),
+                'recipes': Recipe.objects.count(),
+                'tags': Tag.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            **summary,
+        }
+        report['options']['requests'] = requests
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,49 @@
+"""
+Django command to fix drifted tag and ingredient recipe counts.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Tag, Ingredient
+from recipe.signals import invalidate_user_cache
+
+
+class Command(BaseCommand):
+    """Django command to recount the recipes of tags and ingredients."""
+    help = "recount recipes per tag and ingredient and fix drifted counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the drifted counts.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Objects fixed per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            drifted = list(
+                model.objects.drifted().values_list('pk', 'user_id')
+            )
+            name = model._meta.verbose_name_plural
+            if options['dry_run']:
+                self.stdout.write(f'{name}: {len(drifted)} drifted')
+                continue
+
+            for start in range(0, len(drifted), batch_size):
+                batch = drifted[start:start + batch_size]
+                with transaction.atomic():
+                    model.objects.filter(
+                        pk__in=[pk for pk, _ in batch]
+                    ).update_recipe_count()
+                    for user_id in {user_id for _, user_id in batch}:
+                        invalidate_user_cache(user_id)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {len(drifted)} fixed'
+            ))
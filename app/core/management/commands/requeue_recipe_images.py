@@ -0,0 +1,32 @@
+"""
+Django command to process recipe images whose jobs were lost.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipe.images import process_recipe_image, requeue_stale_images
+
+
+class Command(BaseCommand):
+    """Django command to process images stuck pending or processing."""
+    help = "process recipe images left pending or processing by a restart."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=float,
+            default=getattr(settings, 'RECIPE_IMAGE_STALE_MINUTES', 15),
+            help='Minutes an image must have kept its status.'
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        # Processed here rather than in the worker pool of a process
+        # about to exit.
+        ids = requeue_stale_images(
+            timedelta(minutes=options['older_than']),
+            enqueue=process_recipe_image
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids)} stale images processed'
+        ))
@@ -0,0 +1,166 @@
+"""
+Django command to seed a synthetic dataset for load testing.
+"""
+import json
+import os
+import random
+import tempfile
+from itertools import accumulate
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from core.loadtest import DEFAULT_PASSWORD
+from core.models import ImportCheckpoint
+
+WORDS = (
+    'apple', 'basil', 'bean', 'beef', 'butter', 'carrot', 'cheese',
+    'chicken', 'chili', 'cinnamon', 'coconut', 'corn', 'cream', 'cumin',
+    'curry', 'egg', 'garlic', 'ginger', 'honey', 'lemon', 'lentil', 'lime',
+    'mango', 'mint', 'mushroom', 'noodle', 'oat', 'olive', 'onion',
+    'orange', 'paprika', 'pasta', 'pea', 'pepper', 'pork', 'potato',
+    'rice', 'salmon', 'sesame', 'spinach', 'tofu', 'tomato', 'vanilla',
+)
+DISTRIBUTIONS = ('fixed', 'uniform', 'zipf')
+
+
+def make_vocabulary(rng, size):
+    """Return `size` distinct names built from food words."""
+    names = list(WORDS[:size])
+    while len(names) < size:
+        names.append(f'{rng.choice(WORDS)} {rng.choice(WORDS)} {len(names)}')
+    rng.shuffle(names)
+    return names
+
+
+def zipf_weights(size):
+    """Return cumulative 1/rank weights, so early items are most common."""
+    return list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+def sample_count(rng, distribution, maximum):
+    """Return a fan-out between 0 and `maximum` from `distribution`."""
+    if distribution == 'fixed' or maximum == 0:
+        return maximum
+    if distribution == 'uniform':
+        return rng.randint(0, maximum)
+    return rng.choices(range(1, maximum + 1),
+                       cum_weights=zipf_weights(maximum))[0]
+
+
+class Command(BaseCommand):
+    """Django command to create users with generated recipes."""
+    help = "seed users, recipes, tags and ingredients for load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes-per-user', type=int, default=100)
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=30,
+            help='Tag vocabulary size per user.'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=100,
+            help='Ingredient vocabulary size per user.'
+        )
+        parser.add_argument('--max-tags-per-recipe', type=int, default=4)
+        parser.add_argument('--max-ingredients-per-recipe', type=int,
+                            default=10)
+        parser.add_argument(
+            '--fanout',
+            choices=DISTRIBUTIONS,
+            default='uniform',
+            help='Distribution of tags and ingredients per recipe.'
+        )
+        parser.add_argument(
+            '--popularity',
+            choices=('uniform', 'zipf'),
+            default='zipf',
+            help='Distribution of names picked from the vocabularies.'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Seeded users are <prefix><n>@example.com.'
+        )
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed, for reproducible datasets.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        User = get_user_model()
+        prefix = options['prefix']
+        if User.objects.filter(email__startswith=prefix,
+                               email__endswith='@example.com').exists():
+            raise CommandError(f'Users with the prefix {prefix!r} exist.')
+
+        rng = random.Random(options['seed'])
+        # Hashing once keeps seeding fast; every user gets the same hash.
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([
+            User(email=f'{prefix}{n}@example.com', name=f'Seed user {n}',
+                 password=password)
+            for n in range(options['users'])
+        ])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dataset.ndjson')
+            with open(path, 'w', encoding='utf-8') as file:
+                for user in users:
+                    for record in self.generate(rng, user, options):
+                        file.write(json.dumps(record) + '\n')
+
+            checkpoint = f'seed_dataset:{prefix}'
+            call_command('import_recipes', path, checkpoint=checkpoint,
+                         restart=True, chunk_size=options['chunk_size'],
+                         stdout=self.stdout, stderr=self.stderr)
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users with '
+            f'{options["recipes_per_user"]} recipes each.'
+        ))
+
+    def generate(self, rng, user, options):
+        """Yield the recipe records of `user`."""
+        vocabularies = {
+            name: make_vocabulary(rng, options[name])
+            for name in ('tags', 'ingredients')
+        }
+        weights = {
+            name: (zipf_weights(len(vocabulary))
+                   if options['popularity'] == 'zipf' and vocabulary
+                   else None)
+            for name, vocabulary in vocabularies.items()
+        }
+        for n in range(options['recipes_per_user']):
+            record = {
+                'user': user.email,
+                'title': ' '.join(rng.sample(WORDS, 3)).capitalize(),
+                'description': ' '.join(rng.choices(WORDS, k=12)),
+                'time_minutes': rng.randint(5, 180),
+                'price': f'{rng.uniform(1, 60):.2f}',
+            }
+            for name, vocabulary in vocabularies.items():
+                count = min(sample_count(
+                    rng, options['fanout'],
+                    options[f'max_{name}_per_recipe']
+                ), len(vocabulary))
+                record[name] = self.pick(rng, vocabulary, weights[name],
+                                         count)
+            yield record
+
+    def pick(self, rng, vocabulary, weights, count):
+        """Return `count` distinct names drawn with `weights`."""
+        picked = {}
+        while len(picked) < count:
+            picked.setdefault(
+                rng.choices(vocabulary, cum_weights=weights)[0]
+            )
+        return list(picked)
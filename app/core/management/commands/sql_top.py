@@ -0,0 +1,97 @@
+"""
+Django command to list the costliest SQL statements.
+"""
+import json
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.loadtest import LoadTest
+from core.sqlstats import SORT_KEYS, SQLStats, stats as sql_stats
+
+
+class Command(BaseCommand):
+    """Django command to report SQL fingerprints by cost."""
+    help = "list the top SQL fingerprints of a slow log or a load test run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slow-log',
+            help='Aggregate this slow log instead of running a load test.'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Load test as the users seeded with this prefix.'
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--sort', choices=SORT_KEYS, default='total_ms')
+        parser.add_argument(
+            '--by',
+            choices=('view', 'fingerprint'),
+            default='view',
+            help='Report each fingerprint per calling view, or overall.'
+        )
+        parser.add_argument('--json', action='store_true',
+                            help='Write the rows as JSON.')
+
+    def handle(self, *args, **options):
+        """Entry point for command."""
+        if options['slow_log']:
+            stats = self.read_slow_log(options['slow_log'])
+        else:
+            stats = self.run_load_test(options)
+
+        rows = stats.top(options['limit'], options['sort'],
+                         by_view=options['by'] == 'view')
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write(f'{"total_ms":>10} {"count":>7} {"per_req":>7} '
+                          f'{"p95_ms":>8} {"max_ms":>8}  view / fingerprint')
+        for row in rows:
+            per_request = row['per_request']
+            self.stdout.write(
+                f'{row["total_ms"]:>10.1f} {row["count"]:>7} '
+                f'{per_request if per_request is not None else "-":>7} '
+                f'{row["p95_ms"]:>8.2f} {row["max_ms"]:>8.2f}  '
+                f'{row["view"]}\n    {row["fingerprint"]}'
+            )
+
+    def read_slow_log(self, path):
+        """Return the statistics of the statements of a slow log."""
+        stats = SQLStats()
+        try:
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        stats.record(entry['sql'], entry['ms'] / 1000,
+                                     entry.get('view', '-'))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+        return stats
+
+    def run_load_test(self, options):
+        """Return the statistics of the statements of a load test run."""
+        users = list(get_user_model().objects.filter(
+            email__startswith=options['prefix'],
+            email__endswith='@example.com',
+        ).order_by('pk')[:options['concurrency']])
+        if not users:
+            raise CommandError(
+                f'No users with the prefix {options["prefix"]!r}; '
+                f'run seed_dataset first.'
+            )
+        load_test = LoadTest(users, concurrency=options['concurrency'],
+                             requests=options['requests'],
+                             host=options['host'])
+        sql_stats.clear()
+        try:
+            load_test.run()
+        finally:
+            load_test.cleanup()
+        return sql_stats
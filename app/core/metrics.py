@@ -0,0 +1,163 @@
+"""
+Per-route request metrics in the Prometheus text format.
+"""
+import threading
+from bisect import bisect_left
+from itertools import accumulate
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RouteStats:
+    """Counters of the requests to one route, method and status."""
+    __slots__ = ('count', 'seconds', 'buckets', 'queries', 'query_seconds',
+                 'bytes')
+
+    def __init__(self, buckets):
+        self.count = 0
+        self.seconds = 0.0
+        # One count per bucket plus +Inf, not cumulative.
+        self.buckets = [0] * (len(buckets) + 1)
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.bytes = 0
+
+
+class MetricsRegistry:
+    """
+    Aggregate request metrics in per-thread shards.
+
+    Each thread writes only to its own shard, so recording takes no lock;
+    the lock is held once per thread, to register its shard. `render()`
+    merges the shards. Counters are per process: run one scrape target
+    per worker process, or aggregate them in Prometheus.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _get_shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, route, method, status, seconds, queries=0,
+               query_seconds=0.0, size=0):
+        """Record one request to `route`."""
+        shard = self._get_shard()
+        key = (route, method, status)
+        stats = shard.get(key)
+        if stats is None:
+            stats = shard[key] = RouteStats(self.buckets)
+        stats.count += 1
+        stats.seconds += seconds
+        stats.buckets[bisect_left(self.buckets, seconds)] += 1
+        stats.queries += queries
+        stats.query_seconds += query_seconds
+        stats.bytes += size
+
+    def collect(self):
+        """Return `{(route, method, status): RouteStats}` of all shards."""
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for key, stats in list(shard.items()):
+                total = merged.get(key)
+                if total is None:
+                    total = merged[key] = RouteStats(self.buckets)
+                total.count += stats.count
+                total.seconds += stats.seconds
+                total.buckets = [
+                    a + b for a, b in zip(total.buckets, stats.buckets)
+                ]
+                total.queries += stats.queries
+                total.query_seconds += stats.query_seconds
+                total.bytes += stats.bytes
+        return merged
+
+    def clear(self):
+        """Drop every recorded request."""
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        merged = sorted(self.collect().items())
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        bounds = [format_float(bound) for bound in self.buckets] + ['+Inf']
+        for key, stats in merged:
+            labels = format_labels(key)
+            for bound, total in zip(bounds, accumulate(stats.buckets)):
+                lines.append(
+                    f'http_request_duration_seconds_bucket'
+                    f'{{{labels},le="{bound}"}} {total}'
+                )
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} '
+                         f'{format_float(stats.seconds)}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} '
+                         f'{stats.count}')
+
+        for name, attr, description in (
+            ('http_db_queries_total', 'queries',
+             'Database queries run by requests.'),
+            ('http_db_query_duration_seconds_total', 'query_seconds',
+             'Time spent in database queries by requests.'),
+            ('http_response_bytes_total', 'bytes',
+             'Response body bytes sent.'),
+        ):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for key, stats in merged:
+                lines.append(f'{name}{{{format_labels(key)}}} '
+                             f'{format_float(getattr(stats, attr))}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_float(value):
+    """Return `value` as a Prometheus sample value."""
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def escape_label(value):
+    """Escape a label value of the text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def format_labels(key):
+    """Return the route, method and status labels of a registry key."""
+    route, method, status = key
+    return (f'route="{escape_label(route)}",method="{escape_label(method)}",'
+            f'status="{escape_label(status)}"')
+
+
+def render_gauges(prefix, values):
+    """Return numeric `values` as `<prefix>_<name>` gauges."""
+    lines = []
+    for name, value in sorted(values.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f'# TYPE {prefix}_{name} gauge')
+        lines.append(f'{prefix}_{name} {format_float(value)}')
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+registry = MetricsRegistry(
+    getattr(settings, 'METRICS_LATENCY_BUCKETS', DEFAULT_BUCKETS)
+)
@@ -0,0 +1,204 @@
+"""
+Middleware of the API.
+"""
+import time
+from django.conf import settings
+from django.db import connection
+from rest_framework.exceptions import AuthenticationFailed
+from user.authentication import CachedTokenAuthentication
+from .metrics import registry
+from .profiling import RequestProfiler
+from .sqlstats import QueryRecorder, stats as sql_stats
+from .tracing import export, get_sampling_reason, start_trace, trace_query
+
+
+def get_route(request):
+    """Return the view name `request` resolved to, or `unmatched`."""
+    match = request.resolver_match
+    return match.view_name if match is not None else 'unmatched'
+
+
+def stream_with_wrapper(content, wrapper, on_close=None):
+    """
+    Yield streamed `content` with the `wrapper` of its queries installed.
+
+    Streamed content is generated after the middleware returns, so the
+    queries it runs are wrapped here; `on_close` gets the bytes sent.
+    """
+    size = 0
+    try:
+        with connection.execute_wrapper(wrapper):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+    finally:
+        if on_close is not None:
+            on_close(size)
+
+
+class QueryCounter:
+    """`connection.execute_wrapper` counting queries and their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """
+    Record latency, queries and response size per resolved route.
+
+    Requests are labelled with the route's view name, such as
+    `recipe:recipe-list`, so URLs with ids share one series. Unresolved
+    requests are labelled `unmatched`. Streaming responses are recorded
+    once their content has been sent.
+    """
+    excluded_routes = ('metrics',)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        route = get_route(request)
+        if route in self.excluded_routes:
+            return response
+
+        def record(size):
+            registry.record(
+                route, request.method, str(response.status_code),
+                time.perf_counter() - start, counter.queries,
+                counter.seconds, size
+            )
+
+        if response.streaming:
+            response.streaming_content = stream_with_wrapper(
+                response.streaming_content, counter, record
+            )
+        else:
+            record(len(response.content))
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests of staff users that send the profiling header.
+
+    The header is `REQUEST_PROFILE_HEADER` (`X-Profile` by default). API
+    requests authenticate with tokens inside the view, so the token is
+    checked here, before anything runs under the profiler. The response
+    carries the id of the stored profile in `X-Profile-Id`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'REQUEST_PROFILE_HEADER',
+                              'X-Profile')
+
+    def __call__(self, request):
+        if not request.headers.get(self.header):
+            return self.get_response(request)
+        user = self.get_staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = RequestProfiler()
+        response = profiler.run(self.get_response, request)
+        profile = profiler.save(request, response, user)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    @staticmethod
+    def get_staff_user(request):
+        """Return the staff user making `request`, or None."""
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                result = CachedTokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                return None
+            user = result[0] if result else None
+        if user is None or not user.is_staff:
+            return None
+        return user
+
+
+class SQLStatsMiddleware:
+    """
+    Aggregate the queries of each request per fingerprint and route.
+
+    Statements slower than `SQL_SLOW_QUERY_MS` are written to the slow
+    log with the project frames that issued them (see `core.sqlstats`).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(sql_stats, lambda: get_route(request))
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        sql_stats.record_request(get_route(request))
+        if response.streaming:
+            response.streaming_content = stream_with_wrapper(
+                response.streaming_content, recorder
+            )
+        return response
+
+
+class TracingMiddleware:
+    """
+    Trace each request and report its stages in `Server-Timing`.
+
+    See `core.tracing` for the stages and tail-based sampling; kept
+    traces are exported when `TRACE_EXPORT_FILE` is set. Content
+    streamed after the response is returned is not part of the trace.
+    The header exposes internal timings, so it is only sent to staff
+    users and `INTERNAL_IPS`, or to everyone with `TRACE_SERVER_TIMING`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with start_trace(request.method, {
+            'http.method': request.method,
+            'http.target': request.path,
+        }) as trace:
+            with connection.execute_wrapper(trace_query):
+                response = self.get_response(request)
+
+        route = get_route(request)
+        trace.root.attributes['http.route'] = route
+        trace.finish(f'{request.method} {route}', response.status_code)
+        if self.show_timing(request):
+            response['Server-Timing'] = trace.server_timing()
+
+        path = getattr(settings, 'TRACE_EXPORT_FILE', None)
+        reason = get_sampling_reason(trace) if path else None
+        if reason is not None:
+            trace.root.attributes['sampling.reason'] = reason
+            export(trace, path)
+        return response
+
+    @staticmethod
+    def show_timing(request):
+        """Return whether the response to `request` gets `Server-Timing`."""
+        if getattr(settings, 'TRACE_SERVER_TIMING', False):
+            return True
+        if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
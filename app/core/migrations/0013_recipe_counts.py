@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-17 12:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_recipe_counts(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, column in (('Tag', 'tag_id'), ('Ingredient', 'ingredient_id')):
+        model = apps.get_model('core', name)
+        through = getattr(Recipe, f'{name.lower()}s').through
+        counts = through.objects.filter(
+            **{column: OuterRef('pk')}
+        ).values(column).annotate(count=Count('*')).values('count')
+        model.objects.update(recipe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_tag_user_count_idx'),
+        ),
+        migrations.RunPython(populate_recipe_counts, migrations.RunPython.noop),
+    ]
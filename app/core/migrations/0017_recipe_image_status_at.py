@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_user_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
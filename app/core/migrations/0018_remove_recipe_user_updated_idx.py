@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 18:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recipe_image_status_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='core_recipe_user_updated_idx',
+        ),
+    ]
@@ -1,7 +1,12 @@
 import uuid
 import os
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
@@ -14,6 +19,14 @@ def generate_recipe_image_file_name(instance, filename):
     return os.path.join('uploads', 'recipe', filename)
 
 
+def generate_image_blob_file_name(instance, filename):
+    """Generate the content-derived file path of an image blob."""
+    ext = os.path.splitext(filename)[1].lower()
+    digest = instance.sha256
+    return os.path.join('uploads', 'recipe', digest[:2], digest[2:4],
+                        f'{digest}{ext}')
+
+
 class UserManager(BaseUserManager):
     """
     Custom user model manager where email is the unique identifiers
@@ -60,6 +73,48 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class RecipeAttrQuerySet(models.QuerySet):
+    """QuerySet of tags or ingredients."""
+
+    def add_recipe_counts(self, deltas):
+        """Add `{pk: delta}` to the `recipe_count` of the objects."""
+        pks_by_delta = {}
+        for pk, delta in deltas.items():
+            if delta:
+                pks_by_delta.setdefault(delta, []).append(pk)
+        for delta, pks in pks_by_delta.items():
+            self.filter(pk__in=pks).update(
+                recipe_count=Greatest(F('recipe_count') + delta, 0)
+            )
+
+    def linked_recipe_count(self):
+        """Return an expression counting the recipes linked to an object."""
+        relation = self.model.recipe_set
+        column = relation.field.m2m_reverse_name()
+        counts = relation.through.objects.filter(
+            **{column: OuterRef('pk')}
+        ).values(column).annotate(count=Count('*')).values('count')
+        return Coalesce(Subquery(counts), 0)
+
+    def drifted(self):
+        """Return the objects whose `recipe_count` is wrong."""
+        return self.annotate(
+            linked_recipes=self.linked_recipe_count()
+        ).exclude(recipe_count=F('linked_recipes'))
+
+    def update_recipe_count(self, removing=0):
+        """
+        Recount the recipes linked to each object.
+
+        `removing` links per object are left out of the count, for links
+        about to be deleted.
+        """
+        count = self.linked_recipe_count()
+        if removing:
+            count = Greatest(count - removing, 0)
+        return self.update(recipe_count=count)
+
+
 class Tag(models.Model):
     """Tag for filtering recipes."""
     name = models.CharField(max_length=255)
@@ -67,6 +122,20 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Maintained by `core.signals`; see `reconcile_recipe_counts`.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Autocomplete: prefix and similarity matches within a user.
+            GinIndex(fields=['user', 'name'],
+                     opclasses=['int8_ops', 'gin_trgm_ops'],
+                     name='core_tag_name_trgm_idx'),
+            models.Index(fields=['user', 'recipe_count'],
+                         name='core_tag_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -79,13 +148,143 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Maintained by `core.signals`; see `reconcile_recipe_counts`.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Autocomplete: prefix and similarity matches within a user.
+            GinIndex(fields=['user', 'name'],
+                     opclasses=['int8_ops', 'gin_trgm_ops'],
+                     name='core_ingredient_name_trgm_idx'),
+            models.Index(fields=['user', 'recipe_count'],
+                         name='core_ingredient_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+def _related_names(model):
+    """Return a subquery of the `model` names linked to the outer recipe."""
+    return Subquery(
+        model.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('name', ' '))
+        .values('names')
+    )
+
+
+def recipe_search_vector(tag_model, ingredient_model):
+    """
+    Return the search vector expression of a recipe.
+
+    Title words weigh most, then the description, then the names of the
+    recipe's tags and ingredients.
+    """
+    config = getattr(settings, 'RECIPE_SEARCH_CONFIG', 'english')
+    return (
+        SearchVector('title', weight='A', config=config) +
+        SearchVector('description', weight='B', config=config) +
+        SearchVector(_related_names(tag_model),
+                     _related_names(ingredient_model),
+                     weight='C', config=config)
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet of recipes."""
+
+    def update_search_vector(self, **fields):
+        """
+        Recompute the full-text search vector of the recipes.
+
+        `fields` are updated by the same statement.
+        """
+        return self.update(
+            search_vector=recipe_search_vector(Tag, Ingredient), **fields
+        )
+
+
+class ImageBlobManager(models.Manager):
+    """Manager storing image blobs once per content hash."""
+
+    def store(self, file, sha256):
+        """Return the blob with the content of `file`, storing it if new."""
+        blob = self.filter(sha256=sha256).first()
+        if blob is not None:
+            return blob
+
+        blob = self.model(sha256=sha256, size=file.size)
+        name = blob.file.field.generate_filename(blob, file.name)
+        if blob.file.storage.exists(name):
+            # Left behind by a blob whose row was never committed.
+            blob.file.name = name
+        else:
+            blob.file.save(file.name, file, save=False)
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # A concurrent upload stored the same content first.
+            existing = self.get(sha256=sha256)
+            if blob.file.name != existing.file.name:
+                blob.file.storage.delete(blob.file.name)
+            return existing
+        return blob
+
+    def acquire(self, pk):
+        """Add a reference to a blob; return False if it was deleted."""
+        return bool(self.filter(pk=pk).update(ref_count=F('ref_count') + 1))
+
+    def release(self, pk):
+        """Drop a reference to a blob, deleting it once unreferenced."""
+        with transaction.atomic():
+            blob = self.select_for_update().filter(pk=pk).first()
+            if blob is None:
+                return
+            if blob.ref_count > 1:
+                self.filter(pk=pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            transaction.on_commit(blob.delete_files)
+
+
+class ImageBlob(models.Model):
+    """Uploaded image content, shared by every recipe using it."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to=generate_image_blob_file_name)
+    size = models.PositiveIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return self.sha256
+
+    def delete_files(self):
+        """Delete the blob's file and its variants from storage."""
+        names = [self.file.name]
+        names.extend(name for formats in self.variants.values()
+                     for name in formats.values())
+        for name in names:
+            self.file.storage.delete(name)
+
+
 class Recipe(models.Model):
     """Recipe object."""
+
+    class ImageStatus(models.TextChoices):
+        NONE = '', _('No image')
+        PENDING = 'pending', _('Pending')
+        PROCESSING = 'processing', _('Processing')
+        READY = 'ready', _('Ready')
+        FAILED = 'failed', _('Failed')
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -99,6 +298,69 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField(Ingredient)
     image = models.ImageField(null=True,
                               upload_to=generate_recipe_image_file_name)
+    image_blob = models.ForeignKey(
+        ImageBlob,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name='recipes'
+    )
+    image_status = models.CharField(max_length=16,
+                                    choices=ImageStatus.choices,
+                                    blank=True,
+                                    default=ImageStatus.NONE)
+    # When `image_status` last changed, to find jobs lost with a worker.
+    image_status_at = models.DateTimeField(null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by `core.signals`; see `RecipeQuerySet.update_search_vector`.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='core_recipe_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class ImportCheckpoint(models.Model):
+    """Number of records a resumable import has committed."""
+    name = models.CharField(max_length=255, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.position}'
+
+
+class RequestProfile(models.Model):
+    """CPU profile and SQL of one request, captured for staff."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    # `{'sql': ..., 'ms': ..., 'many': ...}` per query, in order.
+    queries = models.JSONField(default=list, blank=True)
+    # Marshalled `pstats` data, as written by `cProfile.dump_stats()`.
+    stats = models.BinaryField()
+    report = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
@@ -0,0 +1,78 @@
+"""
+Per-request CPU profiles with the SQL the request executed.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import time
+from django.conf import settings
+from django.db import connection
+from .models import RequestProfile
+
+
+class RequestProfiler:
+    """
+    Run a request under `cProfile` and record its queries.
+
+    Queries are recorded through `connection.execute_wrapper`, with their
+    SQL and duration but without their parameters, which may hold
+    personal data.
+    """
+    report_limit = 40
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.queries = []
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'many': many,
+            })
+
+    def run(self, func, *args):
+        """Return `func(*args)`, profiled."""
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self):
+                return self.profile.runcall(func, *args)
+        finally:
+            self.seconds = time.perf_counter() - start
+
+    def get_report(self):
+        """Return the slowest functions by cumulative time, as text."""
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats(self.report_limit)
+        return stream.getvalue()
+
+    def save(self, request, response, user):
+        """Store the profile of `request` and drop the oldest ones."""
+        self.profile.create_stats()
+        profile = RequestProfile.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path(),
+            status_code=response.status_code,
+            duration_ms=self.seconds * 1000,
+            query_count=len(self.queries),
+            query_ms=sum(query['ms'] for query in self.queries),
+            queries=self.queries,
+            stats=marshal.dumps(self.profile.stats),
+            report=self.get_report(),
+        )
+        keep = getattr(settings, 'REQUEST_PROFILE_KEEP', 100)
+        stale = list(RequestProfile.objects.values_list(
+            'pk', flat=True
+        )[keep:])
+        if stale:
+            RequestProfile.objects.filter(pk__in=stale).delete()
+        return profile
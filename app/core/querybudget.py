@@ -0,0 +1,120 @@
+"""
+Query budgets of the API routes, checked by the test suite.
+
+A budget is the most queries a route may run for one request, whatever
+the size of the data it returns. `QueryBudgetMixin.assertQueryBudget()`
+grows the data between requests and fails both when a request exceeds
+its budget and when the number of queries grows with the data, which
+catches O(N) patterns such as an unprefetched relation even while the
+absolute count is still within budget.
+"""
+from contextlib import ContextDecorator
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+
+# (route name, HTTP method): most queries of one request with cold caches.
+# Recipe routes are measured with forced authentication; user routes
+# include the lookup of their token, which is part of what they cost.
+BUDGETS = {
+    ('recipe:recipe-list', 'GET'): 3,
+    ('recipe:recipe-list', 'POST'): 16,
+    ('recipe:recipe-detail', 'GET'): 4,
+    ('recipe:recipe-detail', 'PUT'): 21,
+    ('recipe:recipe-detail', 'PATCH'): 19,
+    ('recipe:recipe-detail', 'DELETE'): 6,
+    ('recipe:recipe-upload-image', 'POST'): 9,
+    ('recipe:recipe-image-precheck', 'POST'): 7,
+    ('recipe:recipe-facets', 'GET'): 2,
+    ('recipe:recipe-export', 'GET'): 3,
+    ('recipe:recipe-bulk', 'POST'): 16,
+    ('recipe:tag-list', 'GET'): 1,
+    ('recipe:tag-detail', 'PATCH'): 3,
+    ('recipe:tag-detail', 'DELETE'): 5,
+    ('recipe:ingredient-list', 'GET'): 1,
+    ('recipe:ingredient-detail', 'PATCH'): 3,
+    ('recipe:ingredient-detail', 'DELETE'): 5,
+    ('user:create', 'POST'): 2,
+    ('user:token-create', 'POST'): 2,
+    ('user:token-discard', 'POST'): 2,
+    ('user:token-cache-stats', 'GET'): 1,
+    ('user:me', 'GET'): 1,
+    ('user:me', 'PATCH'): 2,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more queries than its budget."""
+
+
+class query_budget(ContextDecorator):
+    """
+    Fail when the wrapped block runs more than `budget` queries.
+
+    Use as `with query_budget(3):` or `@query_budget(3)`. After the
+    block, `count` holds the number of queries it ran.
+    """
+
+    def __init__(self, budget, using=DEFAULT_DB_ALIAS, label=None):
+        self.budget = budget
+        self.using = using
+        self.label = label
+        self.count = None
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        self.count = len(self.context.captured_queries)
+        if exc_type is None and self.count > self.budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}' for number, query in
+                enumerate(self.context.captured_queries, start=1)
+            )
+            raise QueryBudgetExceeded(
+                f'{self.label or "Block"} ran {self.count} queries, '
+                f'over its budget of {self.budget}:\n{queries}'
+            )
+        return False
+
+
+def get_budget(route, method):
+    """Return the budget of `method` requests to `route`."""
+    try:
+        return BUDGETS[(route, method.upper())]
+    except KeyError:
+        raise KeyError(f'No query budget for {method.upper()} {route}.')
+
+
+class QueryBudgetMixin:
+    """`TestCase` mixin asserting route query budgets."""
+    query_budget_sizes = (1, 10)
+
+    def assertQueryBudget(self, route, method, request, grow=None,
+                          sizes=None):
+        """
+        Assert `request()` stays within the budget of the route.
+
+        With `grow`, `grow(size)` is called before each request to bring
+        the data to each of `sizes`, and every request must then run the
+        same number of queries. Return the responses of the requests.
+        """
+        budget = get_budget(route, method)
+        label = f'{method.upper()} {route}'
+        counts = []
+        responses = []
+        for size in (sizes or self.query_budget_sizes) if grow else (None,):
+            if grow:
+                grow(size)
+            with query_budget(budget, label=label) as block:
+                responses.append(request())
+            counts.append(block.count)
+        if grow:
+            self.assertEqual(
+                len(set(counts)), 1,
+                f'{label} queries grow with the data: '
+                f'{dict(zip(sizes or self.query_budget_sizes, counts))}'
+            )
+        return responses
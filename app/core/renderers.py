@@ -0,0 +1,150 @@
+"""
+Fast JSON, MessagePack and streaming export renderers for the APIs.
+"""
+import csv
+import io
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+from .tracing import span
+
+
+# Types the fast encoders do not know are encoded like DRF's JSONEncoder
+# does: `Decimal` as a float, datetimes as ISO 8601 strings with a `Z`
+# suffix, lazy strings as strings. Decimal serializer fields are already
+# strings unless `COERCE_DECIMAL_TO_STRING` is turned off.
+encode_default = encoders.JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Render JSON with orjson.
+
+    The output matches DRF's compact `JSONRenderer` byte for byte.
+    Indented and ASCII-only output, which orjson cannot produce the same
+    way, fall back to the stdlib encoder.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with span('render', {'render.format': self.format}):
+            return self.render_json(data, accepted_media_type,
+                                    renderer_context or {})
+
+    def render_json(self, data, accepted_media_type, renderer_context):
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        ret = orjson.dumps(data, default=encode_default,
+                           option=self.options)
+        # Valid JSON, but not valid JavaScript: escape like DRF does.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+            ret = ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render MessagePack, with the values the JSON renderer produces."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with span('render', {'render.format': self.format}):
+            return msgpack.packb(data, default=encode_default,
+                                 use_bin_type=True, datetime=False)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render one JSON document per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    options = ORJSONRenderer.options | orjson.OPT_APPEND_NEWLINE
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(self.render_stream([items]))
+
+    def render_stream(self, chunks, fields=None):
+        """Yield the encoded lines of each chunk of items."""
+        for chunk in chunks:
+            yield b''.join(
+                orjson.dumps(item, default=encode_default,
+                             option=self.options)
+                for item in chunk
+            )
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Render a list of flat objects as CSV, one column per field.
+
+    Nested lists are written as the `name`s of their items joined by
+    `list_separator`, other nested values as JSON. Text cells a
+    spreadsheet would run as a formula are prefixed with `'`.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    list_separator = '|'
+    formula_prefixes = ('=', '+', '-', '@', '\t', '\r')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        fields = list(items[0]) if items else []
+        return b''.join(self.render_stream([items], fields))
+
+    def format_cell(self, value):
+        """Return the CSV cell of `value`, with formulas defused."""
+        value = self.format_value(value)
+        if isinstance(value, str) and value.startswith(self.formula_prefixes):
+            return "'" + value
+        return value
+
+    def format_value(self, value):
+        """Return the CSV cell of `value`."""
+        if value is None:
+            return ''
+        if isinstance(value, list):
+            return self.list_separator.join(
+                item['name'] if isinstance(item, dict) and 'name' in item
+                else self.format_value(item)
+                for item in value
+            )
+        if isinstance(value, dict):
+            return orjson.dumps(value, default=encode_default).decode()
+        return value
+
+    def render_stream(self, chunks, fields):
+        """Yield the header, then the encoded rows of each chunk."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield self.flush(buffer)
+        for chunk in chunks:
+            for item in chunk:
+                writer.writerow(
+                    [self.format_cell(item.get(name)) for name in fields]
+                )
+            yield self.flush(buffer)
+
+    def flush(self, buffer):
+        """Return the encoded contents of `buffer` and empty it."""
+        data = buffer.getvalue().encode(self.charset)
+        buffer.seek(0)
+        buffer.truncate()
+        return data
@@ -0,0 +1,183 @@
+"""
+Signal handlers keeping derived model data up to date.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import ImageBlob, Recipe, Tag, Ingredient
+
+RELATED_RECIPE_LOOKUPS = {
+    Recipe.tags.through: 'tags',
+    Recipe.ingredients.through: 'ingredients',
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+
+
+# Through model -> counted model.
+RECIPE_COUNT_MODELS = {
+    Recipe.tags.through: Tag,
+    Recipe.ingredients.through: Ingredient,
+}
+
+# Recipe fields the search vector is built from.
+SEARCH_FIELDS = {'title', 'description'}
+
+
+_pending_updates = ContextVar('pending_updates', default=None)
+
+
+class PendingUpdates:
+    """Recipe and `recipe_count` updates held back until a block ends."""
+
+    def __init__(self):
+        self.recipe_ids = set()
+        self.counted = {
+            model: set() for model in RECIPE_COUNT_MODELS.values()
+        }
+
+    def apply(self):
+        """Run one UPDATE per table with changes."""
+        update_recipes(self.recipe_ids)
+        for model, pks in self.counted.items():
+            recount(model, pks)
+
+
+@contextmanager
+def deferred_updates():
+    """
+    Merge the signal updates of the block into one UPDATE per table.
+
+    Use around code changing several links of the same recipes, such as
+    replacing their tags and ingredients. The block runs in a transaction
+    and the updates run at its end. Nested blocks join the outer one.
+    """
+    if _pending_updates.get() is not None:
+        yield
+        return
+    pending = PendingUpdates()
+    with transaction.atomic():
+        token = _pending_updates.set(pending)
+        try:
+            yield
+        finally:
+            _pending_updates.reset(token)
+        pending.apply()
+
+
+def update_recipes(pks):
+    """Mark the recipes with `pks` modified and reindex them."""
+    pending = _pending_updates.get()
+    if pending is not None:
+        pending.recipe_ids.update(pks)
+    elif pks:
+        Recipe.objects.filter(pk__in=pks).update_search_vector(
+            updated_at=timezone.now()
+        )
+
+
+def recount(model, pks):
+    """Recompute the `recipe_count` of the `model` objects with `pks`."""
+    pending = _pending_updates.get()
+    if pending is not None:
+        pending.counted[model].update(pks)
+    elif pks:
+        model.objects.filter(pk__in=pks).update_recipe_count()
+
+
+def get_related_recipe_ids(sender, instance):
+    """Return the ids of the recipes linked to a tag or an ingredient."""
+    return list(Recipe.objects.filter(
+        **{RELATED_RECIPE_LOOKUPS[sender]: instance}
+    ).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_on_m2m_change(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """
+    Keep recipes and their tags/ingredients in step with changed links.
+
+    The changed recipes get a new `updated_at` and search vector in one
+    UPDATE, and the `recipe_count` of the linked objects is recomputed
+    from the through table in another, so counts cannot drift under
+    concurrent changes. See `deferred_updates()` to merge the updates of
+    several changes.
+    """
+    model = RECIPE_COUNT_MODELS[sender]
+    if action in ('post_add', 'post_remove'):
+        if not pk_set:
+            return
+        if reverse:
+            update_recipes(pk_set)
+            recount(model, [instance.pk])
+        else:
+            update_recipes([instance.pk])
+            recount(model, pk_set)
+    elif action == 'pre_clear':
+        # The links are already gone once post_clear is sent.
+        if reverse:
+            instance._cleared_ids = get_related_recipe_ids(sender, instance)
+        else:
+            instance._cleared_ids = list(model.objects.filter(
+                recipe=instance
+            ).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        cleared = instance.__dict__.pop('_cleared_ids', ())
+        if reverse:
+            update_recipes(cleared)
+            recount(model, [instance.pk])
+        else:
+            update_recipes([instance.pk])
+            recount(model, cleared)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_on_rename(sender, instance, created, **kwargs):
+    """Update recipes when one of their tags/ingredients changes."""
+    if not created:
+        Recipe.objects.filter(
+            **{RELATED_RECIPE_LOOKUPS[sender]: instance}
+        ).update_search_vector(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_on_delete(sender, instance, **kwargs):
+    """Remember the recipes of a tag/ingredient about to be deleted."""
+    instance._deleted_recipe_ids = get_related_recipe_ids(sender, instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_on_delete(sender, instance, **kwargs):
+    """Update the recipes a deleted tag/ingredient was linked to."""
+    update_recipes(instance.__dict__.pop('_deleted_recipe_ids', ()))
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_blob(sender, instance, **kwargs):
+    """Drop the deleted recipe's reference to its image blob."""
+    if instance.image_blob_id is not None:
+        ImageBlob.objects.release(instance.image_blob_id)
+
+
+@receiver(post_save, sender=Recipe)
+def index_on_save(sender, instance, update_fields, **kwargs):
+    """Keep the search vector of a saved recipe current."""
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        update_recipes([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def count_on_recipe_delete(sender, instance, **kwargs):
+    """Uncount a recipe about to be deleted from its tags/ingredients."""
+    for model in RECIPE_COUNT_MODELS.values():
+        model.objects.filter(recipe=instance).update_recipe_count(1)
@@ -0,0 +1,193 @@
+"""
+SQL fingerprint statistics and the slow query log.
+"""
+import json
+import logging
+import os
+import re
+import sysconfig
+import threading
+import time
+import traceback
+from collections import deque
+from functools import lru_cache
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Applied in order; each pattern's literals become `?`.
+NORMALIZERS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?(?![\w"])'), '?'),
+    (re.compile(r'%s|%\(\w+\)s'), '?'),
+    (re.compile(r'"s\d+_x\d+"'), '"s?"'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+SORT_KEYS = ('total_ms', 'count', 'mean_ms', 'p95_ms', 'max_ms',
+             'per_request')
+# Frames from the instrumentation modules, which wrap every query, and
+# from the standard library are not the origin of a query.
+IGNORED_FILES = frozenset(
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('sqlstats.py', 'middleware.py', 'tracing.py')
+)
+IGNORED_PATHS = (
+    sysconfig.get_paths()['stdlib'],
+)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Return `sql` without literals, placeholders or IN list lengths."""
+    for pattern, replacement in NORMALIZERS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def get_origin(limit=5):
+    """Return the innermost project frames calling the database."""
+    origin = []
+    for frame in reversed(traceback.extract_stack()):
+        if 'site-packages' in frame.filename or \
+                frame.filename in IGNORED_FILES or \
+                frame.filename.startswith(IGNORED_PATHS):
+            continue
+        origin.append(f'{os.path.relpath(frame.filename, settings.BASE_DIR)}'
+                      f':{frame.lineno} in {frame.name}')
+        if len(origin) == limit:
+            break
+    return origin
+
+
+class QueryStats:
+    """Timings of one fingerprint called from one view."""
+    __slots__ = ('count', 'total', 'max', 'samples', 'sql')
+
+    def __init__(self, sql, samples):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # The most recent durations, for percentiles.
+        self.samples = deque(maxlen=samples)
+        self.sql = sql
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total / self.count * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'sql': self.sql,
+        }
+
+
+class SQLStats:
+    """Aggregate query timings per fingerprint and calling view."""
+
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self._stats = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds, view='-'):
+        """Record one execution of `sql` and return its fingerprint."""
+        key = (fingerprint(sql), view)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(sql, self.samples)
+            stats.add(seconds)
+        return key[0]
+
+    def record_request(self, view):
+        """Count a request to `view`, for the statements per request."""
+        with self._lock:
+            self._requests[view] = self._requests.get(view, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self._requests.clear()
+
+    def top(self, limit=20, sort='total_ms', by_view=True):
+        """Return the `limit` worst fingerprints by `sort`, as dicts."""
+        with self._lock:
+            items = list(self._stats.items())
+            requests = dict(self._requests)
+        if not by_view:
+            requests = {'*': sum(requests.values())}
+            merged = {}
+            for (sql_fingerprint, _), stats in items:
+                total = merged.get(sql_fingerprint)
+                if total is None:
+                    total = merged[sql_fingerprint] = QueryStats(
+                        stats.sql, self.samples
+                    )
+                total.count += stats.count
+                total.total += stats.total
+                total.max = max(total.max, stats.max)
+                total.samples.extend(stats.samples)
+            items = [((key, '*'), stats) for key, stats in merged.items()]
+        rows = [
+            {'fingerprint': key, 'view': view, **stats.as_dict(),
+             # Far above 1 for a statement run once per row: an N+1.
+             'per_request': (round(stats.count / requests[view], 2)
+                             if requests.get(view) else None)}
+            for (key, view), stats in items
+        ]
+        rows.sort(key=lambda row: row[sort] or 0, reverse=True)
+        return rows[:limit]
+
+
+class QueryRecorder:
+    """`connection.execute_wrapper` feeding `stats` and the slow log."""
+
+    def __init__(self, stats, view='-', threshold_ms=None):
+        self.stats = stats
+        self.view = view
+        if threshold_ms is None:
+            threshold_ms = getattr(settings, 'SQL_SLOW_QUERY_MS', 100)
+        self.threshold = threshold_ms / 1000
+
+    def get_view(self):
+        return self.view() if callable(self.view) else self.view
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - start
+            view = self.get_view()
+            key = self.stats.record(sql, seconds, view)
+            if seconds >= self.threshold:
+                self.log_slow(sql, key, view, seconds)
+
+    def log_slow(self, sql, key, view, seconds):
+        """Write a slow statement and its origin as one JSON line."""
+        logger.warning(json.dumps({
+            'ms': round(seconds * 1000, 3),
+            'view': view,
+            'fingerprint': key,
+            'sql': sql,
+            'origin': get_origin(),
+        }))
+
+
+stats = SQLStats(getattr(settings, 'SQL_STATS_SAMPLES', 1000))
@@ -1,11 +1,27 @@
 """
 Test custom Django management commands
 """
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 from unittest.mock import patch, MagicMock
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from core import loadtest
+from core.management.commands import import_recipes
+from core.models import ImportCheckpoint, Recipe, Tag, Ingredient
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -30,3 +46,327 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ReconcileRecipeCountsTests(TestCase):
+    """Test the reconcile_recipe_counts command."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass1234'
+        )
+        self.tag = Tag.objects.create(user=user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=user, name='Salt')
+        recipe = Recipe.objects.create(user=user, title='Soup',
+                                       time_minutes=5, price=Decimal('1'))
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+        Tag.objects.update(recipe_count=5)
+        Ingredient.objects.update(recipe_count=0)
+
+    def test_dry_run_reports_only(self):
+        """Test a dry run reports drifted counts without fixing them."""
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', '--dry-run', stdout=out)
+
+        self.assertIn('tags: 1 drifted', out.getvalue())
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 5)
+
+    def test_fixes_drifted_counts(self):
+        """Test drifted counts are recomputed from the links."""
+        call_command('reconcile_recipe_counts', stdout=StringIO())
+
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+        self.assertEqual(self.ingredient.recipe_count, 1)
+
+
+class RequeueRecipeImagesTests(TestCase):
+    """Test processing images whose jobs were lost."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+
+    def create_recipe(self, status, age):
+        """Create a recipe whose image has had `status` for `age`."""
+        image = BytesIO()
+        Image.new('RGB', (20, 20)).save(image, format='JPEG')
+        name = default_storage.save('uploads/recipe/lost.jpg',
+                                    ContentFile(image.getvalue()))
+        return Recipe.objects.create(
+            user=self.user, title='Lost', time_minutes=5,
+            price=Decimal('1.00'), image=name, image_status=status,
+            image_status_at=age and timezone.now() - age
+        )
+
+    def test_stale_images_processed(self):
+        """Test stale pending and processing images are processed."""
+        pending = self.create_recipe('pending', timedelta(hours=1))
+        processing = self.create_recipe('processing', None)
+        recent = self.create_recipe('pending', timedelta(minutes=1))
+        out = StringIO()
+
+        call_command('requeue_recipe_images', older_than=15, stdout=out)
+
+        self.assertIn('2 stale images processed', out.getvalue())
+        for recipe in (pending, processing):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image_status, 'ready')
+            self.assertIn('thumbnail', recipe.image_variants)
+        recent.refresh_from_db()
+        self.assertEqual(recent.image_status, 'pending')
+
+
+class BenchmarkRecipeListTests(TestCase):
+    """Test the benchmark_recipe_list command."""
+
+    def test_benchmark_reports_speedup(self):
+        """Test the benchmark compares both paths and leaves no data."""
+        out = StringIO()
+
+        call_command('benchmark_recipe_list', recipes=20, repeat=1,
+                     stdout=out)
+
+        self.assertIn('speedup:', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class ImportRecipesTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass1234'
+        )
+        self.records = [
+            {'title': 'Pho', 'time_minutes': 90, 'price': 9.9,
+             'description': 'Broth\twith "tabs"\nand lines\\',
+             'tags': ['Soup', 'Vietnamese'], 'ingredients': ['Noodles']},
+            {'title': 'Ramen', 'time_minutes': 60, 'price': '12.50',
+             'tags': [{'name': 'Soup'}], 'ingredients': ['Noodles', 'Egg']},
+            {'title': '', 'time_minutes': 5, 'price': '1.00'},
+            {'title': 'Toast', 'time_minutes': 3, 'price': '1.25'},
+        ]
+
+    def _write(self, text, suffix='.ndjson'):
+        """Write `text` to a temporary file and return its path."""
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _ndjson(self, records):
+        return ''.join(json.dumps(record) + '\n' for record in records)
+
+    def _import(self, path, **options):
+        """Run the command and return its output."""
+        out = StringIO()
+        call_command('import_recipes', path, user='test@example.com',
+                     stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def _check_imported(self):
+        """Assert the valid sample records were imported once."""
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Pho', 'Ramen', 'Toast']
+        )
+        pho = Recipe.objects.get(title='Pho')
+        self.assertEqual(pho.price, Decimal('9.90'))
+        self.assertEqual(pho.description, self.records[0]['description'])
+        self.assertEqual(
+            sorted(pho.tags.values_list('name', flat=True)),
+            ['Soup', 'Vietnamese']
+        )
+        # Names are deduplicated per user across records.
+        soup = Tag.objects.get(user=self.user, name='Soup')
+        noodles = Ingredient.objects.get(user=self.user, name='Noodles')
+        self.assertEqual(soup.recipe_count, 2)
+        self.assertEqual(noodles.recipe_count, 2)
+        self.assertFalse(Tag.objects.drifted().exists())
+        self.assertTrue(
+            Recipe.objects.filter(search_vector='broth').exists()
+        )
+
+    def test_import_ndjson_with_copy(self):
+        """Test importing NDJSON with COPY and reporting throughput."""
+        path = self._write(self._ndjson(self.records))
+
+        out = self._import(path, chunk_size=2)
+
+        self._check_imported()
+        self.assertIn('3 recipes imported, 1 skipped', out)
+        self.assertIn('rows/s', out)
+
+    def test_import_with_bulk_create(self):
+        """Test the bulk_create method loads the same rows."""
+        path = self._write(self._ndjson(self.records))
+
+        self._import(path, method='bulk')
+
+        self._check_imported()
+
+    def test_import_csv(self):
+        """Test importing the CSV export format."""
+        path = self._write(
+            'title,description,time_minutes,price,tags,ingredients\n'
+            'Pho,"Broth\twith ""tabs""\nand lines\\",90,9.90,'
+            'Soup|Vietnamese,Noodles\n'
+            'Ramen,,60,12.50,Soup,Noodles|Egg\n'
+            ',,5,1.00,,\n'
+            'Toast,,3,1.25,,\n',
+            suffix='.csv'
+        )
+
+        self._import(path)
+
+        self._check_imported()
+
+    def test_resume_from_checkpoint(self):
+        """Test an interrupted import resumes after the last chunk."""
+        path = self._write(self._ndjson(self.records))
+        original = import_recipes.Command.import_chunk
+        calls = []
+
+        def fail_second_chunk(self, records, offset):
+            calls.append(offset)
+            if len(calls) == 2:
+                raise RuntimeError('Connection lost')
+            return original(self, records, offset)
+
+        with patch.object(import_recipes.Command, 'import_chunk',
+                          fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self._import(path, chunk_size=2)
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().position, 2)
+
+        out = self._import(path, chunk_size=2)
+
+        self.assertIn('Resuming after record 2', out)
+        self._check_imported()
+        self.assertEqual(ImportCheckpoint.objects.get().position, 4)
+
+    def test_unknown_user(self):
+        """Test an unknown owner is an error."""
+        path = self._write(self._ndjson(self.records))
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='nobody@example.com')
+
+
+class SeedDatasetTests(TestCase):
+    """Test the seed_dataset command."""
+
+    def _seed(self, **options):
+        call_command('seed_dataset', stdout=StringIO(), stderr=StringIO(),
+                     **{'users': 2, 'recipes_per_user': 15, 'tags': 5,
+                        'ingredients': 8, **options})
+
+    def test_seed_dataset(self):
+        """Test users get recipes with bounded tag and ingredient fan-out."""
+        self._seed(max_tags_per_recipe=3, max_ingredients_per_recipe=4)
+
+        users = get_user_model().objects.filter(email__startswith='seed')
+        self.assertEqual(users.count(), 2)
+        self.assertTrue(users[0].check_password('seed-pass-1234'))
+        self.assertEqual(Recipe.objects.count(), 30)
+        for user in users:
+            self.assertEqual(user.recipe_set.count(), 15)
+            self.assertLessEqual(Tag.objects.filter(user=user).count(), 5)
+        for recipe in Recipe.objects.all():
+            self.assertLessEqual(recipe.tags.count(), 3)
+            self.assertLessEqual(recipe.ingredients.count(), 4)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_seed_is_reproducible(self):
+        """Test the same seed generates the same recipes."""
+        self._seed(prefix='first', fanout='fixed')
+        self._seed(prefix='second', fanout='fixed')
+
+        def titles(prefix):
+            return list(Recipe.objects.filter(
+                user__email__startswith=prefix
+            ).order_by('pk').values_list('title', 'price'))
+
+        self.assertEqual(titles('first'), titles('second'))
+        self.assertEqual(
+            Recipe.objects.filter(user__email__startswith='first')
+            .first().ingredients.count(),
+            8
+        )
+
+    def test_existing_prefix(self):
+        """Test seeding twice with one prefix is an error."""
+        self._seed(recipes_per_user=1)
+
+        with self.assertRaises(CommandError):
+            self._seed(recipes_per_user=1)
+
+
+class LoadTestTests(TestCase):
+    """Test the loadtest command."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media_root,
+                                 RECIPE_IMAGE_PROCESS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('seed_dataset', users=1, recipes_per_user=10, tags=4,
+                     ingredients=6, stdout=StringIO(), stderr=StringIO())
+
+    def test_loadtest_reports_every_route(self):
+        """Test each route is requested without errors and reported."""
+        out = StringIO()
+        requests = sum(weight for _, _, weight in loadtest.ROUTES)
+
+        call_command('loadtest', concurrency=1, requests=requests,
+                     host='testserver', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['total']['requests'], requests)
+        self.assertEqual(report['statuses'], {})
+        self.assertEqual(set(report['routes']), set(loadtest.ROUTE_NAMES))
+        for name, route in report['routes'].items():
+            self.assertGreaterEqual(route['requests'], 1, name)
+            self.assertEqual(route['errors'], 0, name)
+            self.assertIsNotNone(route['latency_ms']['p99'], name)
+            self.assertIsNotNone(route['queries']['mean'], name)
+        self.assertEqual(report['dataset']['recipes'], 10)
+        self.assertFalse(get_user_model().objects.filter(
+            email__startswith='loadtest-'
+        ).exists())
+
+    def test_loadtest_routes_filter(self):
+        """Test only the requested routes are loaded."""
+        out = StringIO()
+
+        call_command('loadtest', concurrency=1, requests=5,
+                     routes=['user-me'], host='testserver', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report['routes']), ['user-me'])
+        self.assertEqual(report['routes']['user-me']['requests'], 5)
+
+    def test_loadtest_requires_users(self):
+        """Test a missing dataset is an error."""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', prefix='nobody', requests=1)
@@ -0,0 +1,135 @@
+"""
+Tests for the request metrics.
+"""
+import threading
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.metrics import MetricsRegistry, registry
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def get_sample(body, line_start):
+    """Return the value of the sample line starting with `line_start`."""
+    for line in body.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Test aggregating and rendering metrics."""
+
+    def test_histogram(self):
+        """Test latencies are counted in cumulative buckets."""
+        metrics = MetricsRegistry(buckets=(0.1, 1.0))
+        metrics.record('recipe:recipe-list', 'GET', '200', 0.05, 3, 0.01, 10)
+        metrics.record('recipe:recipe-list', 'GET', '200', 0.5, 1, 0.02, 20)
+        metrics.record('recipe:recipe-list', 'GET', '200', 5.0)
+
+        body = metrics.render()
+
+        labels = 'route="recipe:recipe-list",method="GET",status="200"'
+        bucket = f'http_request_duration_seconds_bucket{{{labels},le='
+        self.assertEqual(get_sample(body, bucket + '"0.1"}'), 1)
+        self.assertEqual(get_sample(body, bucket + '"1.0"}'), 2)
+        self.assertEqual(get_sample(body, bucket + '"+Inf"}'), 3)
+        self.assertEqual(get_sample(
+            body, f'http_request_duration_seconds_count{{{labels}}}'), 3)
+        self.assertAlmostEqual(get_sample(
+            body, f'http_request_duration_seconds_sum{{{labels}}}'), 5.55)
+        self.assertEqual(
+            get_sample(body, f'http_db_queries_total{{{labels}}}'), 4)
+        self.assertEqual(
+            get_sample(body, f'http_response_bytes_total{{{labels}}}'), 30)
+
+    def test_shards_merged(self):
+        """Test requests recorded by several threads are all counted."""
+        metrics = MetricsRegistry()
+
+        def work():
+            for _ in range(1000):
+                metrics.record('user:me', 'GET', '200', 0.001, 1)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = metrics.collect()[('user:me', 'GET', '200')]
+        self.assertEqual(stats.count, 4000)
+        self.assertEqual(stats.queries, 4000)
+
+    def test_labels_escaped(self):
+        """Test label values are escaped."""
+        metrics = MetricsRegistry()
+        metrics.record('a"b\\c', 'GET', '200', 0.1)
+
+        self.assertIn('route="a\\"b\\\\c"', metrics.render())
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Test recording requests and the metrics endpoint."""
+
+    def setUp(self):
+        registry.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_request_recorded_by_route(self):
+        """Test a request is labelled with its route name and status."""
+        res = self.client.get(RECIPES_URL)
+        self.client.get(reverse('recipe:recipe-detail', args=(0,)))
+
+        metrics = registry.collect()
+        stats = metrics[('recipe:recipe-list', 'GET', '200')]
+        self.assertEqual(stats.count, 1)
+        self.assertGreater(stats.queries, 0)
+        self.assertGreater(stats.query_seconds, 0)
+        self.assertEqual(stats.bytes, len(res.content))
+        self.assertIn(('recipe:recipe-detail', 'GET', '404'), metrics)
+
+    def test_unmatched_route(self):
+        """Test unresolved URLs share one series."""
+        self.client.get('/no/such/url/')
+
+        self.assertIn(('unmatched', 'GET', '404'), registry.collect())
+
+    def test_streaming_response_recorded(self):
+        """Test streamed responses are recorded once sent."""
+        res = self.client.get(reverse('recipe:recipe-export'))
+        self.assertEqual(registry.collect(), {})
+
+        size = len(b''.join(res.streaming_content))
+
+        stats = registry.collect()[('recipe:recipe-export', 'GET', '200')]
+        self.assertEqual(stats.bytes, size)
+        self.assertGreater(stats.queries, 0)
+
+    def test_metrics_endpoint(self):
+        """Test the endpoint renders the metrics and token cache stats."""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        self.assertIn('route="recipe:recipe-list"', body)
+        self.assertIn('token_cache_hit_ratio ', body)
+        self.assertNotIn('route="metrics"', body)
+
+    @override_settings(INTERNAL_IPS=['10.0.0.1'])
+    def test_metrics_endpoint_internal_only(self):
+        """Test the endpoint is hidden from other clients."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 404)
@@ -4,8 +4,11 @@ Tests for models.
 from unittest.mock import patch
 from decimal import Decimal
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth import get_user_model
 from .. import models
+from ..signals import deferred_updates
 
 
 User = get_user_model()
@@ -100,3 +103,128 @@ class ModelTests(TestCase):
         file_path = models.generate_recipe_image_file_name(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+class RecipeCountTests(TestCase):
+    """Test the recipe_count of tags and ingredients is maintained."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.tag = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.other_tag = models.Tag.objects.create(user=self.user,
+                                                   name='Quick')
+        self.recipes = [
+            models.Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {n}',
+                time_minutes=5,
+                price=Decimal('5.50'),
+            )
+            for n in range(3)
+        ]
+
+    def assertRecipeCount(self, obj, expected):
+        obj.refresh_from_db()
+        self.assertEqual(obj.recipe_count, expected)
+
+    def test_add_and_remove(self):
+        """Test adding and removing links updates the counts."""
+        recipe = self.recipes[0]
+        recipe.tags.add(self.tag, self.other_tag)
+        recipe.tags.add(self.tag)
+        self.recipes[1].tags.add(self.tag)
+        self.assertRecipeCount(self.tag, 2)
+
+        recipe.tags.remove(self.tag)
+        recipe.tags.remove(self.tag)
+        self.assertRecipeCount(self.tag, 1)
+        self.assertRecipeCount(self.other_tag, 1)
+
+    def test_reverse_add_and_clear(self):
+        """Test changes made from the tag side update its count."""
+        self.tag.recipe_set.add(*self.recipes)
+        self.assertRecipeCount(self.tag, 3)
+
+        self.tag.recipe_set.remove(self.recipes[0])
+        self.assertRecipeCount(self.tag, 2)
+
+        self.tag.recipe_set.clear()
+        self.assertRecipeCount(self.tag, 0)
+
+    def test_clear_and_set(self):
+        """Test clearing and setting a recipe's tags."""
+        recipe = self.recipes[0]
+        recipe.tags.add(self.tag)
+        recipe.tags.set([self.other_tag])
+        self.assertRecipeCount(self.tag, 0)
+        self.assertRecipeCount(self.other_tag, 1)
+
+        recipe.tags.clear()
+        self.assertRecipeCount(self.other_tag, 0)
+
+    def test_recipe_delete(self):
+        """Test deleting recipes uncounts them."""
+        ingredient = models.Ingredient.objects.create(user=self.user,
+                                                      name='Salt')
+        for recipe in self.recipes:
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(ingredient)
+
+        self.recipes[0].delete()
+        models.Recipe.objects.filter(pk=self.recipes[1].pk).delete()
+
+        self.assertRecipeCount(self.tag, 1)
+        self.assertRecipeCount(ingredient, 1)
+
+    def test_changes_recount_drifted(self):
+        """Test link changes fix drifted counts instead of going negative."""
+        recipe = self.recipes[0]
+        recipe.tags.add(self.tag, self.other_tag)
+        self.recipes[1].tags.add(self.tag)
+        models.Tag.objects.update(recipe_count=0)
+
+        recipe.tags.remove(self.tag)
+        self.assertRecipeCount(self.tag, 1)
+
+        recipe.tags.clear()
+        self.assertRecipeCount(self.other_tag, 0)
+
+        models.Tag.objects.update(recipe_count=0)
+        self.recipes[1].delete()
+        self.assertRecipeCount(self.tag, 0)
+
+    def test_deferred_updates(self):
+        """Test deferred link changes update each table once."""
+        recipe = self.recipes[0]
+        recipe.tags.add(self.tag)
+        ingredient = models.Ingredient.objects.create(user=self.user,
+                                                      name='Salt')
+
+        with CaptureQueriesContext(connection) as context:
+            with deferred_updates():
+                recipe.tags.clear()
+                recipe.tags.add(self.other_tag)
+                recipe.ingredients.add(ingredient)
+
+        updates = [query['sql'].split(' SET ')[0] for query in
+                   context.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(sorted(updates), [
+            'UPDATE "core_ingredient"',
+            'UPDATE "core_recipe"',
+            'UPDATE "core_tag"',
+        ])
+        self.assertRecipeCount(self.tag, 0)
+        self.assertRecipeCount(self.other_tag, 1)
+        self.assertRecipeCount(ingredient, 1)
+
+    def test_drifted(self):
+        """Test drifted counts are found and fixed by a recount."""
+        self.recipes[0].tags.add(self.tag)
+        models.Tag.objects.filter(pk=self.tag.pk).update(recipe_count=7)
+
+        self.assertEqual(list(models.Tag.objects.drifted()), [self.tag])
+
+        models.Tag.objects.update_recipe_count()
+        self.assertRecipeCount(self.tag, 1)
+        self.assertFalse(models.Tag.objects.drifted().exists())
@@ -0,0 +1,117 @@
+"""
+Tests for profiling requests of staff users.
+"""
+import pstats
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.models import RequestProfile
+from user.authentication import token_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Test the profiling header."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.staff = get_user_model().objects.create_user(
+            'staff@example.com',
+            'testpass1234',
+            is_staff=True
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.staff)}'
+        )
+
+    def test_staff_request_profiled(self):
+        """Test a staff request with the header stores its profile."""
+        res = self.client.get(RECIPES_URL, {'search': 'soup'},
+                              HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(res['X-Profile-Id'], str(profile.pk))
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.path, f'{RECIPES_URL}?search=soup')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.query_count, len(profile.queries))
+        self.assertGreater(profile.query_count, 0)
+        self.assertIn('core_recipe', ' '.join(
+            query['sql'] for query in profile.queries
+        ))
+        self.assertIn('cumulative', profile.report)
+        with tempfile.NamedTemporaryFile(suffix='.prof') as file:
+            file.write(bytes(profile.stats))
+            file.flush()
+            self.assertGreater(pstats.Stats(file.name).total_calls, 0)
+
+    def test_without_header_not_profiled(self):
+        """Test requests are not profiled by default."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_non_staff_not_profiled(self):
+        """Test the header is ignored for other users."""
+        user = get_user_model().objects.create_user('user@example.com',
+                                                    'testpass1234')
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+        )
+
+        res = client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+        anonymous = APIClient().get(RECIPES_URL, HTTP_X_PROFILE='1',
+                                    HTTP_AUTHORIZATION='Token invalid')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(REQUEST_PROFILE_KEEP=2)
+    def test_oldest_profiles_dropped(self):
+        """Test only the latest profiles are kept."""
+        for _ in range(3):
+            self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+
+class RequestProfileAdminTests(TestCase):
+    """Test the request profile admin pages."""
+
+    def setUp(self):
+        self.superuser = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='test1234'
+        )
+        self.client.force_login(self.superuser)
+        self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+        self.profile = RequestProfile.objects.get()
+
+    def test_profile_pages(self):
+        """Test profiles are listed and shown."""
+        res = self.client.get(
+            reverse('admin:core_requestprofile_changelist')
+        )
+        self.assertContains(res, RECIPES_URL)
+
+        res = self.client.get(reverse('admin:core_requestprofile_change',
+                                      args=(self.profile.pk,)))
+        self.assertContains(res, 'cumulative')
+
+    def test_download(self):
+        """Test downloading the pstats file."""
+        res = self.client.get(reverse('admin:core_requestprofile_download',
+                                      args=(self.profile.pk,)))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, bytes(self.profile.stats))
+        self.assertIn('.prof', res['Content-Disposition'])
@@ -0,0 +1,75 @@
+"""
+Tests for query budgets.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import get_resolver
+from core.querybudget import (
+    BUDGETS,
+    QueryBudgetExceeded,
+    QueryBudgetMixin,
+    get_budget,
+    query_budget,
+)
+
+User = get_user_model()
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the query budget helpers."""
+
+    def test_within_budget(self):
+        """Test a block within its budget passes and reports its count."""
+        with query_budget(2) as block:
+            User.objects.count()
+
+        self.assertEqual(block.count, 1)
+
+    def test_over_budget(self):
+        """Test a block over its budget fails and lists its queries."""
+        with self.assertRaisesMessage(QueryBudgetExceeded,
+                                      'ran 2 queries, over its budget of 1'):
+            with query_budget(1):
+                User.objects.count()
+                User.objects.exists()
+
+    def test_decorator(self):
+        """Test the budget can decorate a function."""
+        @query_budget(0)
+        def count():
+            return User.objects.count()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            count()
+
+    def test_growing_queries_fail(self):
+        """Test queries growing with the data fail within budget."""
+        def grow(size):
+            for n in range(size):
+                User.objects.create_user(f'user{size}.{n}@example.com',
+                                         'testpass1234')
+
+        def n_plus_one():
+            for user in User.objects.all():
+                User.objects.filter(pk=user.pk).exists()
+
+        BUDGETS[('test:route', 'GET')] = 100
+        self.addCleanup(BUDGETS.pop, ('test:route', 'GET'))
+        with self.assertRaisesMessage(AssertionError, 'grow with the data'):
+            self.assertQueryBudget('test:route', 'get', n_plus_one, grow)
+
+    def test_every_api_route_has_a_budget(self):
+        """Test each recipe and user route has at least one budget."""
+        routes = set()
+        resolver = get_resolver()
+        for namespace in ('recipe', 'user'):
+            _, sub_resolver = resolver.namespace_dict[namespace]
+            routes.update(
+                f'{namespace}:{name}' for name in sub_resolver.reverse_dict
+                if isinstance(name, str) and name != 'api-root'
+            )
+
+        budgeted = {route for route, _ in BUDGETS}
+        self.assertEqual(routes - budgeted, set())
+        with self.assertRaises(KeyError):
+            get_budget('recipe:recipe-list', 'OPTIONS')
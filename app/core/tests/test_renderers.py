@@ -0,0 +1,119 @@
+"""
+Test the JSON and MessagePack renderers and parsers.
+"""
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+import msgpack
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import CSVRenderer, MessagePackRenderer, ORJSONRenderer
+
+PAYLOAD = OrderedDict([
+    ('id', 1),
+    ('title', 'Crème brûlée\u2028“quoted”'),
+    ('price', Decimal('12.50')),
+    ('created_at', datetime(2024, 5, 1, 8, 30, 15, 123456,
+                            tzinfo=timezone.utc)),
+    ('detail', gettext_lazy('Not found.')),
+    ('tags', [{'id': 2, 'name': 'Dessert'}]),
+    ('counts', {1: 3}),
+    ('ratio', 0.1),
+    ('link', None),
+])
+
+
+class RendererTests(SimpleTestCase):
+    """Test the fast renderers."""
+
+    def test_json_matches_drf(self):
+        """Test orjson output is identical to DRF's JSON renderer."""
+        self.assertEqual(
+            ORJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD)
+        )
+
+    def test_json_indent_falls_back(self):
+        """Test indented output is still rendered."""
+        media_type = 'application/json; indent=4'
+
+        res = ORJSONRenderer().render(PAYLOAD, media_type)
+
+        self.assertEqual(res, JSONRenderer().render(PAYLOAD, media_type))
+
+    def test_msgpack_matches_json(self):
+        """Test MessagePack carries the same values as JSON."""
+        packed = MessagePackRenderer().render(PAYLOAD)
+
+        expected = json.loads(JSONRenderer().render(PAYLOAD))
+        expected['counts'] = {1: 3}
+        self.assertEqual(
+            msgpack.unpackb(packed, raw=False, strict_map_key=False),
+            expected
+        )
+
+
+class ParserTests(SimpleTestCase):
+    """Test the fast parsers."""
+
+    def test_json_parse(self):
+        """Test parsing a UTF-8 JSON body."""
+        body = '{"title": "Crème brûlée", "price": "5.25"}'.encode('utf-8')
+
+        data = ORJSONParser().parse(BytesIO(body))
+
+        self.assertEqual(data, {'title': 'Crème brûlée', 'price': '5.25'})
+
+    def test_json_other_charset(self):
+        """Test a body declared in another charset is decoded with it."""
+        body = '{"title": "Crème"}'.encode('latin-1')
+
+        data = ORJSONParser().parse(
+            BytesIO(body), parser_context={'encoding': 'latin-1'}
+        )
+
+        self.assertEqual(data, {'title': 'Crème'})
+
+    def test_json_invalid(self):
+        """Test invalid and non-standard JSON is rejected."""
+        for body in (b'{"title": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(BytesIO(body))
+
+    def test_msgpack_round_trip(self):
+        """Test a rendered MessagePack body parses back."""
+        body = MessagePackRenderer().render({'title': 'Soup', 'tags': []})
+
+        data = MessagePackParser().parse(BytesIO(body))
+
+        self.assertEqual(data, {'title': 'Soup', 'tags': []})
+
+    def test_csv_formulas_escaped(self):
+        """Test cells starting a spreadsheet formula are escaped."""
+        data = [{
+            'title': '=HYPERLINK("http://evil")',
+            'description': '-2+3',
+            'link': '@SUM(A1)',
+            'tags': [{'name': '+1'}, {'name': 'Vegan'}],
+            'price': '5.00',
+            'time_minutes': -5,
+        }]
+
+        body = CSVRenderer().render(data).decode().splitlines()
+
+        self.assertEqual(
+            body[1],
+            '"\'=HYPERLINK(""http://evil"")",\'-2+3,\'@SUM(A1),\'+1|Vegan,'
+            '5.00,-5'
+        )
+
+    def test_msgpack_invalid(self):
+        """Test an invalid MessagePack body is rejected."""
+        for body in (b'\xc1', b'\x81\xa1', b'\x90\x90'):
+            with self.assertRaises(ParseError):
+                MessagePackParser().parse(BytesIO(body))
@@ -0,0 +1,209 @@
+"""
+Tests for SQL fingerprint statistics.
+"""
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from core.sqlstats import SQLStats, fingerprint, get_origin, stats
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class OriginTests(SimpleTestCase):
+    """Test finding the code that issued a query."""
+
+    def test_origin_keeps_core_frames(self):
+        """Test only the instrumentation modules are left out of origins."""
+        origin = get_origin()
+
+        self.assertTrue(origin[0].startswith(
+            os.path.join('core', 'tests', 'test_sqlstats.py')
+        ))
+        self.assertFalse(any(frame.startswith(os.path.join('core',
+                                                           'sqlstats.py'))
+                             for frame in origin))
+
+
+class FingerprintTests(SimpleTestCase):
+    """Test normalizing statements."""
+
+    def test_literals_removed(self):
+        """Test literals and placeholders become `?`."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b = 42\n"
+                        "  AND c = %s LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c = ? LIMIT ?'
+        )
+
+    def test_identifiers_kept(self):
+        """Test digits inside identifiers are kept."""
+        self.assertEqual(
+            fingerprint('SELECT "t1"."col2" FROM "t1"'),
+            'SELECT "t1"."col2" FROM "t1"'
+        )
+
+    def test_lists_collapsed(self):
+        """Test IN lists and multi-row VALUES share one fingerprint."""
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s)'),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO t (a, b) VALUES (...)'
+        )
+
+    def test_savepoints(self):
+        """Test savepoint names are normalized."""
+        self.assertEqual(fingerprint('SAVEPOINT "s1234_x5"'),
+                         fingerprint('SAVEPOINT "s99_x1"'))
+
+
+class SQLStatsTests(SimpleTestCase):
+    """Test aggregating statement timings."""
+
+    def test_top(self):
+        """Test statements are aggregated per fingerprint and view."""
+        sql_stats = SQLStats()
+        for ms in range(1, 101):
+            sql_stats.record(f'SELECT {ms}', ms / 1000, 'a')
+        sql_stats.record('SELECT 1', 0.5, 'b')
+        sql_stats.record('UPDATE t SET a = 1', 0.001, 'a')
+        sql_stats.record_request('a')
+        sql_stats.record_request('a')
+
+        top = sql_stats.top()
+
+        self.assertEqual(len(top), 3)
+        self.assertEqual(top[0]['view'], 'a')
+        self.assertEqual(top[0]['fingerprint'], 'SELECT ?')
+        self.assertEqual(top[0]['count'], 100)
+        self.assertEqual(top[0]['per_request'], 50)
+        self.assertEqual(top[0]['max_ms'], 100)
+        self.assertEqual(top[0]['p95_ms'], 96)
+        self.assertIsNone(top[1]['per_request'])
+
+        merged = sql_stats.top(sort='count', by_view=False)
+        self.assertEqual(merged[0]['count'], 101)
+        self.assertEqual(merged[0]['max_ms'], 500)
+        self.assertEqual(merged[0]['view'], '*')
+
+
+class SQLStatsMiddlewareTests(TestCase):
+    """Test recording the statements of requests."""
+
+    def setUp(self):
+        stats.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Soup')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for n in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {n}', time_minutes=5,
+                price=Decimal('1.00')
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+    def test_no_n_plus_one_in_recipe_list(self):
+        """Test the recipe list runs each statement once per request."""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        rows = [row for row in stats.top(100)
+                if row['view'] == 'recipe:recipe-list']
+        self.assertTrue(rows)
+        for row in rows:
+            self.assertLessEqual(row['per_request'], 1, row['fingerprint'])
+
+    @override_settings(SQL_SLOW_QUERY_MS=0)
+    def test_slow_log(self):
+        """Test slow statements are logged with their origin."""
+        with self.assertLogs('core.sqlstats', 'WARNING') as logs:
+            self.client.get(reverse('recipe:recipe-detail',
+                                    args=(Recipe.objects.first().pk,)))
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'recipe:recipe-detail')
+        self.assertIn('?', entry['fingerprint'])
+        self.assertTrue(entry['origin'])
+        self.assertFalse(any('site-packages' in frame
+                             for frame in entry['origin']))
+
+    def test_streamed_statements_recorded(self):
+        """Test statements run while streaming are recorded."""
+        res = self.client.get(reverse('recipe:recipe-export'))
+        b''.join(res.streaming_content)
+
+        self.assertTrue(any(
+            row['view'] == 'recipe:recipe-export' and
+            'core_recipe_tags' in row['fingerprint']
+            for row in stats.top(100)
+        ))
+
+    def test_internal_endpoint(self):
+        """Test the top statements are served as JSON."""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(reverse('sql-top'),
+                              {'sort': 'count', 'limit': 2})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()['statements']), 2)
+
+
+class SQLTopCommandTests(TestCase):
+    """Test the sql_top command."""
+
+    def test_slow_log(self):
+        """Test a slow log is aggregated."""
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as file:
+            for ms in (10, 30):
+                file.write(json.dumps({
+                    'ms': ms, 'view': 'recipe:recipe-list',
+                    'sql': f'SELECT * FROM core_recipe LIMIT {ms}',
+                }) + '\n')
+            file.write('not json\n')
+        out = StringIO()
+
+        call_command('sql_top', slow_log=path, json=True, stdout=out)
+
+        rows = json.loads(out.getvalue())
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['count'], 2)
+        self.assertEqual(rows[0]['total_ms'], 40)
+
+    def test_load_test(self):
+        """Test the statements of a load test run are reported."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media_root,
+                                 RECIPE_IMAGE_PROCESS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('seed_dataset', users=1, recipes_per_user=5, tags=3,
+                     ingredients=3, stdout=StringIO(), stderr=StringIO())
+        out = StringIO()
+
+        call_command('sql_top', requests=30, host='testserver', limit=5,
+                     stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn('total_ms', lines[0])
+        self.assertEqual(len(lines), 1 + 5 * 2)
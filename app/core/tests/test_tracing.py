@@ -0,0 +1,220 @@
+"""
+Tests for request tracing.
+"""
+import json
+import os
+import tempfile
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag
+from core.tracing import Span, Trace, span, start_trace
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def parse_server_timing(header):
+    """Return `{name: duration}` of a `Server-Timing` header."""
+    timings = {}
+    for entry in header.split(', '):
+        name, *params = entry.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        timings[name] = float(params['dur'])
+    return timings
+
+
+class SpanTests(SimpleTestCase):
+    """Test timing spans."""
+
+    def test_no_trace(self):
+        """Test spans do nothing outside a trace."""
+        with span('auth') as current:
+            self.assertIsNone(current)
+
+    def test_nesting(self):
+        """Test spans nest and stages count their own time."""
+        with start_trace('GET') as trace:
+            with span('serialize') as outer:
+                with span('sql') as inner:
+                    pass
+        trace.finish('GET recipe:recipe-list', 200)
+
+        self.assertIs(inner.parent, outer)
+        self.assertIs(outer.parent, trace.root)
+        self.assertEqual(set(trace.stages), {'sql', 'serialize', 'app'})
+        self.assertEqual(
+            sum(self_ns for self_ns, _ in trace.stages.values()),
+            trace.root.end - trace.root.start
+        )
+
+    def test_errors(self):
+        """Test spans left with an exception are marked as errors."""
+        with start_trace('GET') as trace:
+            with self.assertRaises(ValueError):
+                with span('render') as failed:
+                    raise ValueError
+        trace.finish('GET', 200)
+
+        self.assertTrue(failed.error)
+        self.assertEqual(
+            trace.to_otlp()['resourceSpans'][0]['scopeSpans'][0]['spans']
+            [0]['status'], {'code': 2}
+        )
+
+    def test_max_spans(self):
+        """Test spans over the limit are timed but not kept."""
+        trace = Trace('GET', max_spans=3)
+        for _ in range(5):
+            trace.add(Span(trace, 'sql', trace.root), 1)
+        trace.finish('GET', 200)
+
+        self.assertEqual(len(trace.spans), 3)
+        self.assertIs(trace.spans[-1], trace.root)
+        self.assertEqual(trace.stages['sql'], [5, 5])
+        self.assertEqual(trace.root.attributes['trace.dropped_spans'], 3)
+
+
+class TracingMiddlewareTests(TestCase):
+    """Test tracing API requests."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+        tag = Tag.objects.create(user=self.user, name='Soup')
+        for n in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {n}', time_minutes=5,
+                price=Decimal('1.00')
+            )
+            recipe.tags.add(tag)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def read_traces(self):
+        """Return the exported traces."""
+        with open(self.path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_server_timing(self):
+        """Test the recipe list reports the time of each stage."""
+        res = self.client.get(RECIPES_URL, {'title': 'Recipe'})
+
+        timings = parse_server_timing(res['Server-Timing'])
+        self.assertTrue({'auth', 'filter', 'sql', 'serialize', 'render',
+                         'app', 'total'} <= set(timings))
+        self.assertAlmostEqual(
+            sum(timings.values()) - timings['total'], timings['total'],
+            delta=0.01
+        )
+
+    @override_settings(RECIPE_FAST_LIST=True)
+    def test_fast_list_serialize(self):
+        """Test the fast list path is timed as serialization."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIn('serialize', parse_server_timing(res['Server-Timing']))
+
+    @override_settings(TRACE_SERVER_TIMING=False, INTERNAL_IPS=[])
+    def test_server_timing_hidden(self):
+        """Test the header is not sent to other clients by default."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(TRACE_SERVER_TIMING=False, INTERNAL_IPS=[])
+    def test_server_timing_staff(self):
+        """Test the header is sent to staff users."""
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIn('Server-Timing', res)
+
+    @override_settings(TRACE_SERVER_TIMING=True, INTERNAL_IPS=[])
+    def test_server_timing_on(self):
+        """Test the header can be sent to every client."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIn('Server-Timing', res)
+
+    def test_export_slow(self):
+        """Test slow requests are exported as OTLP JSON."""
+        with self.settings(TRACE_EXPORT_FILE=self.path, TRACE_SLOW_MS=0,
+                           TRACE_SAMPLE_RATE=0):
+            self.client.get(RECIPES_URL)
+
+        trace, = self.read_traces()
+        resource, = trace['resourceSpans']
+        self.assertIn({'key': 'service.name',
+                       'value': {'stringValue': 'recipe-api'}},
+                      resource['resource']['attributes'])
+        spans = resource['scopeSpans'][0]['spans']
+        root = spans[-1]
+        self.assertEqual(root['name'], 'GET recipe:recipe-list')
+        self.assertEqual(root['kind'], 2)
+        self.assertNotIn('parentSpanId', root)
+        attributes = {item['key']: item['value']
+                      for item in root['attributes']}
+        self.assertEqual(attributes['sampling.reason'],
+                         {'stringValue': 'slow'})
+        self.assertEqual(attributes['http.status_code'],
+                         {'intValue': '200'})
+
+        ids = {item['spanId'] for item in spans}
+        self.assertEqual({item['traceId'] for item in spans},
+                         {root['traceId']})
+        for item in spans[:-1]:
+            self.assertIn(item['parentSpanId'], ids)
+            self.assertLessEqual(int(item['startTimeUnixNano']),
+                                 int(item['endTimeUnixNano']))
+        statements = [item for item in spans if item['name'] == 'sql']
+        self.assertTrue(statements)
+        self.assertTrue(all(item['kind'] == 3 for item in statements))
+
+    def test_sql_stage(self):
+        """Test statements are tagged with the stage they ran in."""
+        with self.settings(TRACE_EXPORT_FILE=self.path, TRACE_SLOW_MS=0,
+                           TRACE_SAMPLE_RATE=0):
+            self.client.get(RECIPES_URL)
+
+        trace, = self.read_traces()
+        spans = trace['resourceSpans'][0]['scopeSpans'][0]['spans']
+        stages = {}
+        for item in spans:
+            if item['name'] != 'sql':
+                continue
+            attributes = {attribute['key']: attribute['value']
+                          for attribute in item['attributes']}
+            statement = attributes['db.statement']['stringValue']
+            stages[statement] = attributes['stage']['stringValue']
+        filtered, = [stage for statement, stage in stages.items()
+                     if statement.startswith('SELECT "core_recipe"."id"')]
+        self.assertEqual(filtered, 'serialize')
+        self.assertIn('auth', stages.values())
+
+    def test_fast_requests_dropped(self):
+        """Test fast requests are not exported unless sampled."""
+        with self.settings(TRACE_EXPORT_FILE=self.path, TRACE_SLOW_MS=60000,
+                           TRACE_SAMPLE_RATE=0):
+            self.client.get(RECIPES_URL)
+        self.assertEqual(self.read_traces(), [])
+
+        with self.settings(TRACE_EXPORT_FILE=self.path, TRACE_SLOW_MS=60000,
+                           TRACE_SAMPLE_RATE=1):
+            self.client.get(RECIPES_URL)
+        trace, = self.read_traces()
+        root = trace['resourceSpans'][0]['scopeSpans'][0]['spans'][-1]
+        self.assertIn({'key': 'sampling.reason',
+                       'value': {'stringValue': 'sampled'}},
+                      root['attributes'])
@@ -0,0 +1,263 @@
+"""
+Request tracing with a `Server-Timing` header and OTLP/JSON export.
+
+`TracingMiddleware` (see `core.middleware`) opens a trace for each
+request and records its SQL statements. `span()` times the other stages
+inside it: token authentication (`auth`), the filter backends
+(`filter`), the serializer output (`serialize`) and the renderer
+(`render`). Outside a traced request `span()` does nothing.
+
+Querysets are lazy, so `filter` only times building the query: the
+filtered SQL runs when the queryset is evaluated, usually while paging
+or serializing, and is reported under `sql`. Each `sql` span carries
+the stage it ran in as its `stage` attribute.
+
+The `Server-Timing` header gives each stage's own time, without the
+stages nested in it, so the entries add up to `total`; `app` is the
+rest of the request. Sampling is tail-based: once the request is done,
+its trace is kept when it took at least `TRACE_SLOW_MS`, failed with a
+server error or is drawn with probability `TRACE_SAMPLE_RATE`. Kept
+traces are appended to `TRACE_EXPORT_FILE` as OTLP/JSON
+`ExportTraceServiceRequest` objects, one per line, the format the
+OpenTelemetry Collector's `otlpjsonfile` receiver reads.
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from rest_framework.serializers import ListSerializer
+from .sqlstats import fingerprint
+
+SERVICE_NAME = 'recipe-api'
+# OTLP `Span.SpanKind` and `Status.StatusCode` values.
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+current_span = ContextVar('current_span', default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    """One timed stage of a trace."""
+    __slots__ = ('trace', 'name', 'kind', 'span_id', 'parent', 'attributes',
+                 'start', 'end', 'child_ns', 'error')
+
+    def __init__(self, trace, name, parent=None, kind=SPAN_KIND_INTERNAL,
+                 attributes=None):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = attributes or {}
+        self.child_ns = 0
+        self.error = False
+        self.end = None
+        self.start = time.perf_counter_ns()
+
+    def finish(self):
+        """End the span and charge its time to its trace and parent."""
+        self.end = time.perf_counter_ns()
+        duration = self.end - self.start
+        if self.parent is not None:
+            self.parent.child_ns += duration
+        self.trace.add(self, duration - self.child_ns)
+
+    def to_otlp(self):
+        """Return the span as an OTLP/JSON `Span`."""
+        offset = self.trace.start_unix_ns - self.trace.root.start
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start + offset),
+            'endTimeUnixNano': str(self.end + offset),
+            'attributes': encode_attributes(self.attributes),
+            'status': {'code': STATUS_CODE_ERROR} if self.error else {},
+        }
+        if self.parent is not None:
+            data['parentSpanId'] = self.parent.span_id
+        return data
+
+
+class Trace:
+    """
+    The spans of one request.
+
+    Every span is timed, but only the first `max_spans` are kept for
+    export; the root span always is.
+    """
+    # Server-Timing name of the root span's own time.
+    root_stage = 'app'
+
+    def __init__(self, name, attributes=None, max_spans=1000):
+        self.trace_id = os.urandom(16).hex()
+        self.max_spans = max_spans
+        self.spans = []
+        self.dropped = 0
+        self.stages = {}
+        self.start_unix_ns = time.time_ns()
+        self.root = Span(self, name, kind=SPAN_KIND_SERVER,
+                         attributes=attributes)
+
+    @property
+    def duration_ms(self):
+        return (self.root.end - self.root.start) / 1e6
+
+    def add(self, span, self_ns):
+        """Record a finished span that spent `self_ns` outside children."""
+        stage = self.root_stage if span is self.root else span.name
+        totals = self.stages.setdefault(stage, [0, 0])
+        totals[0] += self_ns
+        totals[1] += 1
+        if span is self.root or len(self.spans) < self.max_spans - 1:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def finish(self, name, status_code):
+        """End the root span, naming it after the resolved route."""
+        self.root.name = name
+        self.root.attributes['http.status_code'] = status_code
+        self.root.error = status_code >= 500
+        if self.dropped:
+            self.root.attributes['trace.dropped_spans'] = self.dropped
+        self.root.finish()
+
+    def server_timing(self):
+        """Return the `Server-Timing` header value of the trace."""
+        entries = []
+        for stage, (self_ns, count) in self.stages.items():
+            entry = f'{stage};dur={self_ns / 1e6:.3f}'
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        entries.append(f'total;dur={self.duration_ms:.3f}')
+        return ', '.join(entries)
+
+    def to_otlp(self):
+        """Return the trace as an OTLP/JSON `ExportTraceServiceRequest`."""
+        return {'resourceSpans': [{
+            'resource': {
+                'attributes': encode_attributes({
+                    'service.name': SERVICE_NAME,
+                }),
+            },
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in self.spans],
+            }],
+        }]}
+
+
+def encode_attributes(attributes):
+    """Return `attributes` as a list of OTLP/JSON `KeyValue`s."""
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            value = {'boolValue': value}
+        elif isinstance(value, int):
+            value = {'intValue': str(value)}
+        elif isinstance(value, float):
+            value = {'doubleValue': value}
+        else:
+            value = {'stringValue': str(value)}
+        encoded.append({'key': key, 'value': value})
+    return encoded
+
+
+@contextmanager
+def span(name, attributes=None, kind=SPAN_KIND_INTERNAL):
+    """Time the block as a `name` span of the current trace, if any."""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent, kind, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.error = True
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+@contextmanager
+def start_trace(name, attributes=None):
+    """Make a new trace current for the block and yield it."""
+    trace = Trace(name, attributes,
+                  getattr(settings, 'TRACE_MAX_SPANS', 1000))
+    token = current_span.set(trace.root)
+    try:
+        yield trace
+    finally:
+        current_span.reset(token)
+
+
+def get_stage(current):
+    """Return the name of the stage open at span `current`."""
+    if current is current.trace.root:
+        return current.trace.root_stage
+    return current.name
+
+
+def trace_query(execute, sql, params, many, context):
+    """`connection.execute_wrapper` timing statements in `sql` spans."""
+    parent = current_span.get()
+    if parent is None:
+        return execute(sql, params, many, context)
+    with span('sql', {
+        'db.system': context['connection'].vendor,
+        'db.statement': fingerprint(sql),
+        'stage': get_stage(parent),
+    }, SPAN_KIND_CLIENT):
+        return execute(sql, params, many, context)
+
+
+def get_sampling_reason(trace):
+    """Return why a finished trace is kept, or None to drop it."""
+    if trace.root.error:
+        return 'error'
+    if trace.duration_ms >= getattr(settings, 'TRACE_SLOW_MS', 500):
+        return 'slow'
+    if random.random() < getattr(settings, 'TRACE_SAMPLE_RATE', 0):
+        return 'sampled'
+    return None
+
+
+def export(trace, path):
+    """Append `trace` to the OTLP/JSON lines file at `path`."""
+    line = json.dumps(trace.to_otlp(), separators=(',', ':'))
+    with _export_lock, open(path, 'a', encoding='utf-8') as file:
+        file.write(line + '\n')
+
+
+class TracedSerializerMixin:
+    """
+    Serializer mixin timing top-level output in a `serialize` span.
+
+    Nested serializers, and the children of a traced list, are timed as
+    part of their parent. Use `TracedListSerializer` as the Meta
+    `list_serializer_class` so `many=True` lists get a single span.
+    """
+
+    def to_representation(self, instance):
+        if self.parent is not None or current_span.get() is None:
+            return super().to_representation(instance)
+        serializer = getattr(self, 'child', self)
+        with span('serialize', {'serializer': type(serializer).__name__}):
+            return super().to_representation(instance)
+
+
+class TracedListSerializer(TracedSerializerMixin, ListSerializer):
+    """`ListSerializer` timing its output in one `serialize` span."""
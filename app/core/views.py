@@ -0,0 +1,37 @@
+"""
+Internal views of the API.
+"""
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from user.authentication import token_cache
+from .metrics import CONTENT_TYPE, registry, render_gauges
+from .sqlstats import SORT_KEYS, stats as sql_stats
+
+
+def check_internal(request):
+    """Hide internal views from clients not in `INTERNAL_IPS`."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404
+
+
+def metrics(request):
+    """Return the request metrics for Prometheus, to internal IPs only."""
+    check_internal(request)
+    body = registry.render() + render_gauges('token_cache',
+                                             token_cache.stats())
+    return HttpResponse(body, content_type=CONTENT_TYPE)
+
+
+def sql_top(request):
+    """Return the costliest SQL fingerprints, to internal IPs only."""
+    check_internal(request)
+    sort = request.GET.get('sort', 'total_ms')
+    if sort not in SORT_KEYS:
+        sort = 'total_ms'
+    try:
+        limit = max(int(request.GET.get('limit', 20)), 1)
+    except ValueError:
+        limit = 20
+    return JsonResponse({'statements': sql_stats.top(
+        limit, sort, by_view=request.GET.get('by') != 'fingerprint'
+    )})
@@ -0,0 +1,184 @@
+"""
+Batch creation and update of recipes.
+"""
+from django.db import transaction
+from django.utils import timezone
+from core.models import Recipe, Tag, Ingredient
+from .signals import invalidate_user_cache
+from .serializers import (
+    NAME_LOOKUP_BATCH_SIZE,
+    RecipeDetailSerializer,
+    get_or_create_named,
+)
+
+
+class RecipeBatch:
+    """
+    Validate and apply a list of recipe payloads for one user.
+
+    Items use the `RecipeDetailSerializer` format. An item without `id`
+    creates a recipe; an item with `id` partially updates that recipe.
+    Every item is validated first, then all valid items are written in
+    one transaction with bulk inserts for recipes, tags, ingredients and
+    through rows. `results` holds one entry per item, in input order.
+    """
+    relations = (('tags', Tag), ('ingredients', Ingredient))
+    batch_size = NAME_LOOKUP_BATCH_SIZE
+
+    def __init__(self, items, context):
+        self.items = items
+        self.context = context
+        self.user = context['request'].user
+        self.results = [None] * len(items)
+        self.creates = []
+        self.updates = []
+
+    def _get_instances(self):
+        """Return the user's recipes referenced by item ids."""
+        ids = [
+            item['id'] for item in self.items
+            if isinstance(item, dict) and self._is_id(item.get('id'))
+        ]
+        if not ids:
+            return {}
+        return Recipe.objects.filter(user=self.user, pk__in=ids).in_bulk()
+
+    @staticmethod
+    def _is_id(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    def _error(self, index, errors):
+        self.results[index] = {'status': 'error', 'errors': errors}
+
+    def validate(self):
+        """Validate every item and return True if all of them are valid."""
+        instances = self._get_instances()
+        seen = set()
+        for index, item in enumerate(self.items):
+            if not isinstance(item, dict):
+                self._error(index, {
+                    'non_field_errors': ['Expected a recipe object.']
+                })
+                continue
+
+            instance = None
+            if item.get('id') is not None:
+                pk = item['id']
+                if self._is_id(pk) and pk in seen:
+                    self._error(index, {'id': ['Duplicate id in batch.']})
+                    continue
+                instance = instances.get(pk) if self._is_id(pk) else None
+                if instance is None:
+                    self._error(index, {'id': ['Not found.']})
+                    continue
+                seen.add(pk)
+
+            serializer = RecipeDetailSerializer(
+                instance,
+                data=item,
+                partial=instance is not None,
+                context=self.context
+            )
+            if not serializer.is_valid():
+                self._error(index, serializer.errors)
+            elif instance is None:
+                self.creates.append((index, dict(serializer.validated_data)))
+            else:
+                self.updates.append(
+                    (index, instance, dict(serializer.validated_data))
+                )
+
+        return all(result is None for result in self.results)
+
+    @property
+    def has_valid_items(self):
+        return bool(self.creates or self.updates)
+
+    def skip(self):
+        """Mark the valid items as not applied, for a rejected batch."""
+        for index, *_ in self.creates + self.updates:
+            self.results[index] = {'status': 'skipped'}
+        self.creates, self.updates = [], []
+
+    @transaction.atomic
+    def save(self):
+        """Write all valid items and fill in their results."""
+        links = {name: [] for name, _ in self.relations}
+        replaced = {name: [] for name, _ in self.relations}
+
+        created = []
+        for index, data in self.creates:
+            related = {name: data.pop(name, None) for name in links}
+            recipe = Recipe(user=self.user, **data)
+            created.append((index, recipe, related))
+        Recipe.objects.bulk_create(
+            [recipe for _, recipe, _ in created],
+            batch_size=self.batch_size
+        )
+
+        # bulk_update() skips auto_now, and a relation-only change must
+        # still mark the recipe modified.
+        now = timezone.now()
+        updated, update_fields = [], {'updated_at'}
+        for index, recipe, data in self.updates:
+            related = {name: data.pop(name, None) for name in links}
+            for attr, value in data.items():
+                setattr(recipe, attr, value)
+            recipe.updated_at = now
+            update_fields.update(data)
+            updated.append((index, recipe, related))
+            for name, items in related.items():
+                if items is not None:
+                    replaced[name].append(recipe.pk)
+        if updated:
+            Recipe.objects.bulk_update(
+                [recipe for _, recipe, _ in updated],
+                sorted(update_fields),
+                batch_size=self.batch_size
+            )
+
+        for _, recipe, related in created + updated:
+            for name, items in related.items():
+                if items:
+                    links[name].append((recipe, items))
+
+        for name, model in self.relations:
+            self._write_links(name, model, links[name], replaced[name])
+
+        for index, recipe, _ in created:
+            self.results[index] = {'status': 'created', 'id': recipe.pk}
+        for index, recipe, _ in updated:
+            self.results[index] = {'status': 'updated', 'id': recipe.pk}
+
+        # Bulk writes bypass model signals.
+        if created or updated:
+            Recipe.objects.filter(pk__in=[
+                recipe.pk for _, recipe, _ in created + updated
+            ]).update_search_vector()
+            invalidate_user_cache(self.user.pk)
+
+    def _write_links(self, name, model, links, replaced):
+        """Replace the `name` through rows of the batch recipes."""
+        through = getattr(Recipe, name).through
+        column = f'{model._meta.model_name}_id'
+        # Bulk writes bypass m2m_changed, so recount recipe_count here.
+        counted = set()
+        if replaced:
+            removed = through.objects.filter(recipe_id__in=replaced)
+            counted.update(removed.values_list(column, flat=True))
+            removed.delete()
+
+        names = [item['name'] for _, items in links for item in items]
+        objects = get_or_create_named(model, self.user, names)
+        rows = sorted({
+            (recipe.pk, objects[item['name']].pk)
+            for recipe, items in links for item in items
+        })
+        through.objects.bulk_create(
+            [through(recipe_id=pk, **{column: obj_pk}) for pk, obj_pk in rows],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        counted.update(obj_pk for _, obj_pk in rows)
+        if counted:
+            model.objects.filter(pk__in=counted).update_recipe_count()
@@ -0,0 +1,96 @@
+"""
+Per-user response cache for recipe APIs.
+
+Cached responses are keyed by user, endpoint, the scheme and host they
+were requested through (their bodies hold absolute URLs) and the
+normalized query parameters, and carry the user's current generation
+number. Any write to a user's recipes, tags or ingredients bumps that
+number, so every cached response of the user stops matching at once
+without having to find and delete individual keys.
+
+Generations only reach other processes through a shared backend, so
+with a process-local one (`LocMemCache`) a worker that did not handle a
+write keeps serving the old responses. The cache is therefore off with
+such a backend unless `RECIPE_CACHE_ALLOW_LOCAL` says the API runs in a
+single process.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = 'recipe-api'
+
+
+def get_cache():
+    """Return the cache backend used for recipe responses."""
+    return caches[getattr(settings, 'RECIPE_CACHE_ALIAS', 'default')]
+
+
+def is_process_local():
+    """Return True if the backend is not shared between processes."""
+    return isinstance(get_cache(), LocMemCache)
+
+
+def is_enabled():
+    """Return True if responses may be cached."""
+    return (getattr(settings, 'RECIPE_CACHE_ALLOW_LOCAL', False) or
+            not is_process_local())
+
+
+def get_timeout():
+    """Return the lifetime of cached responses, in seconds."""
+    return getattr(settings, 'RECIPE_CACHE_TIMEOUT', 300)
+
+
+def _generation_key(user_id):
+    return f'{KEY_PREFIX}:gen:{user_id}'
+
+
+def _initial_generation():
+    # Seed from the clock so a generation evicted from the cache never
+    # restarts at a number older entries were stored under.
+    return time.time_ns() // 1000
+
+
+def get_generation(user_id):
+    """Return the current cache generation of a user."""
+    cache = get_cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """Invalidate every cached response of a user."""
+    cache = get_cache()
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_generation(), timeout=None)
+
+
+def normalize_query_params(query_params):
+    """Return a stable string for a `QueryDict`, whatever its order."""
+    items = sorted(
+        (key, sorted(query_params.getlist(key))) for key in query_params
+    )
+    return repr(items)
+
+
+def get_response_key(request, endpoint, generation=None):
+    """Return the cache key of `endpoint` for the request's user."""
+    user_id = request.user.pk
+    if generation is None:
+        generation = get_generation(user_id)
+    params = '\n'.join((
+        request.scheme, request.get_host(),
+        normalize_query_params(request.query_params),
+    ))
+    digest = hashlib.sha1(params.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:resp:{user_id}:{generation}:{endpoint}:{digest}'
@@ -0,0 +1,21 @@
+"""
+System checks for recipe APIs.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+from . import cache
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    """Warn when the response cache is off for a process-local backend."""
+    if cache.is_enabled() or not cache.is_process_local():
+        return []
+    return [Warning(
+        'The recipe response cache is disabled: the '
+        f'{getattr(settings, "RECIPE_CACHE_ALIAS", "default")!r} cache is '
+        'local to each process, so workers would serve stale lists.',
+        hint='Configure a shared backend (CACHE_BACKEND) or set '
+             'RECIPE_CACHE_ALLOW_LOCAL when running a single process.',
+        id='recipe.W001',
+    )]
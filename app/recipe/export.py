@@ -0,0 +1,45 @@
+"""
+Streaming export of recipe collections.
+"""
+from itertools import islice
+from django.db.models import prefetch_related_objects
+from .fastpath import FastListSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def iter_recipe_chunks(queryset, serializer, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the serialized recipes of `queryset` in lists of `chunk_size`.
+
+    Rows are read through a server-side cursor and the nested relations
+    of each chunk with one query per relation, so memory use is bounded
+    by the chunk size rather than the number of recipes. Serializers the
+    fast path cannot express are run on model instances instead, with
+    the queryset's prefetches applied per chunk.
+    """
+    fast = FastListSerializer(serializer)
+    if not fast.supported:
+        yield from iter_instance_chunks(queryset, serializer, chunk_size)
+        return
+    rows = fast.get_values(queryset).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield fast.to_representation(chunk)
+
+
+def iter_instance_chunks(queryset, serializer, chunk_size):
+    """Yield `serializer` output of prefetched chunks of `queryset`."""
+    # iterator() ignores prefetch_related(), so prefetch each chunk.
+    lookups = queryset._prefetch_related_lookups
+    instances = queryset.prefetch_related(None).iterator(
+        chunk_size=chunk_size
+    )
+    while True:
+        chunk = list(islice(instances, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *lookups)
+        yield [serializer.to_representation(obj) for obj in chunk]
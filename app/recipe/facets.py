@@ -0,0 +1,68 @@
+"""
+Facet counts of a filtered set of recipes.
+"""
+from django.db.models import CharField, Count, Q, Value
+from core.models import Recipe
+
+# Lower bounds of the histogram buckets; the last bucket is open ended.
+HISTOGRAM_BUCKETS = {
+    'price': (0, 5, 10, 20, 50),
+    'time_minutes': (0, 15, 30, 60, 120),
+}
+
+
+def get_link_counts(name, user, matching):
+    """Return `(relation, id, name, count)` of every `name` of the user."""
+    model = getattr(Recipe, name).field.related_model
+    return model.objects.filter(user=user).order_by().annotate(
+        relation=Value(name, output_field=CharField()),
+        count=Count('recipe', filter=Q(recipe__in=matching)),
+    ).values_list('relation', 'id', 'name', 'count')
+
+
+def get_histogram_buckets(field):
+    """Return the `(lower, upper)` bounds of the buckets of `field`."""
+    lowers = HISTOGRAM_BUCKETS[field]
+    return list(zip(lowers, lowers[1:] + (None,)))
+
+
+def get_histogram_aggregates():
+    """Return one filtered `Count` per histogram bucket."""
+    aggregates = {}
+    for field in HISTOGRAM_BUCKETS:
+        for lower, upper in get_histogram_buckets(field):
+            condition = Q(**{f'{field}__gte': lower})
+            if upper is not None:
+                condition &= Q(**{f'{field}__lt': upper})
+            aggregates[f'{field}_{lower}'] = Count('pk', filter=condition)
+    return aggregates
+
+
+def get_recipe_facets(queryset, user):
+    """
+    Count the recipes of `queryset` per tag, ingredient and bucket.
+
+    Runs two queries: a UNION of the grouped tag and ingredient link
+    counts, and one aggregate computing every histogram bucket. Every
+    tag and ingredient of `user` is listed, those no matching recipe
+    uses with a count of 0, so clients can show them as disabled.
+    """
+    matching = queryset.order_by().values('pk')
+    links = get_link_counts('tags', user, matching).union(
+        get_link_counts('ingredients', user, matching), all=True
+    )
+    totals = queryset.order_by().aggregate(
+        count=Count('pk'), **get_histogram_aggregates()
+    )
+
+    facets = {'count': totals['count'], 'tags': [], 'ingredients': []}
+    for relation, pk, name, count in sorted(
+            links, key=lambda row: (-row[3], row[2], row[1])):
+        facets[relation].append({'id': pk, 'name': name, 'count': count})
+    for field in HISTOGRAM_BUCKETS:
+        facets[field] = [
+            {'min': lower, 'max': upper,
+             'count': totals[f'{field}_{lower}']}
+            for lower, upper in get_histogram_buckets(field)
+        ]
+    return facets
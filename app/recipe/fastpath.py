@@ -0,0 +1,144 @@
+"""
+Read-only fast path for serializing model lists.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.serializers import ListSerializer, ModelSerializer
+
+
+class FastListSerializer:
+    """
+    Serialize rows without DRF's per-field machinery.
+
+    The plan is compiled once from a `ModelSerializer` instance: fields
+    reading a plain column are loaded with `values()`, nested `many=True`
+    model serializers of M2M relations with one `values_list()` query on
+    the through table for all rows, and each row is assembled as a plain
+    dict in the serializer's field order. Fields whose representation is
+    the database value itself are copied as is, the others go through
+    their own `to_representation()`, so the output matches the
+    serializer's. Serializers with fields the plan cannot express (method
+    fields, dotted sources, foreign keys, files) are not `supported`.
+    """
+    passthrough_fields = (
+        serializers.CharField,
+        serializers.EmailField,
+        serializers.IntegerField,
+        serializers.SlugField,
+        serializers.URLField,
+    )
+    # Fields that need the model attribute rather than the column value.
+    unsupported_fields = (serializers.FileField, serializers.RelatedField)
+
+    def __init__(self, serializer):
+        serializer = getattr(serializer, 'child', serializer)
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        self.fields = self.compile(self.model, serializer, nested=True)
+        self.supported = self.fields is not None
+
+    def get_column(self, model, field):
+        """Return `(column, converter)` if `field` reads a single column."""
+        if (field.source == '*' or '.' in field.source or
+                isinstance(field, self.unsupported_fields)):
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.is_relation:
+            return None
+        if type(field) in self.passthrough_fields:
+            return model_field.attname, None
+        return model_field.attname, field.to_representation
+
+    def get_relation(self, model, field):
+        """Return `(m2m field, child plan)` for a nested M2M serializer."""
+        child = getattr(field, 'child', None)
+        if not (isinstance(field, ListSerializer) and
+                isinstance(child, ModelSerializer) and
+                '.' not in field.source):
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not (model_field.many_to_many and model_field.concrete):
+            return None
+        plan = self.compile(child.Meta.model, child, nested=False)
+        if plan is None:
+            return None
+        return model_field, plan
+
+    def compile(self, model, serializer, nested):
+        """Return the `(name, kind, spec)` plan of `serializer`, or None."""
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            column = self.get_column(model, field)
+            if column is not None:
+                plan.append((name, 'column', column))
+                continue
+            relation = nested and self.get_relation(model, field)
+            if not relation:
+                return None
+            plan.append((name, 'relation', relation))
+        return plan
+
+    def get_values(self, queryset, *extra):
+        """Return `queryset` as dicts of the columns the plan reads."""
+        columns = {self.pk, *extra}
+        columns.update(
+            spec[0] for _, kind, spec in self.fields if kind == 'column'
+        )
+        return queryset.prefetch_related(None).values(*sorted(columns))
+
+    def get_related(self, m2m_field, plan, pks):
+        """Return `{pk: [item, ...]}` of one nested relation, in pk order."""
+        through = m2m_field.remote_field.through
+        source = m2m_field.m2m_column_name()
+        target = m2m_field.m2m_reverse_field_name()
+        names = [name for name, _, _ in plan]
+        columns = [f'{target}__{spec[0]}' for _, _, spec in plan]
+        converters = [spec[1] for _, _, spec in plan]
+        rows = through.objects.filter(**{f'{source}__in': pks}).order_by(
+            m2m_field.m2m_reverse_name()
+        ).values_list(source, *columns)
+
+        related = {}
+        for pk, *values in rows.iterator():
+            item = {}
+            for name, value, convert in zip(names, values, converters):
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            related.setdefault(pk, []).append(item)
+        return related
+
+    def to_representation(self, rows):
+        """Return the serialized list of the `get_values()` rows."""
+        rows = list(rows)
+        pks = [row[self.pk] for row in rows]
+        fields = []
+        for name, kind, spec in self.fields:
+            if kind == 'column':
+                fields.append((name, *spec))
+                continue
+            related = self.get_related(*spec, pks) if pks else {}
+            fields.append((
+                name,
+                self.pk,
+                lambda pk, related=related: related.get(pk, [])
+            ))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                value = row[column]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
@@ -1,6 +1,23 @@
 """
 Custom filters to enable advanced data filtering.
 """
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+)
+from django.db.models.functions import Cast
 from django_filters import FilterSet, filters
 from core.models import Recipe, Ingredient, Tag
 
@@ -10,43 +27,112 @@ class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
 
 
 class RecipeFilter(FilterSet):
-    """Filter recipes."""
-    tags_in = NumberInFilter(field_name='tags__id', lookup_expr='in')
-    ingredients_in = NumberInFilter(
-        field_name='ingredients__id',
-        lookup_expr='in'
-    )
+    """
+    Filter recipes.
+
+    Tag and ingredient filters are written as (anti/semi-join) subqueries
+    on the M2M through tables, so the recipe rows are never multiplied by
+    a join and no DISTINCT is needed.
+    """
+    tags_in = NumberInFilter(field_name='tags', method='filter_any')
+    tags_all = NumberInFilter(field_name='tags', method='filter_all')
+    tags_none = NumberInFilter(field_name='tags', method='filter_none')
+    ingredients_in = NumberInFilter(field_name='ingredients',
+                                    method='filter_any')
+    ingredients_all = NumberInFilter(field_name='ingredients',
+                                     method='filter_all')
+    ingredients_none = NumberInFilter(field_name='ingredients',
+                                      method='filter_none')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = []
 
-    def filter_queryset(self, queryset):
-        """Distinct queryset."""
-        queryset = super().filter_queryset(queryset)
-        return queryset.distinct()
+    @staticmethod
+    def get_links(name, ids):
+        """Return the `name` through rows linking to any of `ids`."""
+        field = getattr(Recipe, name).field
+        return field.remote_field.through.objects.filter(
+            **{f'{field.m2m_reverse_name()}__in': ids}
+        )
+
+    def filter_any(self, queryset, name, value):
+        """Recipes linked to at least one of the ids."""
+        links = self.get_links(name, value).filter(recipe_id=OuterRef('pk'))
+        return queryset.filter(Exists(links))
+
+    def filter_all(self, queryset, name, value):
+        """Recipes linked to every one of the ids."""
+        # Through rows are unique per (recipe, tag), so a recipe linked
+        # to every id has exactly len(ids) matching rows.
+        matching = self.get_links(name, value).values('recipe_id').annotate(
+            matches=Count('*')
+        ).filter(matches=len(set(value))).values('recipe_id')
+        return queryset.filter(pk__in=matching)
+
+    def filter_none(self, queryset, name, value):
+        """Recipes linked to none of the ids."""
+        links = self.get_links(name, value).filter(recipe_id=OuterRef('pk'))
+        return queryset.filter(~Exists(links))
+
+    def filter_search(self, queryset, name, value):
+        """Full-text search, best matches first."""
+        query = SearchQuery(
+            value,
+            search_type='websearch',
+            config=getattr(settings, 'RECIPE_SEARCH_CONFIG', 'english')
+        )
+        # ts_rank() is a real; as a double it survives cursor round trips.
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=rank
+        ).order_by('-search_rank', '-id')
+
+
+class RecipeAttrFilter(FilterSet):
+    """Base filter of tags and ingredients."""
+    q = filters.CharFilter(method='filter_autocomplete')
+    ordering = filters.OrderingFilter(fields=('id', 'name', 'recipe_count'))
+
+    def filter_autocomplete(self, queryset, name, value):
+        """
+        Prefix and typo tolerant name matching.
+
+        Both conditions are served by the `(user, name gin_trgm_ops)`
+        index. Prefix matches come first, then closer matches, then the
+        most used names.
+        """
+        value = value.strip()
+        prefix = Q(name__trigram_prefix=value)
+        return queryset.filter(
+            prefix | Q(name__trigram_similar=value)
+        ).annotate(
+            prefix_match=ExpressionWrapper(prefix,
+                                           output_field=BooleanField()),
+            similarity=TrigramSimilarity('name', value),
+        ).order_by('-prefix_match', '-similarity', '-recipe_count', 'name',
+                   'id')
+
+    def filter_assigned_only(self, queryset, name, value):
+        """Objects used by at least one recipe, or by none."""
+        if value:
+            return queryset.filter(recipe_count__gt=0)
+        return queryset.filter(recipe_count=0)
 
 
-class IngredientFilter(FilterSet):
+class IngredientFilter(RecipeAttrFilter):
     """Filter ingredients that are assigned to at least one recipe."""
-    assigned_only = filters.BooleanFilter(
-        field_name='recipe',
-        lookup_expr='isnull',
-        exclude=True
-    )
+    assigned_only = filters.BooleanFilter(method='filter_assigned_only')
 
     class Meta:
         model = Ingredient
         fields = []
 
 
-class TagFilter(FilterSet):
+class TagFilter(RecipeAttrFilter):
     """Filter tags that are assigned to at least one recipe."""
-    assigned_only = filters.BooleanFilter(
-        field_name='recipe',
-        lookup_expr='isnull',
-        exclude=True
-    )
+    assigned_only = filters.BooleanFilter(method='filter_assigned_only')
 
     class Meta:
         model = Tag
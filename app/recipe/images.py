@@ -0,0 +1,288 @@
+"""
+Background processing of uploaded recipe images.
+
+Uploads are stored as-is and processed off the request path by a small
+worker pool: the image is decoded, its EXIF orientation applied, its
+metadata stripped, and it is re-encoded as progressive JPEG and WebP at
+full size and at each size in `VARIANT_SIZES`. Responses only link to
+these variants, as the stored upload keeps its metadata.
+
+Jobs live in the worker pool of the process that accepted the upload
+and are lost if it stops; `requeue_stale_images()`, run by the
+`requeue_recipe_images` command, picks up what was left pending or
+processing.
+
+Uploads are deduplicated by content: each distinct image is stored once
+as an `ImageBlob` under a path derived from its SHA-256, and its variants
+are rendered once and shared by every recipe that uses it.
+"""
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+from core.models import ImageBlob, Recipe
+from .signals import invalidate_user_cache
+
+logger = logging.getLogger(__name__)
+
+# Longest side, in pixels, of every generated variant.
+VARIANT_SIZES = {
+    'full': 2048,
+    'large': 1280,
+    'small': 480,
+    'thumbnail': 160,
+}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+
+
+def get_executor():
+    """Return the worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'RECIPE_IMAGE_WORKERS', 2),
+            thread_name_prefix='recipe-image'
+        )
+    return _executor
+
+
+def get_variant_name(source_name, variant, extension):
+    """Return the storage name of a variant of `source_name`."""
+    stem = posixpath.splitext(source_name)[0]
+    return f'{stem}/{variant}.{extension}'
+
+
+def delete_image_files(image_name, variants):
+    """Delete an image and its variants from storage."""
+    names = [name for formats in variants.values()
+             for name in formats.values()]
+    if image_name:
+        names.append(image_name)
+    for name in names:
+        default_storage.delete(name)
+
+
+def render_variants(file, source_name):
+    """Save every variant of the image in `file` and return their names."""
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    variants = {}
+    try:
+        for variant, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            variants[variant] = {}
+            for image_format, (extension, options) in FORMATS.items():
+                buffer = BytesIO()
+                # A fresh encode without `exif`/`icc_profile` drops
+                # metadata.
+                resized.save(buffer, format=image_format.upper(), **options)
+                name = default_storage.save(
+                    get_variant_name(source_name, variant, extension),
+                    ContentFile(buffer.getvalue())
+                )
+                variants[variant][image_format] = name
+    except Exception:
+        # Leave no partial set of variants behind.
+        delete_image_files(None, variants)
+        raise
+    return variants
+
+
+def get_blob_variants(blob_id):
+    """Return the variants already rendered for a blob."""
+    if blob_id is None:
+        return {}
+    variants = ImageBlob.objects.filter(pk=blob_id).values_list(
+        'variants', flat=True
+    ).first()
+    return variants or {}
+
+
+def store_blob_variants(blob_id, variants):
+    """Share rendered variants through their blob; the first render wins."""
+    stored = ImageBlob.objects.filter(pk=blob_id, variants={}).update(
+        variants=variants
+    )
+    if stored:
+        return variants
+    return get_blob_variants(blob_id)
+
+
+def process_recipe_image(recipe_id):
+    """Generate the variants of a recipe's pending image."""
+    claimed = Recipe.objects.filter(
+        pk=recipe_id, image_status=Recipe.ImageStatus.PENDING
+    ).update(image_status=Recipe.ImageStatus.PROCESSING,
+             image_status_at=timezone.now())
+    if not claimed:
+        return
+
+    recipe = Recipe.objects.only('user', 'image', 'image_blob').get(
+        pk=recipe_id
+    )
+    source_name = recipe.image.name
+    blob_id = recipe.image_blob_id
+    status = Recipe.ImageStatus.READY
+    variants = get_blob_variants(blob_id)
+    unused = {}
+    if not variants:
+        try:
+            with recipe.image.open('rb') as file:
+                variants = render_variants(file, source_name)
+        except Exception:
+            logger.exception('Processing image of recipe %s failed',
+                             recipe_id)
+            status = Recipe.ImageStatus.FAILED
+        else:
+            if blob_id is not None:
+                rendered = variants
+                variants = store_blob_variants(blob_id, rendered)
+                if variants is not rendered:
+                    unused = rendered
+
+    # Only publish the result if no newer upload replaced the source.
+    updated = Recipe.objects.filter(pk=recipe_id, image=source_name).update(
+        image_status=status,
+        image_status_at=timezone.now(),
+        image_variants=variants,
+        updated_at=timezone.now()
+    )
+    if updated:
+        invalidate_user_cache(recipe.user_id)
+    elif blob_id is None:
+        unused = variants
+    # Variants stored on a blob are deleted along with it.
+    delete_image_files(None, unused)
+
+
+def _process_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Image job for recipe %s crashed', recipe_id)
+    finally:
+        connection.close()
+
+
+def enqueue_recipe_image(recipe_id):
+    """Process a recipe's image once the current transaction commits."""
+    if getattr(settings, 'RECIPE_IMAGE_PROCESS_EAGER', False):
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(_process_in_worker, recipe_id)
+        )
+
+
+def requeue_stale_images(older_than, enqueue=enqueue_recipe_image):
+    """
+    Queue again the images pending or processing for over `older_than`.
+
+    Their jobs were lost with the process that ran them. Each recipe is
+    reset to pending and passed to `enqueue`; returns their ids.
+    """
+    stale = Recipe.objects.filter(
+        Q(image_status_at__lt=timezone.now() - older_than) |
+        Q(image_status_at__isnull=True),
+        image_status__in=(Recipe.ImageStatus.PENDING,
+                          Recipe.ImageStatus.PROCESSING),
+    )
+    ids = list(stale.values_list('pk', flat=True))
+    # Jobs that moved on since the ids were read are left alone.
+    stale.filter(pk__in=ids).update(
+        image_status=Recipe.ImageStatus.PENDING,
+        image_status_at=timezone.now()
+    )
+    for recipe_id in ids:
+        enqueue(recipe_id)
+    return ids
+
+
+def hash_file(file):
+    """Return the SHA-256 hex digest of an uploaded file."""
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@transaction.atomic
+def attach_image_blob(recipe, blob):
+    """
+    Make `blob` the image of `recipe`, releasing the previous image.
+
+    Returns False, leaving the recipe untouched, if the blob was deleted
+    since it was looked up.
+    """
+    previous_blob_id = None
+    if recipe.image_blob_id != blob.pk:
+        if not ImageBlob.objects.acquire(blob.pk):
+            return False
+        if recipe.image_blob_id is not None:
+            previous_blob_id = recipe.image_blob_id
+        elif recipe.image:
+            # Images uploaded before deduplication belong to one recipe.
+            previous = (recipe.image.name, recipe.image_variants)
+            transaction.on_commit(lambda: delete_image_files(*previous))
+
+    recipe.image_blob = blob
+    recipe.image = blob.file.name
+    if blob.variants:
+        recipe.image_status = Recipe.ImageStatus.READY
+        recipe.image_variants = blob.variants
+    else:
+        recipe.image_status = Recipe.ImageStatus.PENDING
+        recipe.image_variants = {}
+    recipe.image_status_at = timezone.now()
+    recipe.save(update_fields=('image_blob', 'image', 'image_status',
+                               'image_status_at', 'image_variants',
+                               'updated_at'))
+    if previous_blob_id is not None:
+        # Released only once the recipe no longer points at it, as the
+        # last release deletes the blob.
+        ImageBlob.objects.release(previous_blob_id)
+    if not blob.variants:
+        enqueue_recipe_image(recipe.pk)
+    return True
+
+
+def store_recipe_image(recipe, file, sha256=None):
+    """Store an uploaded image deduplicated by content and attach it."""
+    if sha256 is None:
+        sha256 = hash_file(file)
+    blob = ImageBlob.objects.store(file, sha256)
+    if not attach_image_blob(recipe, blob):
+        # The last reference was dropped concurrently; store it afresh.
+        blob = ImageBlob.objects.store(file, sha256)
+        attach_image_blob(recipe, blob)
+    return recipe
+
+
+def get_variant_urls(variants, request=None):
+    """Return absolute URLs for a `{variant: {format: name}}` mapping."""
+    urls = {}
+    for variant, formats in (variants or {}).items():
+        urls[variant] = {}
+        for image_format, name in formats.items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][image_format] = url
+    return urls
@@ -0,0 +1,328 @@
+"""
+Reusable viewset mixins for recipe APIs.
+"""
+import hashlib
+from functools import partial
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Prefetch
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from rest_framework import exceptions
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer, ModelSerializer
+from core.tracing import span
+from . import cache
+from .fastpath import FastListSerializer
+
+
+class PrefetchQuerysetMixin:
+    """
+    Build querysets that load everything an action's serializer renders.
+
+    Views declare, per action, the related fields their serializer nests
+    in `prefetch_related_fields`. `prefetch_queryset()` turns them into
+    `Prefetch` objects whose querysets only select the nested serializer's
+    columns, and for read-only actions restricts the main query with
+    `only()` to the columns the serializer reads.
+    """
+    prefetch_related_fields = {}
+    only_fields_actions = ('list', 'retrieve')
+
+    def get_prefetch_related_fields(self):
+        """Return the relations to prefetch for the current action."""
+        return self.prefetch_related_fields.get(self.action, ())
+
+    def get_only_fields(self, model, fields, relations=()):
+        """Return the concrete columns of `model` read by `fields`."""
+        names = {model._meta.pk.name}
+        for name, field in fields.items():
+            if name in relations or field.source == '*':
+                continue
+            names.add(field.source.split('.')[0])
+
+        columns = []
+        for name in sorted(names):
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.append(name)
+        return columns
+
+    def get_prefetch(self, field):
+        """Return the prefetch lookup for the nested serializer `field`."""
+        child = getattr(field, 'child', None)
+        if not (isinstance(field, ListSerializer) and
+                isinstance(child, ModelSerializer)):
+            return field.source
+        model = child.Meta.model
+        columns = self.get_only_fields(model, child.fields)
+        queryset = model.objects.only(*columns).order_by('pk')
+        return Prefetch(field.source, queryset=queryset)
+
+    def prefetch_queryset(self, queryset):
+        """Apply the action's prefetches and column pruning."""
+        relations = self.get_prefetch_related_fields()
+        fields = self.get_serializer().fields
+
+        prefetches = [
+            self.get_prefetch(fields[name])
+            for name in relations if name in fields
+        ]
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+
+        if self.action in self.only_fields_actions:
+            columns = self.get_only_fields(queryset.model, fields, relations)
+            queryset = queryset.only(*columns, *self.get_ordering_columns())
+        return queryset
+
+    def get_ordering_columns(self):
+        """Return the sort keys the paginator may read for this request."""
+        allowed = {
+            name.lstrip('-') for name in getattr(self, 'ordering_fields', ())
+        }
+        param = getattr(self.paginator, 'ordering_query_param', 'ordering')
+        keys = {
+            getattr(self, 'ordering', '').lstrip('-'),
+            self.request.query_params.get(param, '').lstrip('-'),
+        }
+        return sorted(keys & allowed)
+
+
+class SparseFieldsetMixin:
+    """
+    Let clients pick the fields of read responses.
+
+    `?fields=a,b` keeps only the named fields and `?omit=a,b` drops them.
+    The fields are removed from the serializer itself, so together with
+    `PrefetchQuerysetMixin` the dropped columns are left out of `only()`
+    and the dropped relations are not prefetched.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def get_query_param_list(self, param):
+        """Return the comma separated names of a query parameter."""
+        value = self.request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def prune_fields(self, serializer):
+        """Remove the fields the client did not ask for from `serializer`."""
+        fields = getattr(serializer, 'child', serializer).fields
+        keep = self.get_query_param_list(self.fields_query_param)
+        omit = self.get_query_param_list(self.omit_query_param)
+        for param, names in ((self.fields_query_param, keep),
+                             (self.omit_query_param, omit)):
+            unknown = [name for name in names if name not in fields]
+            if unknown:
+                raise exceptions.ValidationError({param: [
+                    f'Unknown field(s): {", ".join(unknown)}. '
+                    f'Choose from: {", ".join(fields)}.'
+                ]})
+
+        for name in list(fields):
+            if (keep and name not in keep) or name in omit:
+                fields.pop(name)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if (self.action in self.sparse_fieldset_actions and
+                getattr(self, 'request', None) is not None):
+            self.prune_fields(serializer)
+        return serializer
+
+
+class FastListMixin:
+    """
+    Serve `list` with `FastListSerializer` when `RECIPE_FAST_LIST` is on.
+
+    Rows are read with `values()` plus one query per nested relation and
+    assembled without DRF's per-field calls, producing the same output as
+    the view's serializer. Views whose serializer the fast path cannot
+    express keep the regular `list`. Relies on `PrefetchQuerysetMixin`
+    for the sort keys the paginator reads.
+    """
+
+    def get_fast_list_serializer(self):
+        """Return the fast serializer for this request, or None."""
+        if not getattr(settings, 'RECIPE_FAST_LIST', False):
+            return None
+        serializer = FastListSerializer(self.get_serializer())
+        return serializer if serializer.supported else None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_fast_list_serializer()
+        if serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = serializer.get_values(
+            queryset,
+            *self.get_ordering_columns(),
+            *queryset.query.annotations
+        )
+        page = self.paginate_queryset(rows)
+        with span('serialize', {'serializer': type(serializer).__name__}):
+            data = serializer.to_representation(
+                rows if page is None else page
+            )
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class TracedFilterMixin:
+    """
+    Time the view's filter backends in a `filter` span.
+
+    The span only covers building the filtered queryset; its SQL runs
+    later, when the queryset is evaluated, and is timed under `sql`.
+    """
+
+    def filter_queryset(self, queryset):
+        filterset_class = getattr(self, 'filterset_class', None)
+        with span('filter', {
+            'filterset': getattr(filterset_class, '__name__', '-'),
+        }):
+            return super().filter_queryset(queryset)
+
+
+class CachedListMixin:
+    """
+    Serve `list` responses from the per-user response cache.
+
+    The cache generation is read before the response is built, so a
+    response computed while a write is in flight is stored under the old
+    generation and never served afterwards. Other read-only actions can
+    be cached the same way by wrapping their body in
+    `get_cached_response()`. Nothing is cached when `cache.is_enabled()`
+    is false.
+    """
+
+    def get_cache_endpoint(self):
+        """Return the name identifying this endpoint in cache keys."""
+        return f'{self.basename}-{self.action}'
+
+    def get_cached_response(self, request, get_response):
+        """Return the cached response, or cache the one `get_response()`."""
+        if not cache.is_enabled():
+            return get_response()
+        key = cache.get_response_key(request, self.get_cache_endpoint())
+        backend = cache.get_cache()
+        data = backend.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = get_response()
+        if response.status_code == 200:
+            backend.set(key, response.data, cache.get_timeout())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, partial(super().list, request, *args, **kwargs)
+        )
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs with 304 before any serialization runs.
+
+    `retrieve` sends a strong ETag and Last-Modified derived from the
+    object's `updated_at`, which is read with a single-column query.
+    `list` sends a weak ETag derived from the user's cache generation,
+    which changes on every write to the user's data and costs no query.
+    Like the response cache, it is left out when `cache.is_enabled()` is
+    false, as a process-local generation would let other workers answer
+    304 for a changed list.
+    """
+    last_modified_field = 'updated_at'
+
+    def get_representation_key(self, request):
+        """Return what, besides the data, shapes the response body."""
+        return ':'.join((
+            self.get_serializer_class().__qualname__,
+            request.accepted_media_type or '',
+            request.get_host(),
+            cache.normalize_query_params(request.query_params),
+        ))
+
+    def make_etag(self, *parts, weak=False):
+        """Return a quoted ETag hashing `parts`."""
+        value = ':'.join(str(part) for part in parts)
+        digest = hashlib.sha1(value.encode('utf-8')).hexdigest()
+        return f'{"W/" if weak else ""}"{digest}"'
+
+    def set_validators(self, response, etag, last_modified=None):
+        """Add the ETag, Last-Modified and revalidation headers."""
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def get_conditional_response(self, request, etag, last_modified=None):
+        """Return a 304/412 response if the preconditions allow it."""
+        timestamp = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def get_last_modified(self):
+        """Return the requested object's modification time, or None."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        queryset = type(self).queryset.filter(user=self.request.user)
+        try:
+            return queryset.filter(**lookup).values_list(
+                self.last_modified_field, flat=True
+            ).first()
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = self.make_etag(
+            self.kwargs[self.lookup_url_kwarg or self.lookup_field],
+            last_modified.isoformat(),
+            self.get_representation_key(request),
+        )
+        response = self.get_conditional_response(
+            request, etag, last_modified
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+            if response.status_code == 200:
+                self.set_validators(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if not cache.is_enabled():
+            return super().list(request, *args, **kwargs)
+        etag = self.make_etag(
+            self.basename,
+            cache.get_generation(request.user.pk),
+            self.get_representation_key(request),
+            weak=True
+        )
+        response = self.get_conditional_response(request, etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                self.set_validators(response, etag)
+        return response
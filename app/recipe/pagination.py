@@ -0,0 +1,194 @@
+"""
+Keyset (cursor) pagination for recipe APIs.
+"""
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Opaque cursor pagination over a `(sort key, id)` keyset.
+
+    Each page is read with `WHERE (key, id) < (last key, last id)` plus
+    `LIMIT page_size + 1`, so no OFFSET or COUNT(*) query is issued and
+    page 500 costs the same as page 1. The `id` tie breaker keeps the
+    ordering total, which keeps cursors stable on non-unique sort keys
+    and on DISTINCT querysets.
+
+    Pagination is opt-in: it is only applied when the client sends the
+    `cursor` or `page_size` query parameter. Views declare the sort keys
+    clients may use with `ordering_fields` and their default with
+    `ordering`, following the DRF `OrderingFilter` conventions. Querysets
+    annotated with `rank_annotation` (search results) are ordered by it
+    unless the client asks for another key.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering_query_param = 'ordering'
+    ordering = '-id'
+    tie_breaker = 'id'
+    rank_annotation = 'search_rank'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if not self.is_requested(request):
+            return None
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor['r'])
+        order_by = self.get_order_by(reverse)
+        queryset = queryset.order_by(*order_by)
+        if self.cursor is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(self.cursor['k'], reverse)
+                )
+            except (DjangoValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = bool(self.page)
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None and bool(self.page)
+
+        return self.page
+
+    def is_requested(self, request):
+        """Return True if the client asked for a paginated response."""
+        params = request.query_params
+        return (self.cursor_query_param in params or
+                self.page_size_query_param in params)
+
+    def get_ordering(self, request, queryset, view):
+        """Return the sort key as `field` or `-field`."""
+        allowed = tuple(getattr(view, 'ordering_fields', ()))
+        ordering = getattr(view, 'ordering', self.ordering)
+        if self.rank_annotation in queryset.query.annotations:
+            allowed += (self.rank_annotation,)
+            ordering = '-' + self.rank_annotation
+        requested = request.query_params.get(self.ordering_query_param)
+        if requested:
+            if requested.lstrip('-') not in allowed:
+                raise ValidationError({
+                    self.ordering_query_param: [
+                        f'Invalid ordering, choose from: '
+                        f'{", ".join(allowed)}.'
+                    ]
+                })
+            ordering = requested
+        return ordering
+
+    def get_order_by(self, reverse=False):
+        """Return the `order_by()` arguments for the current ordering."""
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-') != reverse
+        prefix = '-' if descending else ''
+        if field == self.tie_breaker:
+            return (prefix + field,)
+        return (prefix + field, prefix + self.tie_breaker)
+
+    def get_keyset_filter(self, position, reverse=False):
+        """Return a filter selecting rows strictly after `position`."""
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-') != reverse
+        lookup = 'lt' if descending else 'gt'
+        value, pk = position
+        if field == self.tie_breaker:
+            return Q(**{f'{field}__{lookup}': value})
+        return (
+            Q(**{f'{field}__{lookup}': value}) |
+            Q(**{field: value, f'{self.tie_breaker}__{lookup}': pk})
+        )
+
+    def get_position(self, instance):
+        """Return the keyset position of `instance`."""
+        field = self.ordering.lstrip('-')
+        if isinstance(instance, dict):
+            return [instance[field], instance[self.tie_breaker]]
+        return [getattr(instance, field), getattr(instance, self.tie_breaker)]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = {
+            'o': self.ordering,
+            'k': self.get_position(self.page[-1]),
+            'r': False,
+        }
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        cursor = {
+            'o': self.ordering,
+            'k': self.get_position(self.page[0]),
+            'r': True,
+        }
+        return self.encode_cursor(cursor)
+
+    def decode_cursor(self, request):
+        """Return the decoded cursor, or None for the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')))
+            position = cursor['k']
+            valid = (
+                cursor['o'] == self.ordering and
+                isinstance(cursor['r'], bool) and
+                isinstance(position, list) and len(position) == 2
+            )
+        except (BinasciiError, UnicodeError, ValueError, TypeError,
+                KeyError):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor
+
+    def encode_cursor(self, cursor):
+        """Return the URL of the page starting after `cursor`."""
+        data = json.dumps(cursor, cls=DjangoJSONEncoder,
+                          separators=(',', ':'))
+        encoded = b64encode(data.encode('utf-8')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters[0]['schema'] = {'type': 'string'}
+        parameters.append({
+            'name': self.ordering_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Sort key, one of: ' + ', '.join(
+                getattr(view, 'ordering_fields', ())
+            ),
+            'schema': {'type': 'string'},
+        })
+        return parameters
@@ -3,99 +3,199 @@ Serializers for recipe APIs.
 """
 from rest_framework import serializers
 from core.models import Recipe, Tag, Ingredient
-
-
-class IngredientSerializer(serializers.ModelSerializer):
+from core.signals import deferred_updates
+from core.tracing import TracedListSerializer, TracedSerializerMixin
+from .images import get_variant_urls, store_recipe_image
+
+NAME_LOOKUP_BATCH_SIZE = 1000
+
+
+def get_or_create_named(model, user, names):
+    """
+    Return a `{name: object}` map of the user's `model` objects.
+
+    Existing names are resolved with `name IN (...)` queries and the
+    missing ones are inserted with one `bulk_create`.
+    """
+    names = list(dict.fromkeys(names))
+    objects = {}
+    for start in range(0, len(names), NAME_LOOKUP_BATCH_SIZE):
+        chunk = names[start:start + NAME_LOOKUP_BATCH_SIZE]
+        for obj in model.objects.filter(user=user, name__in=chunk):
+            objects.setdefault(obj.name, obj)
+
+    missing = [
+        model(user=user, name=name) for name in names if name not in objects
+    ]
+    created = model.objects.bulk_create(
+        missing, batch_size=NAME_LOOKUP_BATCH_SIZE
+    )
+    for obj in created:
+        objects[obj.name] = obj
+    return objects
+
+
+class ImageVariantsField(serializers.Field):
+    """Read-only URLs of processed image variants."""
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs.setdefault('source', 'image_variants')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        urls = get_variant_urls(value, self.context.get('request'))
+        if self.variant is None:
+            return urls
+        return urls.get(self.variant, {}).get('jpeg')
+
+
+class IngredientSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     """Serializer for ingredient objects."""
 
     class Meta:
         model = Ingredient
         fields = ('id', 'name')
         read_only_fields = ('id',)
+        list_serializer_class = TracedListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     """Serializer for tag objects."""
 
     class Meta:
         model = Tag
         fields = ('id', 'name')
         read_only_fields = ('id',)
+        list_serializer_class = TracedListSerializer
+
+
+class IngredientUsageSerializer(IngredientSerializer):
+    """Serializer for ingredient objects with their recipe count."""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('recipe_count',)
+        read_only_fields = ('id', 'recipe_count')
+
 
+class TagUsageSerializer(TagSerializer):
+    """Serializer for tag objects with their recipe count."""
 
-class RecipeSerializer(serializers.ModelSerializer):
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recipe_count',)
+        read_only_fields = ('id', 'recipe_count')
+
+
+class RecipeSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipe objects."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    thumbnail = ImageVariantsField(variant='thumbnail')
 
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'time_minutes', 'price', 'link', 'tags',
-                  'ingredients')
+                  'ingredients', 'thumbnail')
         read_only_fields = ('id', )
+        list_serializer_class = TracedListSerializer
+
+    def _get_or_create_objects(self, model, items):
+        """Return the user's `model` objects named in `items`, in order."""
+        auth_user = self.context['request'].user
+        names = [item['name'] for item in items]
+        objects = get_or_create_named(model, auth_user, names)
+        return [objects[name] for name in dict.fromkeys(names)]
 
     def _get_or_create_tags(self, recipe: Recipe, tags):
         """Handle getting or creating tags as needed."""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                                    name=tag['name'],
-                                    user=auth_user
-                                )
-            recipe.tags.add(tag_obj)
+        recipe.tags.add(*self._get_or_create_objects(Tag, tags))
 
     def _get_or_create_ingredients(self, recipe: Recipe, ingredients):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                                        user=auth_user,
-                                        **ingredient
-                                    )
-            recipe.ingredients.add(ingredient_obj)
+        recipe.ingredients.add(
+            *self._get_or_create_objects(Ingredient, ingredients)
+        )
 
     def create(self, validated_data):
         """create a recipe."""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(recipe, tags)
-        self._get_or_create_ingredients(recipe, ingredients)
+        with deferred_updates():
+            recipe = Recipe.objects.create(**validated_data)
+            self._get_or_create_tags(recipe, tags)
+            self._get_or_create_ingredients(recipe, ingredients)
 
         return recipe
 
     def update(self, instance, validated_data):
         """update recipe."""
-        tags = validated_data.pop('tags', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(instance, tags)
+        with deferred_updates():
+            tags = validated_data.pop('tags', None)
+            if tags is not None:
+                instance.tags.clear()
+                self._get_or_create_tags(instance, tags)
 
-        ingredients = validated_data.pop('ingredients', None)
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(instance, ingredients)
+            ingredients = validated_data.pop('ingredients', None)
+            if ingredients is not None:
+                instance.ingredients.clear()
+                self._get_or_create_ingredients(instance, ingredients)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
 
-        instance.save()
+            instance.save()
         return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
+    # The upload keeps its metadata; only re-encoded variants are served.
+    image = ImageVariantsField(variant='full')
+    images = ImageVariantsField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ('description', 'image')
-        read_only_fields = ('image', )
+        fields = RecipeSerializer.Meta.fields + ('description', 'image',
+                                                 'image_status', 'images')
+        read_only_fields = ('image_status',)
+
+
+class RecipeExportSerializer(RecipeSerializer):
+    """Serializer for exported recipes."""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('description', 'updated_at')
+        read_only_fields = fields
 
 
 class RecipeImagesSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id', )
-        extra_kwargs = {'image': {'required': True}}
+        fields = ('id', 'image', 'image_status', 'images')
+        read_only_fields = ('id', 'image_status')
+        extra_kwargs = {'image': {'required': True, 'write_only': True}}
+
+    def to_representation(self, instance):
+        """Return `image` as the re-encoded full-size JPEG, once ready."""
+        data = super().to_representation(instance)
+        data['image'] = data['images'].get('full', {}).get('jpeg')
+        return data
+
+    def update(self, instance, validated_data):
+        """Store the upload and queue it for processing."""
+        return store_recipe_image(
+            instance,
+            validated_data['image'],
+            validated_data.get('image_sha256')
+        )
+
+
+class RecipeImagePrecheckSerializer(serializers.Serializer):
+    """Serializer for attaching a stored image by its SHA-256."""
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+
+    def validate_sha256(self, value):
+        return value.lower()
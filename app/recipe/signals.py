@@ -0,0 +1,33 @@
+"""
+Signal handlers for recipe APIs.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from core.models import Recipe, Tag, Ingredient
+from . import cache
+
+
+def invalidate_user_cache(user_id):
+    """Drop the user's cached responses now and again on commit."""
+    # The second bump discards anything cached from a concurrent read
+    # that ran before this transaction's writes became visible.
+    cache.bump_generation(user_id)
+    transaction.on_commit(lambda: cache.bump_generation(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_on_write(sender, instance, **kwargs):
+    invalidate_user_cache(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_m2m_change(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_user_cache(instance.user_id)
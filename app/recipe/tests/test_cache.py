@@ -0,0 +1,209 @@
+"""
+Test the per-user response cache of recipe APIs.
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from .. import cache
+from ..checks import check_response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+User = get_user_model()
+
+
+def create_recipe(user, **params):
+    """Create and return recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_CACHE_ALLOW_LOCAL=True)
+class ResponseCacheTests(TestCase):
+    """Test caching and invalidation of list responses."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list request runs no queries."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, res.data)
+
+    def test_query_params_are_normalized(self):
+        """Test parameter order does not change the cache key."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(f'{RECIPES_URL}?tags_in={tag.pk}&page_size=5')
+
+        with self.assertNumQueries(0):
+            self.client.get(f'{RECIPES_URL}?page_size=5&tags_in={tag.pk}')
+
+    @override_settings(ALLOWED_HOSTS=['a.example.com', 'b.example.com'])
+    def test_hosts_cached_separately(self):
+        """Test responses are not replayed through another host."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL, HTTP_HOST='a.example.com')
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(RECIPES_URL, HTTP_HOST='b.example.com')
+            self.client.get(RECIPES_URL, HTTP_HOST='b.example.com',
+                            secure=True)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sum('"core_recipe_tags"' in query['sql']
+                for query in context.captured_queries), 2
+        )
+
+    def test_query_params_cached_separately(self):
+        """Test different filters are cached as different responses."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL, data={'tags_in': tag.pk})
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_create_invalidates_cache(self):
+        """Test creating a recipe invalidates the list."""
+        self.client.get(RECIPES_URL)
+        payload = {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}
+        self.client.post(RECIPES_URL, payload)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_m2m_change_invalidates_cache(self):
+        """Test assigning a tag invalidates the recipe list."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegan')
+
+    def test_tag_rename_invalidates_recipe_list(self):
+        """Test renaming a tag invalidates the recipe list."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        self.client.get(RECIPES_URL)
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegetarian')
+
+    def test_delete_invalidates_ingredient_list(self):
+        """Test deleting an ingredient invalidates the ingredient list."""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        self.client.get(INGREDIENTS_URL)
+
+        ingredient.delete()
+        res = self.client.get(INGREDIENTS_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_bulk_invalidates_cache(self):
+        """Test the bulk endpoint invalidates the recipe and tag lists."""
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL)
+        payload = [{'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+                    'tags': [{'name': 'Lunch'}]}]
+        self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(len(self.client.get(RECIPES_URL).data), 1)
+        self.assertEqual(len(self.client.get(TAGS_URL).data), 1)
+
+    def test_cache_limited_to_user(self):
+        """Test users never see each other's cached responses."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = User.objects.create_user(
+            'other@example.com',
+            'testpass1234'
+        )
+        client = APIClient()
+        client.force_authenticate(user=other_user)
+
+        res = client.get(RECIPES_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_other_user_write_keeps_cache(self):
+        """Test writes by another user do not invalidate the cache."""
+        self.client.get(TAGS_URL)
+        other_user = User.objects.create_user(
+            'other@example.com',
+            'testpass1234'
+        )
+        Tag.objects.create(user=other_user, name='Vegan')
+
+        with self.assertNumQueries(0):
+            self.client.get(TAGS_URL)
+
+
+@override_settings(RECIPE_CACHE_ALLOW_LOCAL=False)
+class ProcessLocalCacheTests(TestCase):
+    """Test the response cache is off with a process-local backend."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_not_cached(self):
+        """Test list responses are rebuilt on every request."""
+        self.client.get(TAGS_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_check_warns(self):
+        """Test the system check explains the cache is off."""
+        self.assertEqual(
+            [warning.id for warning in check_response_cache(None)],
+            ['recipe.W001']
+        )
+
+    @override_settings(RECIPE_CACHE_ALLOW_LOCAL=True)
+    def test_check_allowed(self):
+        """Test no warning when a single process is declared."""
+        self.assertEqual(check_response_cache(None), [])
@@ -0,0 +1,157 @@
+"""
+Test the streaming recipe export.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from ..export import iter_recipe_chunks
+from ..fastpath import FastListSerializer
+from ..serializers import RecipeExportSerializer, RecipeSerializer
+
+RECIPES_EXPORT_URL = reverse('recipe:recipe-export')
+User = get_user_model()
+
+
+class RecipeUploadSerializer(RecipeSerializer):
+    """Recipe serializer exposing the stored upload as a file field."""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('image',)
+
+
+def create_recipe(user, **params):
+    """Create and return recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportTests(TestCase):
+    """Test exporting recipes as NDJSON and CSV."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        pepper = Ingredient.objects.create(user=self.user, name='Pepper')
+        self.recipes = []
+        for n in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {n}',
+                                   description=f'Step {n}, then "rest"')
+            recipe.ingredients.add(salt, pepper)
+            self.recipes.append(recipe)
+        self.recipes[0].tags.add(self.tag)
+
+    def _export(self, params=None, **extra):
+        """Return the export response and its streamed body."""
+        res = self.client.get(RECIPES_EXPORT_URL, params, **extra)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return res, b''.join(res.streaming_content).decode('utf-8')
+
+    def test_export_ndjson(self):
+        """Test recipes are streamed one JSON object per line."""
+        res, body = self._export()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', res['Content-Disposition'])
+        lines = [json.loads(line) for line in body.splitlines()]
+        expected = RecipeExportSerializer(
+            Recipe.objects.order_by('-id'), many=True
+        ).data
+        self.assertEqual(lines, json.loads(json.dumps(expected)))
+        self.assertEqual(lines[-1]['tags'], [{'id': self.tag.id,
+                                              'name': 'Vegan'}])
+
+    def test_export_csv(self):
+        """Test CSV export flattens nested names into one cell."""
+        res, body = self._export({'format': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1]['tags'], 'Vegan')
+        self.assertEqual(rows[-1]['ingredients'], 'Salt|Pepper')
+        self.assertEqual(rows[-1]['description'], 'Step 0, then "rest"')
+        self.assertEqual(rows[-1]['thumbnail'], '')
+
+    def test_export_csv_by_accept_header(self):
+        """Test the format is negotiated from the Accept header."""
+        res, body = self._export(HTTP_ACCEPT='text/csv')
+
+        self.assertTrue(body.startswith('id,title,'))
+
+    def test_export_filtered_and_sparse(self):
+        """Test filters and sparse fieldsets apply to the export."""
+        _, body = self._export({'tags_in': self.tag.id, 'fields': 'id'})
+
+        self.assertEqual(body, f'{{"id":{self.recipes[0].id}}}\n')
+
+    def test_export_limited_to_user(self):
+        """Test only the user's recipes are exported."""
+        other = User.objects.create_user('other@example.com', 'pass12345')
+        create_recipe(user=other, title='Not mine')
+
+        _, body = self._export()
+
+        self.assertNotIn('Not mine', body)
+
+    @patch('recipe.views.RecipeViewSet.export_chunk_size', 2)
+    def test_export_reads_in_chunks(self):
+        """Test each chunk costs one query per relation, not per recipe."""
+        with CaptureQueriesContext(connection) as ctx:
+            _, body = self._export()
+
+        self.assertEqual(len(body.splitlines()), 5)
+        # One cursor over recipes, then tags + ingredients per chunk.
+        self.assertEqual(len(ctx.captured_queries), 1 + 3 * 2)
+
+    def test_export_serializer_supported(self):
+        """Test the export serializer can use the fast path."""
+        self.assertTrue(
+            FastListSerializer(RecipeExportSerializer()).supported
+        )
+
+    def test_unsupported_serializer_falls_back(self):
+        """Test serializers the fast path cannot run use instances."""
+        serializer = RecipeUploadSerializer()
+        self.assertFalse(FastListSerializer(serializer).supported)
+        queryset = Recipe.objects.order_by('-id').prefetch_related(
+            'tags', 'ingredients'
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(iter_recipe_chunks(queryset, serializer, 2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(
+            [item for chunk in chunks for item in chunk],
+            RecipeUploadSerializer(queryset, many=True).data
+        )
+        # One cursor over recipes, then tags + ingredients per chunk.
+        self.assertEqual(len(ctx.captured_queries), 1 + 3 * 2)
+
+    def test_auth_required(self):
+        """Test auth is required to export recipes."""
+        res = APIClient().get(RECIPES_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
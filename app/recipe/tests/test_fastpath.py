@@ -0,0 +1,137 @@
+"""
+Test the fast read path of the recipe list.
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from .. import cache
+from ..fastpath import FastListSerializer
+from ..serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    TagUsageSerializer,
+)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+User = get_user_model()
+
+
+class RecipeUploadSerializer(RecipeSerializer):
+    """Recipe serializer exposing the stored upload as a file field."""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('image',)
+
+
+def create_recipe(user, **params):
+    """Create and return recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class FastListParityTests(TestCase):
+    """Test the fast path renders the same bytes as the serializer."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        curry = create_recipe(
+            user=self.user,
+            title='Green curry',
+            price=Decimal('12.50'),
+            link='http://example.com/curry',
+            image_variants={'thumbnail': {'jpeg': 'recipe/curry.jpg'}},
+        )
+        curry.tags.add(quick, vegan)
+        curry.ingredients.add(salt)
+        soup = create_recipe(user=self.user, title='Soup', time_minutes=5)
+        soup.tags.add(vegan)
+        create_recipe(user=self.user, title='Toast', price=Decimal('0.99'))
+
+    def _get(self, url, params=None, fast=False):
+        """Return the uncached list response of one of the two paths."""
+        cache.get_cache().clear()
+        with override_settings(RECIPE_FAST_LIST=fast):
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def assertParity(self, params=None, url=RECIPES_URL):
+        """Assert both paths return the same body and return it."""
+        slow = self._get(url, params)
+        fast = self._get(url, params, fast=True)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_list(self):
+        """Test the full list, with nested relations and image URLs."""
+        res = self.assertParity()
+
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(
+            [tag['name'] for tag in res.data[-1]['tags']], ['Vegan', 'Quick']
+        )
+
+    def test_filtered_and_searched(self):
+        """Test filters and search ranking give the same results."""
+        vegan = Tag.objects.get(name='Vegan')
+
+        self.assertParity({'tags_in': vegan.id})
+        self.assertParity({'search': 'curry'})
+        self.assertParity({'search': 'nothing matches'})
+
+    def test_sparse_fieldsets(self):
+        """Test `fields` and `omit` are applied to the fast path."""
+        self.assertParity({'fields': 'id,price'})
+        self.assertParity({'omit': 'tags,thumbnail'})
+
+    def test_paginated(self):
+        """Test every page and cursor match across both paths."""
+        params = {'ordering': 'title', 'page_size': 2}
+        url = RECIPES_URL
+        while url:
+            res = self.assertParity(params, url)
+            url, params = res.data['next'], None
+
+    def test_query_count(self):
+        """Test the fast path reads rows plus one query per relation."""
+        cache.get_cache().clear()
+        with override_settings(RECIPE_FAST_LIST=True):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(ctx.captured_queries), 3)
+        # Relations are read from the through table, not model instances.
+        tags_sql = ctx.captured_queries[1]['sql']
+        self.assertIn('FROM "core_recipe_tags"', tags_sql)
+
+    def test_supported_serializers(self):
+        """Test only serializers the plan can express are supported."""
+        self.assertTrue(FastListSerializer(RecipeSerializer()).supported)
+        self.assertTrue(FastListSerializer(TagUsageSerializer()).supported)
+        self.assertTrue(
+            FastListSerializer(RecipeDetailSerializer()).supported
+        )
+        # `image` needs a FieldFile to build its URL.
+        self.assertFalse(
+            FastListSerializer(RecipeUploadSerializer()).supported
+        )
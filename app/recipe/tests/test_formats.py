@@ -0,0 +1,111 @@
+"""
+Test the JSON and MessagePack formats of recipe APIs.
+"""
+import json
+from decimal import Decimal
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from .. import cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+MSGPACK = 'application/msgpack'
+User = get_user_model()
+
+
+class ContentNegotiationTests(TestCase):
+    """Test recipe, tag and ingredient payloads in both formats."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Crème brûlée',
+            time_minutes=40,
+            price=Decimal('7.50'),
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Sweet'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Cream')
+        )
+
+    def _get_both(self, url):
+        """Return the decoded JSON and MessagePack responses of `url`."""
+        res_json = self.client.get(url)
+        res_msgpack = self.client.get(url, HTTP_ACCEPT=MSGPACK)
+
+        self.assertEqual(res_json['Content-Type'], 'application/json')
+        self.assertEqual(res_msgpack['Content-Type'], MSGPACK)
+        # The fast encoder renders what DRF's JSON renderer would.
+        self.assertEqual(res_json.content,
+                         JSONRenderer().render(res_json.data))
+        return (json.loads(res_json.content),
+                msgpack.unpackb(res_msgpack.content, raw=False))
+
+    def test_lists_round_trip(self):
+        """Test list responses decode to the same data in both formats."""
+        for url in (RECIPES_URL, TAGS_URL, INGREDIENTS_URL):
+            data_json, data_msgpack = self._get_both(url)
+            self.assertEqual(data_msgpack, data_json)
+
+        self.assertEqual(data_json[0]['name'], 'Cream')
+
+    def test_detail_round_trip(self):
+        """Test the recipe detail keeps the price as a decimal string."""
+        url = reverse('recipe:recipe-detail', args=(self.recipe.id,))
+
+        data_json, data_msgpack = self._get_both(url)
+
+        self.assertEqual(data_msgpack, data_json)
+        self.assertEqual(data_json['price'], '7.50')
+
+    def test_create_with_msgpack(self):
+        """Test creating a recipe from a MessagePack body."""
+        payload = {
+            'title': 'Pho',
+            'time_minutes': 90,
+            'price': '9.99',
+            'tags': [{'name': 'Soup'}],
+            'ingredients': [{'name': 'Noodles'}, {'name': 'Cream'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='msgpack',
+                               HTTP_ACCEPT=MSGPACK)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        data = msgpack.unpackb(res.content, raw=False)
+        recipe = Recipe.objects.get(id=data['id'])
+        self.assertEqual(recipe.price, Decimal('9.99'))
+        self.assertEqual(data['tags'][0]['name'], 'Soup')
+        self.assertEqual(recipe.ingredients.count(), 2)
+
+    def test_bulk_with_msgpack(self):
+        """Test a bulk payload in MessagePack matches the JSON one."""
+        items = [{'title': 'Toast', 'time_minutes': 3, 'price': '1.25'}]
+
+        res = self.client.post(RECIPES_BULK_URL, items, format='msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['status'], 'created')
+
+    def test_invalid_body(self):
+        """Test a malformed body is a 400 in either format."""
+        for body, content_type in ((b'\xc1', MSGPACK),
+                                   (b'{"title"', 'application/json')):
+            res = self.client.generic('POST', RECIPES_URL, body,
+                                      content_type=content_type)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
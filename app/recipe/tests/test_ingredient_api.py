@@ -4,11 +4,12 @@ Test ingredient APIs.
 from decimal import Decimal
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Ingredient, Recipe
-from ..serializers import IngredientSerializer
+from ..serializers import IngredientUsageSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
 User = get_user_model()
@@ -68,7 +69,7 @@ class PrivateIngredientAPITest(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         ingredients = Ingredient.objects.all().order_by('-name')
-        serializer = IngredientSerializer(ingredients, many=True)
+        serializer = IngredientUsageSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
@@ -120,8 +121,9 @@ class PrivateIngredientAPITest(TestCase):
         params = {'assigned_only': True}
         res = self.client.get(INGREDIENTS_URL, data=params)
 
-        s1 = IngredientSerializer(ingredient1)
-        s2 = IngredientSerializer(ingredient2)
+        ingredient1.refresh_from_db()
+        s1 = IngredientUsageSerializer(ingredient1)
+        s2 = IngredientUsageSerializer(ingredient2)
         self.assertIn(s1.data, res.data)
         self.assertNotIn(s2.data, res.data)
 
@@ -138,3 +140,81 @@ class PrivateIngredientAPITest(TestCase):
         res = self.client.get(INGREDIENTS_URL, data=params)
 
         self.assertEqual(len(res.data), 1)
+
+
+class IngredientAutocompleteTests(TestCase):
+    """Test the `q` autocomplete parameter of the ingredient list."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _complete(self, q, **params):
+        """Return the ingredient names suggested for `q`."""
+        res = self.client.get(INGREDIENTS_URL, {'q': q, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_prefix_matches_first(self):
+        """Test prefix matches rank above similar names."""
+        for name in ('Tomato', 'Tomato paste', 'Potato', 'Basil'):
+            Ingredient.objects.create(user=self.user, name=name)
+
+        names = self._complete('tom')
+
+        self.assertEqual(names[:2], ['Tomato', 'Tomato paste'])
+        self.assertNotIn('Basil', names)
+
+    def test_typo_tolerant(self):
+        """Test misspelled input still finds the ingredient."""
+        Ingredient.objects.create(user=self.user, name='Cinnamon')
+        Ingredient.objects.create(user=self.user, name='Salt')
+
+        self.assertEqual(self._complete('cinamon'), ['Cinnamon'])
+
+    def test_usage_breaks_ties(self):
+        """Test equally close names are ordered by recipe usage."""
+        rarely = Ingredient.objects.create(user=self.user, name='Chili')
+        often = Ingredient.objects.create(user=self.user, name='Chive')
+        for _ in range(2):
+            create_recipe(user=self.user).ingredients.add(often)
+        create_recipe(user=self.user).ingredients.add(rarely)
+
+        self.assertEqual(self._complete('chi'), ['Chive', 'Chili'])
+
+    def test_like_wildcards_escaped(self):
+        """Test `%` and `_` in the input match literally."""
+        Ingredient.objects.create(user=self.user, name='Flour')
+
+        self.assertEqual(self._complete('%'), [])
+
+    def test_limit(self):
+        """Test the number of suggestions is capped by `limit`."""
+        for n in range(15):
+            Ingredient.objects.create(user=self.user, name=f'Pepper {n}')
+
+        self.assertEqual(len(self._complete('pep')), 10)
+        self.assertEqual(len(self._complete('pep', limit=3)), 3)
+        res = self.client.get(INGREDIENTS_URL, {'q': 'pep', 'limit': 500})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limited_to_user(self):
+        """Test suggestions only include the user's ingredients."""
+        other_user = create_user(email='other@example.com')
+        Ingredient.objects.create(user=other_user, name='Garlic')
+
+        self.assertEqual(self._complete('gar'), [])
+
+    def test_served_by_trigram_index(self):
+        """Test the prefix match can use the trigram index."""
+        Ingredient.objects.create(user=self.user, name='Garlic')
+        queryset = Ingredient.objects.filter(name__trigram_prefix='gar')
+        sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('core_ingredient_name_trgm_idx', plan)
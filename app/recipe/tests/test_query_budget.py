@@ -0,0 +1,278 @@
+"""
+Test the query budgets of the recipe APIs.
+"""
+import io
+import shutil
+import tempfile
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from core.querybudget import QueryBudgetMixin
+from .. import cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+User = get_user_model()
+
+
+def detail_url(basename, pk):
+    """Return the detail URL of `basename` object `pk`."""
+    return reverse(f'recipe:{basename}-detail', args=(pk,))
+
+
+class RecipeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test recipe routes run a bounded number of queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = self.create_recipe('Base')
+        self.created = 0
+
+    def get(self, url, params=None):
+        """GET `url` from a cold response cache."""
+        cache.get_cache().clear()
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        if res.streaming:
+            b''.join(res.streaming_content)
+        return res
+
+    def create_recipe(self, title, names=2):
+        """Create a recipe with `names` tags and ingredients."""
+        recipe = Recipe.objects.create(user=self.user, title=title,
+                                       time_minutes=10,
+                                       price=Decimal('2.50'))
+        for n in range(names):
+            tag, _ = Tag.objects.get_or_create(user=self.user,
+                                               name=f'Tag {n}')
+            ingredient, _ = Ingredient.objects.get_or_create(
+                user=self.user, name=f'Ingredient {n}'
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        return recipe
+
+    def grow_recipes(self, size):
+        """Give the user `size` more recipes with tags and ingredients."""
+        for _ in range(size):
+            self.created += 1
+            self.create_recipe(f'Recipe {self.created}')
+
+    def grow_names(self, size):
+        """Give the base recipe `size` tags and ingredients."""
+        self.recipe.tags.set([
+            Tag.objects.get_or_create(user=self.user, name=f'Tag {n}')[0]
+            for n in range(size)
+        ])
+        self.recipe.ingredients.set([
+            Ingredient.objects.get_or_create(user=self.user,
+                                             name=f'Ingredient {n}')[0]
+            for n in range(size)
+        ])
+
+    def payload(self, size):
+        """Return a recipe payload with `size` new and 1 existing names."""
+        return {
+            'title': f'Recipe with {size}',
+            'time_minutes': 10,
+            'price': '4.00',
+            'tags': [{'name': 'Tag 0'}] + [
+                {'name': f'Tag {size}.{n}'} for n in range(size)
+            ],
+            'ingredients': [{'name': 'Ingredient 0'}] + [
+                {'name': f'Ingredient {size}.{n}'} for n in range(size)
+            ],
+        }
+
+    def test_list(self):
+        """Test the list costs the same for more and bigger recipes."""
+        for params in (None, {'tags_in': Tag.objects.first().pk},
+                       {'search': 'recipe'}, {'fields': 'id,tags'}):
+            self.assertQueryBudget(
+                'recipe:recipe-list', 'GET',
+                lambda: self.get(RECIPES_URL, params), self.grow_recipes
+            )
+
+    def test_detail(self):
+        """Test the detail costs the same for more tags and ingredients."""
+        self.assertQueryBudget(
+            'recipe:recipe-detail', 'GET',
+            lambda: self.get(detail_url('recipe', self.recipe.pk)),
+            self.grow_names
+        )
+
+    def test_create(self):
+        """Test creating costs the same for more tags and ingredients."""
+        payloads = []
+        self.assertQueryBudget(
+            'recipe:recipe-list', 'POST',
+            lambda: self.client.post(RECIPES_URL, payloads[-1],
+                                     format='json'),
+            lambda size: payloads.append(self.payload(size)),
+            sizes=(1, 20)
+        )
+
+    def test_update(self):
+        """Test updating costs the same for more tags and ingredients."""
+        for method in ('put', 'patch'):
+            payloads = []
+            self.assertQueryBudget(
+                'recipe:recipe-detail', method.upper(),
+                lambda: getattr(self.client, method)(
+                    detail_url('recipe', self.recipe.pk), payloads[-1],
+                    format='json'
+                ),
+                lambda size: payloads.append(self.payload(size)),
+                sizes=(1, 20)
+            )
+
+    def test_delete(self):
+        """Test deleting costs the same for more tags and ingredients."""
+        recipes = []
+
+        def grow(size):
+            recipes.append(self.create_recipe(f'Delete {size}', size))
+
+        self.assertQueryBudget(
+            'recipe:recipe-detail', 'DELETE',
+            lambda: self.client.delete(detail_url('recipe', recipes[-1].pk)),
+            grow, sizes=(1, 20)
+        )
+
+    def test_facets(self):
+        """Test facets cost the same for more recipes."""
+        self.assertQueryBudget(
+            'recipe:recipe-facets', 'GET',
+            lambda: self.get(reverse('recipe:recipe-facets')),
+            self.grow_recipes
+        )
+
+    def test_export(self):
+        """Test the export costs the same for more recipes."""
+        self.assertQueryBudget(
+            'recipe:recipe-export', 'GET',
+            lambda: self.get(reverse('recipe:recipe-export')),
+            self.grow_recipes
+        )
+
+    def test_bulk(self):
+        """Test a bulk request costs the same for more items."""
+        batches = []
+
+        def grow(size):
+            batches.append(
+                [self.payload(size) for _ in range(size)] +
+                [{'id': self.recipe.pk, 'tags': [{'name': f'Bulk {size}'}]}]
+            )
+
+        # Recipe counts are updated once per distinct change, which for
+        # a single created recipe coincides with the updated one's.
+        self.assertQueryBudget(
+            'recipe:recipe-bulk', 'POST',
+            lambda: self.client.post(reverse('recipe:recipe-bulk'),
+                                     batches[-1], format='json'),
+            grow, sizes=(2, 20)
+        )
+
+    def test_attrs(self):
+        """Test tag and ingredient routes cost the same for more recipes."""
+        for basename, model in (('tag', Tag), ('ingredient', Ingredient)):
+            obj = model.objects.create(user=self.user, name='Shared')
+            objects = []
+
+            def grow(size):
+                self.grow_recipes(size)
+                for recipe in Recipe.objects.filter(user=self.user):
+                    getattr(recipe, f'{basename}s').add(obj)
+                objects.append(model.objects.create(
+                    user=self.user, name=f'Delete {size}'
+                ))
+                getattr(objects[-1], 'recipe_set').set(
+                    Recipe.objects.filter(user=self.user)
+                )
+
+            route = f'recipe:{basename}'
+            self.assertQueryBudget(
+                f'{route}-list', 'GET',
+                lambda: self.get(reverse(f'{route}-list'),
+                                 {'assigned_only': 1}),
+                grow
+            )
+            self.assertQueryBudget(
+                f'{route}-list', 'GET',
+                lambda: self.get(reverse(f'{route}-list'), {'q': 'sha'}),
+                grow
+            )
+            self.assertQueryBudget(
+                f'{route}-detail', 'PATCH',
+                lambda: self.client.patch(detail_url(basename, obj.pk),
+                                          {'name': 'Shared'}, format='json'),
+                grow
+            )
+            self.assertQueryBudget(
+                f'{route}-detail', 'DELETE',
+                lambda: self.client.delete(
+                    detail_url(basename, objects[-1].pk)
+                ),
+                grow
+            )
+
+
+class RecipeImageQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the image routes run a bounded number of queries."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root,
+                                     RECIPE_IMAGE_PROCESS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Image',
+                                            time_minutes=10,
+                                            price=Decimal('2.50'))
+
+    def test_upload_and_precheck(self):
+        """Test uploading and attaching an image."""
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image, format='JPEG')
+        image.seek(0)
+        image.name = 'image.jpg'
+
+        res, = self.assertQueryBudget(
+            'recipe:recipe-upload-image', 'POST',
+            lambda: self.client.post(
+                reverse('recipe:recipe-upload-image',
+                        args=(self.recipe.pk,)),
+                {'image': image}, format='multipart'
+            )
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.recipe.refresh_from_db()
+        other = Recipe.objects.create(user=self.user, title='Other',
+                                      time_minutes=10,
+                                      price=Decimal('2.50'))
+        res, = self.assertQueryBudget(
+            'recipe:recipe-image-precheck', 'POST',
+            lambda: self.client.post(
+                reverse('recipe:recipe-image-precheck', args=(other.pk,)),
+                {'sha256': self.recipe.image_blob.sha256}
+            )
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
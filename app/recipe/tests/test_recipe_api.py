@@ -1,19 +1,29 @@
 """
 Test recipi APIs.
 """
+import hashlib
 import os
+import shutil
 import tempfile
 from decimal import Decimal
+from unittest.mock import patch
+from django.core.files.storage import default_storage
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from PIL import Image
-from core.models import Recipe, Tag, Ingredient
+from core.models import ImageBlob, Recipe, Tag, Ingredient
+from .. import images
+from ..filters import RecipeFilter
 from ..serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_FACETS_URL = reverse('recipe:recipe-facets')
 User = get_user_model()
 
 
@@ -42,6 +52,11 @@ def get_image_upload_url(recipe_pk):
     return reverse('recipe:recipe-upload-image', args=(recipe_pk,))
 
 
+def get_image_precheck_url(recipe_pk):
+    """create and return an image pre-check URL."""
+    return reverse('recipe:recipe-image-precheck', args=(recipe_pk,))
+
+
 def create_user(**params):
     """Create and return user."""
     return User.objects.create_user(**params)
@@ -437,6 +452,908 @@ class PrivateRecipeAPITest(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_all_tags(self):
+        """Test filtering recipes having every one of the tags."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        both = create_recipe(user=self.user)
+        both.tags.add(tag1, tag2)
+        one = create_recipe(user=self.user)
+        one.tags.add(tag1)
+
+        params = {'tags_all': f'{tag1.pk},{tag2.pk},{tag2.pk}'}
+        res = self.client.get(RECIPES_URL, data=params)
+
+        self.assertEqual([r['id'] for r in res.data], [both.id])
+
+    def test_filter_by_all_ingredients(self):
+        """Test filtering recipes having every one of the ingredients."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        both = create_recipe(user=self.user)
+        both.ingredients.add(salt, egg)
+        create_recipe(user=self.user).ingredients.add(egg)
+
+        params = {'ingredients_all': f'{salt.pk},{egg.pk}'}
+        res = self.client.get(RECIPES_URL, data=params)
+
+        self.assertEqual([r['id'] for r in res.data], [both.id])
+
+    def test_filter_excluding_tags(self):
+        """Test excluding recipes having any of the tags."""
+        tag = Tag.objects.create(user=self.user, name='Meat')
+        create_recipe(user=self.user).tags.add(tag)
+        untagged = create_recipe(user=self.user)
+        other = create_recipe(user=self.user)
+        other.tags.add(Tag.objects.create(user=self.user, name='Fish'))
+
+        res = self.client.get(RECIPES_URL, data={'tags_none': tag.pk})
+
+        self.assertEqual([r['id'] for r in res.data], [other.id, untagged.id])
+
+    def test_filter_any_returns_recipe_once(self):
+        """Test a recipe matching several ids is returned once."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags_in': f'{tag1.pk},{tag2.pk}'}
+        res = self.client.get(RECIPES_URL, data=params)
+
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test recipe endpoints run a constant number of queries."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes with two tags and two ingredients each."""
+        recipes = []
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}a'),
+                Tag.objects.create(user=self.user, name=f'Tag {i}b'),
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Ing {i}a'),
+                Ingredient.objects.create(user=self.user, name=f'Ing {i}b'),
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_query_count(self):
+        """Test listing recipes takes a constant number of queries."""
+        self._create_recipes(5)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 5)
+        self.assertEqual(len(res.data[0]['tags']), 2)
+        self.assertEqual(len(res.data[0]['ingredients']), 2)
+
+    def test_detail_query_count(self):
+        """Test retrieving a recipe prefetches its relations."""
+        recipe = self._create_recipes(1)[0]
+
+        # One query reads `updated_at` for the conditional GET check.
+        with self.assertNumQueries(4):
+            res = self.client.get(get_detail_url(recipe.id))
+
+        self.assertEqual(res.data, RecipeDetailSerializer(recipe).data)
+
+    def test_create_query_count_independent_of_tags(self):
+        """Test creating a recipe costs the same for many tags/ingredients."""
+        def create_with(count):
+            payload = {
+                'title': f'Recipe with {count}',
+                'time_minutes': 10,
+                'price': Decimal('1.00'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ingredient {i}'} for i in range(count)
+                ],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        few = create_with(2)
+        many = create_with(30)
+
+        self.assertEqual(few, many)
+        recipe = Recipe.objects.get(title='Recipe with 30')
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+
+    def test_create_reuses_existing_and_duplicate_names(self):
+        """Test existing and repeated names resolve to a single object."""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 10,
+            'price': Decimal('1.00'),
+            'tags': [{'name': 'Dinner'}, {'name': 'Thai'}, {'name': 'Thai'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_filtered_list_query_count(self):
+        """Test filtering recipes takes a constant number of queries."""
+        recipes = self._create_recipes(5)
+        tag_ids = ','.join(
+            str(recipe.tags.first().pk) for recipe in recipes
+        )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, data={'tags_in': tag_ids})
+
+        self.assertEqual(len(res.data), 5)
+
+
+class RecipeFilterPlanTests(TestCase):
+    """Test the plan shape of the tag and ingredient filters."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {n}')
+            for n in range(3)
+        ]
+        for n in range(20):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(*self.tags[:n % 4])
+
+    def _explain(self, params):
+        """Return the SQL and EXPLAIN output of a filtered recipe list."""
+        queryset = RecipeFilter(
+            params, queryset=Recipe.objects.filter(user=self.user)
+        ).qs
+        sql, sql_params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', sql_params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return sql, plan
+
+    def test_any_is_semi_join(self):
+        """Test `tags_in` runs as a semi-join without DISTINCT."""
+        sql, plan = self._explain(
+            {'tags_in': f'{self.tags[0].pk},{self.tags[1].pk}'}
+        )
+
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('Unique', plan)
+        self.assertNotIn('Aggregate', plan)
+
+    def test_all_is_grouped_count(self):
+        """Test `tags_all` aggregates the through rows only."""
+        sql, plan = self._explain(
+            {'tags_all': f'{self.tags[0].pk},{self.tags[1].pk}'}
+        )
+
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('HAVING COUNT(*) = %s', sql)
+        self.assertNotIn('Unique', plan)
+
+    def test_none_is_anti_join(self):
+        """Test `tags_none` runs as an anti-join."""
+        sql, plan = self._explain({'tags_none': str(self.tags[0].pk)})
+
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('Anti Join', plan)
+
+
+class RecipeSparseFieldsetTests(TestCase):
+    """Test the `fields` and `omit` query parameters."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user, title='Curry')
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+
+    def test_list_fields(self):
+        """Test `fields` limits the payload and the selected columns."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.data, [{'id': self.recipe.id, 'title': 'Curry'}])
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('core_recipe_tags', sql)
+        self.assertNotIn('"core_recipe"."link"', sql)
+        self.assertNotIn('"core_recipe"."price"', sql)
+
+    def test_list_omit(self):
+        """Test `omit` drops fields and skips their prefetch."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'omit': 'tags,thumbnail'})
+
+        self.assertNotIn('tags', res.data[0])
+        self.assertNotIn('thumbnail', res.data[0])
+        self.assertIn('ingredients', res.data[0])
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('core_recipe_tags', sql)
+        self.assertIn('core_recipe_ingredients', sql)
+        self.assertNotIn('"core_recipe"."image_variants"', sql)
+
+    def test_detail_fields(self):
+        """Test the detail view does not load omitted columns."""
+        url = get_detail_url(self.recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, {'fields': 'id,title'})
+
+        self.assertEqual(res.data, {'id': self.recipe.id, 'title': 'Curry'})
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('"core_recipe"."description"', sql)
+
+    def test_unknown_field(self):
+        """Test an unknown field name is rejected."""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(res.data['fields']))
+
+    def test_paginated_sparse_list(self):
+        """Test pruned columns still page by a sort key not returned."""
+        second = create_recipe(user=self.user, title='Burger')
+
+        res = self.client.get(RECIPES_URL, {
+            'fields': 'id', 'ordering': 'title', 'page_size': 1
+        })
+        next_page = self.client.get(res.data['next'])
+
+        self.assertEqual(res.data['results'], [{'id': second.id}])
+        self.assertEqual(next_page.data['results'], [{'id': self.recipe.id}])
+
+    def test_tag_list_fields(self):
+        """Test the tag list supports sparse fieldsets."""
+        res = self.client.get(reverse('recipe:tag-list'), {'omit': 'id'})
+
+        self.assertEqual(res.data, [{'name': 'Thai', 'recipe_count': 1}])
+
+
+@override_settings(RECIPE_CACHE_ALLOW_LOCAL=True)
+class RecipeFacetsTests(TestCase):
+    """Test the recipe facet counts API."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+        curry = create_recipe(user=self.user, title='Curry',
+                              price=Decimal('12.00'), time_minutes=45)
+        curry.tags.add(self.vegan)
+        curry.ingredients.add(self.rice)
+        salad = create_recipe(user=self.user, title='Salad',
+                              price=Decimal('4.50'), time_minutes=10)
+        salad.tags.add(self.vegan, self.quick)
+        create_recipe(user=self.user, title='Steak',
+                      price=Decimal('60.00'), time_minutes=20)
+
+    def test_facet_counts(self):
+        """Test counts per tag, ingredient and histogram bucket."""
+        res = self.client.get(RECIPES_FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(res.data['tags'], [
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 2},
+            {'id': self.quick.id, 'name': 'Quick', 'count': 1},
+        ])
+        self.assertEqual(res.data['ingredients'], [
+            {'id': self.rice.id, 'name': 'Rice', 'count': 1},
+        ])
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price']],
+            [1, 0, 1, 0, 1]
+        )
+        self.assertEqual(res.data['time_minutes'][1],
+                         {'min': 15, 'max': 30, 'count': 1})
+        self.assertEqual(res.data['time_minutes'][-1]['max'], None)
+
+    def test_facets_apply_filters(self):
+        """Test facets count only the recipes matching the filters."""
+        res = self.client.get(RECIPES_FACETS_URL,
+                              {'tags_in': self.quick.id})
+
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(
+            [tag['name'] for tag in res.data['tags']], ['Quick', 'Vegan']
+        )
+        self.assertEqual(res.data['ingredients'], [
+            {'id': self.rice.id, 'name': 'Rice', 'count': 0},
+        ])
+
+    def test_facets_list_unused_values(self):
+        """Test values without matching recipes are counted as 0."""
+        unused = Tag.objects.create(user=self.user, name='Unused')
+
+        res = self.client.get(RECIPES_FACETS_URL, {'search': 'steak'})
+
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(res.data['tags'], [
+            {'id': self.quick.id, 'name': 'Quick', 'count': 0},
+            {'id': unused.id, 'name': 'Unused', 'count': 0},
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 0},
+        ])
+
+    def test_facets_limited_to_user(self):
+        """Test facets ignore other users' recipes."""
+        other_user = create_user(email='other@example.com',
+                                 password='testpass1234')
+        create_recipe(user=other_user).tags.add(
+            Tag.objects.create(user=other_user, name='Other')
+        )
+
+        res = self.client.get(RECIPES_FACETS_URL)
+
+        self.assertEqual(res.data['count'], 3)
+        self.assertNotIn('Other', [tag['name'] for tag in res.data['tags']])
+
+    def test_facets_two_queries_then_cached(self):
+        """Test facets take two queries and are then served from cache."""
+        with self.assertNumQueries(2):
+            first = self.client.get(RECIPES_FACETS_URL, {'search': 'curry'})
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_FACETS_URL, {'search': 'curry'})
+
+        self.assertEqual(first.data['count'], 1)
+        self.assertEqual(cached.data, first.data)
+
+    def test_write_invalidates_facets(self):
+        """Test a new recipe is counted after a cached response."""
+        self.client.get(RECIPES_FACETS_URL)
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_FACETS_URL)
+
+        self.assertEqual(res.data['count'], 4)
+
+
+class RecipeBulkAPITests(TestCase):
+    """Test the bulk recipe create/update API."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.other_user = create_user(
+                            email='other@example.com',
+                            password='otherpass1234'
+                        )
+
+    def test_bulk_keeps_recipe_counts(self):
+        """Test bulk writes keep tag recipe counts in step."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        payload = [
+            {'id': recipe.id, 'tags': [{'name': 'New'}]},
+            {'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+             'tags': [{'name': 'New'}, {'name': 'Old'}]},
+        ]
+
+        self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        counts = dict(Tag.objects.values_list('name', 'recipe_count'))
+        self.assertEqual(counts, {'Old': 1, 'New': 2})
+
+    def test_bulk_create_recipes(self):
+        """Test creating several recipes with tags and ingredients."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        payload = [
+            {
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': '5.00',
+                'tags': [{'name': 'Dinner'}, {'name': 'Thai'}],
+                'ingredients': [{'name': 'Rice'}],
+            },
+            {
+                'title': 'Toast',
+                'time_minutes': 5,
+                'price': '1.00',
+                'tags': [{'name': 'Breakfast'}],
+            },
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data],
+                         ['created', 'created'])
+        curry = Recipe.objects.get(id=res.data[0]['id'], user=self.user)
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)),
+            ['Dinner', 'Thai']
+        )
+        self.assertEqual(
+            list(curry.ingredients.values_list('name', flat=True)),
+            ['Rice']
+        )
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Dinner').count(), 1
+        )
+        toast = Recipe.objects.get(id=res.data[1]['id'])
+        self.assertEqual(toast.tags.get().name, 'Breakfast')
+
+    def test_bulk_update_recipes(self):
+        """Test updating recipes by id replaces only given relations."""
+        recipe = create_recipe(user=self.user, title='Old title')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt')
+        )
+        payload = [{'id': recipe.id, 'title': 'New title',
+                    'tags': [{'name': 'New'}]}]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'status': 'updated', 'id': recipe.id}])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(recipe.tags.get().name, 'New')
+        self.assertEqual(recipe.ingredients.get().name, 'Salt')
+
+    def test_bulk_reports_item_errors(self):
+        """Test invalid items are reported and valid ones applied."""
+        other_recipe = create_recipe(user=self.other_user)
+        payload = [
+            {'title': 'Valid', 'time_minutes': 5, 'price': '1.00'},
+            {'title': 'Missing fields'},
+            {'id': other_recipe.id, 'title': 'Hijack'},
+            'not a recipe',
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in res.data],
+                         ['created', 'error', 'error', 'error'])
+        self.assertIn('time_minutes', res.data[1]['errors'])
+        self.assertIn('id', res.data[2]['errors'])
+        self.assertTrue(Recipe.objects.filter(title='Valid').exists())
+        other_recipe.refresh_from_db()
+        self.assertNotEqual(other_recipe.title, 'Hijack')
+
+    def test_bulk_all_items_invalid(self):
+        """Test a batch without valid items is rejected."""
+        payload = [{'title': 'Missing fields'}, 'not a recipe']
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r['status'] for r in res.data], ['error', 'error'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_atomic_rejects_mixed_batch(self):
+        """Test an atomic batch with an invalid item writes nothing."""
+        payload = [
+            {'title': 'Valid', 'time_minutes': 5, 'price': '1.00'},
+            {'title': 'Missing fields'},
+        ]
+
+        res = self.client.post(f'{RECIPES_BULK_URL}?atomic=1', payload,
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r['status'] for r in res.data],
+                         ['skipped', 'error'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_atomic_valid_batch(self):
+        """Test an atomic batch of valid items is applied."""
+        payload = [{'title': 'Valid', 'time_minutes': 5, 'price': '1.00'}]
+
+        res = self.client.post(f'{RECIPES_BULK_URL}?atomic=1', payload,
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(Recipe.objects.filter(title='Valid').exists())
+
+    def test_bulk_requires_list(self):
+        """Test a non-list payload is rejected."""
+        payload = {'title': 'Curry', 'time_minutes': 5, 'price': '1.00'}
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_query_count_independent_of_size(self):
+        """Test the batch is written with a constant number of queries."""
+        def post_batch(count, prefix):
+            payload = [
+                {
+                    'title': f'{prefix} {i}',
+                    'time_minutes': 5,
+                    'price': '1.00',
+                    'tags': [{'name': f'{prefix} tag {i}'}],
+                    'ingredients': [{'name': f'{prefix} ingredient {i}'}],
+                }
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_BULK_URL, payload,
+                                       format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post_batch(2, 'Small'), post_batch(50, 'Large'))
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 52)
+
+
+@override_settings(RECIPE_CACHE_ALLOW_LOCAL=True)
+class RecipeConditionalGetTests(TestCase):
+    """Test ETag and Last-Modified handling of recipe endpoints."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.url = get_detail_url(self.recipe.id)
+
+    def test_detail_sends_validators(self):
+        """Test the detail response carries a strong ETag."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res['ETag'].startswith('W/'))
+        self.assertIn('Last-Modified', res)
+
+    def test_detail_not_modified(self):
+        """Test a matching If-None-Match returns 304 without serializing."""
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_detail_if_modified_since(self):
+        """Test If-Modified-Since returns 304 for an unchanged recipe."""
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_update(self):
+        """Test updating the recipe changes its ETag."""
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'title': 'New title'})
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_detail_etag_changes_on_tag_change(self):
+        """Test assigning or renaming a tag changes the recipe ETag."""
+        etag = self.client.get(self.url)['ETag']
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        renamed = self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+        self.assertEqual(renamed.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_list_weak_etag(self):
+        """Test the list answers If-None-Match with 304."""
+        res = self.client.get(RECIPES_URL)
+        self.assertTrue(res['ETag'].startswith('W/'))
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag']
+            )
+
+        self.assertEqual(not_modified.status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_changes_on_write(self):
+        """Test creating a recipe changes the list ETag."""
+        etag = self.client.get(RECIPES_URL)['ETag']
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    @override_settings(RECIPE_CACHE_ALLOW_LOCAL=False)
+    def test_list_etag_off_with_local_cache(self):
+        """Test no list ETag is sent with a process-local generation."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+
+    def test_list_etag_depends_on_params(self):
+        """Test a filtered list does not match the unfiltered ETag."""
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        res = self.client.get(RECIPES_URL, {'page_size': 1},
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class RecipePaginationTests(TestCase):
+    """Test keyset pagination of the recipe list."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _collect_pages(self, params):
+        """Follow next links and return result ids per page."""
+        pages = []
+        res = self.client.get(RECIPES_URL, data=params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append([item['id'] for item in res.data['results']])
+            if res.data['next'] is None:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_list_unpaginated_by_default(self):
+        """Test the list is a plain array without pagination params."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIsInstance(res.data, list)
+
+    def test_paginate_recipes(self):
+        """Test walking all pages returns every recipe once, in order."""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        pages = self._collect_pages({'page_size': 2})
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+
+    def test_first_page_has_no_previous(self):
+        """Test the first page has no previous link."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, data={'page_size': 10})
+
+        self.assertIsNone(res.data['previous'])
+        self.assertIsNone(res.data['next'])
+
+    def test_previous_link(self):
+        """Test the previous link returns the preceding page."""
+        for _ in range(4):
+            create_recipe(user=self.user)
+
+        first = self.client.get(RECIPES_URL, data={'page_size': 2})
+        second = self.client.get(first.data['next'])
+        res = self.client.get(second.data['previous'])
+
+        self.assertEqual(res.data['results'], first.data['results'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_paginate_by_non_unique_key(self):
+        """Test ordering on a key with ties keeps every row exactly once."""
+        recipes = [
+            create_recipe(user=self.user, price=Decimal(price))
+            for price in ('1.00', '2.50', '2.50', '2.50', '3.00')
+        ]
+
+        pages = self._collect_pages({'page_size': 2, 'ordering': 'price'})
+
+        expected = sorted(recipes, key=lambda r: (r.price, r.id))
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(ids, [r.id for r in expected])
+
+    def test_paginate_filtered_recipes(self):
+        """Test paginating a tag filtered list has no duplicates."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipes = []
+        for _ in range(3):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag1, tag2)
+            recipes.append(recipe)
+        create_recipe(user=self.user)
+
+        pages = self._collect_pages({
+            'page_size': 2,
+            'tags_in': f'{tag1.pk},{tag2.pk}'
+        })
+
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+
+    def test_pagination_without_offset_or_count(self):
+        """Test deep pages are read with a keyset, not OFFSET/COUNT."""
+        for _ in range(3):
+            create_recipe(user=self.user)
+        first = self.client.get(RECIPES_URL, data={'page_size': 1})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data['next'])
+
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries).upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns not found."""
+        res = self.client.get(RECIPES_URL, data={'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_ordering(self):
+        """Test ordering by an unsupported key returns an error."""
+        res = self.client.get(
+            RECIPES_URL,
+            data={'page_size': 2, 'ordering': 'description'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeSearchTests(TestCase):
+    """Test full-text search of recipes."""
+
+    def setUp(self):
+        self.user = create_user(
+                        email='test@example.com',
+                        password='testpass1234'
+                    )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, value, **params):
+        """Search recipes and return the ids of the results."""
+        res = self.client.get(RECIPES_URL, {'search': value, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data]
+
+    def test_results_ranked_by_field_weight(self):
+        """Test title matches rank above description and tag matches."""
+        by_tag = create_recipe(user=self.user, title='Dinner')
+        by_tag.tags.add(Tag.objects.create(user=self.user, name='Curry'))
+        by_description = create_recipe(user=self.user, title='Stew',
+                                       description='A mild curry.')
+        by_title = create_recipe(user=self.user, title='Green curry')
+        create_recipe(user=self.user, title='Pancakes')
+
+        ids = self._search('curries')
+
+        self.assertEqual(ids, [by_title.id, by_description.id, by_tag.id])
+
+    def test_search_ingredient_names(self):
+        """Test recipes are found by the names of their ingredients."""
+        recipe = create_recipe(user=self.user, title='Soup')
+        ingredient = Ingredient.objects.create(user=self.user, name='Leek')
+        recipe.ingredients.add(ingredient)
+
+        self.assertEqual(self._search('leek'), [recipe.id])
+
+        recipe.ingredients.remove(ingredient)
+        self.assertEqual(self._search('leek'), [])
+
+    def test_search_follows_tag_rename(self):
+        """Test renaming a tag updates the recipes' search vector."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        tag.name = 'Spicy'
+        tag.save()
+
+        self.assertEqual(self._search('vegan'), [])
+        self.assertEqual(self._search('spicy'), [recipe.id])
+
+        tag.delete()
+        self.assertEqual(self._search('spicy'), [])
+
+    def test_search_websearch_syntax(self):
+        """Test quoted phrases and negation are supported."""
+        thai = create_recipe(user=self.user, title='Thai green curry')
+        create_recipe(user=self.user, title='Green Thai soup')
+
+        self.assertEqual(self._search('"thai green"'), [thai.id])
+        self.assertEqual(self._search('thai -soup'), [thai.id])
+
+    def test_search_with_filters(self):
+        """Test search combines with the existing filters."""
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        tagged = create_recipe(user=self.user, title='Curry')
+        tagged.tags.add(tag)
+        create_recipe(user=self.user, title='Curry')
+
+        self.assertEqual(self._search('curry', tags_in=tag.id), [tagged.id])
+
+    def test_search_limited_to_user(self):
+        """Test search only returns the user's recipes."""
+        other_user = create_user(email='other@example.com',
+                                 password='testpass1234')
+        create_recipe(user=other_user, title='Curry')
+
+        self.assertEqual(self._search('curry'), [])
+
+    def test_search_paginated_by_rank(self):
+        """Test paging through results keeps the relevance order."""
+        recipes = [
+            create_recipe(user=self.user, title='Curry ' + 'curry ' * n)
+            for n in range(5)
+        ]
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry',
+                                            'page_size': 2})
+        ids = [item['id'] for item in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [item['id'] for item in res.data['results']]
+
+        self.assertEqual(ids, [r.id for r in reversed(recipes)])
+
+    def test_bulk_created_recipes_searchable(self):
+        """Test recipes written by the bulk endpoint are indexed."""
+        payload = [{'title': 'Lentil soup', 'time_minutes': 5,
+                    'price': '1.00', 'tags': [{'name': 'Winter'}]}]
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        recipe_id = res.data[0]['id']
+        self.assertEqual(self._search('lentils'), [recipe_id])
+        self.assertEqual(self._search('winter'), [recipe_id])
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
@@ -475,3 +1392,303 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, data=payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImageProcessingTests(TestCase):
+    """Tests for background processing of uploaded images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RECIPE_IMAGE_PROCESS_EAGER=True
+        )
+        self.settings_override.enable()
+        self.user = create_user(
+                                email='test@example.com',
+                                password='testpass1234'
+                            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _upload(self, image):
+        """Upload `image` and run the processing job."""
+        url = get_image_upload_url(self.recipe.pk)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image.save(image_file, format='JPEG', exif=image.getexif())
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': image_file},
+                                       format='multipart')
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_upload_is_queued(self):
+        """Test the upload response reports pending processing."""
+        res = self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], 'pending')
+        self.assertEqual(res.data['images'], {})
+        self.assertIsNotNone(self.recipe.image_status_at)
+
+    def test_variants_generated(self):
+        """Test processing stores progressive JPEG and WebP variants."""
+        self._upload(Image.new('RGB', (600, 300)))
+
+        self.assertEqual(self.recipe.image_status, 'ready')
+        variants = self.recipe.image_variants
+        self.assertEqual(set(variants),
+                         {'full', 'large', 'small', 'thumbnail'})
+        with Image.open(os.path.join(
+                self.media_root, variants['thumbnail']['jpeg'])) as thumb:
+            self.assertEqual(thumb.size, (160, 80))
+            self.assertTrue(thumb.info.get('progressive'))
+        with Image.open(os.path.join(
+                self.media_root, variants['small']['webp'])) as small:
+            self.assertEqual(small.format, 'WEBP')
+            self.assertEqual(small.size, (480, 240))
+
+    def test_orientation_applied_and_metadata_stripped(self):
+        """Test EXIF orientation is applied and EXIF is dropped."""
+        image = Image.new('RGB', (40, 20))
+        exif = image.getexif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise.
+
+        url = get_image_upload_url(self.recipe.pk)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image.save(image_file, format='JPEG', exif=exif)
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'image': image_file},
+                                 format='multipart')
+        self.recipe.refresh_from_db()
+
+        path = self.recipe.image_variants['full']['jpeg']
+        with Image.open(os.path.join(self.media_root, path)) as full:
+            self.assertEqual(full.size, (20, 40))
+            self.assertNotIn('exif', full.info)
+
+    def test_variant_urls_exposed(self):
+        """Test detail and list responses carry variant URLs."""
+        self._upload(Image.new('RGB', (10, 10)))
+
+        detail = self.client.get(get_detail_url(self.recipe.pk))
+        listing = self.client.get(RECIPES_URL)
+
+        self.assertEqual(detail.data['image_status'], 'ready')
+        thumbnail = detail.data['images']['thumbnail']['jpeg']
+        self.assertTrue(thumbnail.startswith('http://testserver/'))
+        self.assertEqual(listing.data[0]['thumbnail'], thumbnail)
+
+    def test_only_stripped_image_exposed(self):
+        """Test responses never link to the upload with its metadata."""
+        image = Image.new('RGB', (10, 10))
+        image.getexif()[0x8825] = {1: 'N'}  # GPS info.
+        res = self._upload(image)
+        self.assertIsNone(res.data['image'])
+
+        detail = self.client.get(get_detail_url(self.recipe.pk))
+
+        self.assertEqual(detail.data['image'],
+                         detail.data['images']['full']['jpeg'])
+        self.assertNotIn(self.recipe.image.name, detail.data['image'])
+
+    def test_partial_variants_deleted(self):
+        """Test variants saved before a processing error are deleted."""
+        render_variants = images.render_variants
+        saved = []
+
+        def fail_third_save(name, content):
+            if len(saved) == 2:
+                raise OSError
+            saved.append(default_storage.save(name, content))
+            return saved[-1]
+
+        def render_failing(file, source_name):
+            with patch.object(images, 'default_storage') as storage:
+                storage.save.side_effect = fail_third_save
+                storage.delete.side_effect = default_storage.delete
+                return render_variants(file, source_name)
+
+        with patch.object(images, 'render_variants', render_failing):
+            with self.assertLogs('recipe.images', level='ERROR'):
+                self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(self.recipe.image_status, 'failed')
+        self.assertEqual(len(saved), 2)
+        for name in saved:
+            self.assertFalse(default_storage.exists(name))
+
+    @patch('recipe.images.render_variants', side_effect=OSError)
+    def test_failed_processing(self, patched_render):
+        """Test a processing error marks the image as failed."""
+        with self.assertLogs('recipe.images', level='ERROR'):
+            self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(self.recipe.image_status, 'failed')
+        self.assertEqual(self.recipe.image_variants, {})
+
+
+class ImageDeduplicationTests(TestCase):
+    """Tests for content-addressed storage of uploaded images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RECIPE_IMAGE_PROCESS_EAGER=True
+        )
+        self.settings_override.enable()
+        self.user = create_user(
+                                email='test@example.com',
+                                password='testpass1234'
+                            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.other_recipe = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (30, 20)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.image_bytes = image_file.read()
+        self.sha256 = hashlib.sha256(self.image_bytes).hexdigest()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _upload(self, recipe, client=None):
+        """Upload the test image to `recipe` and run the processing job."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(self.image_bytes)
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = (client or self.client).post(
+                    get_image_upload_url(recipe.pk),
+                    {'image': image_file},
+                    format='multipart'
+                )
+        recipe.refresh_from_db()
+        return res
+
+    def test_upload_stored_by_content_hash(self):
+        """Test an upload is stored under a path derived from its hash."""
+        res = self._upload(self.recipe)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.sha256, self.sha256)
+        self.assertEqual(blob.ref_count, 1)
+        self.assertEqual(
+            self.recipe.image.name,
+            f'uploads/recipe/{self.sha256[:2]}/{self.sha256[2:4]}/'
+            f'{self.sha256}.jpg'
+        )
+
+    def test_identical_uploads_share_blob(self):
+        """Test uploading the same image twice stores it once."""
+        self._upload(self.recipe)
+        self._upload(self.other_recipe)
+
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(self.recipe.image.name, self.other_recipe.image.name)
+        self.assertEqual(self.other_recipe.image_status, 'ready')
+        self.assertEqual(self.other_recipe.image_variants,
+                         self.recipe.image_variants)
+        directory = os.path.dirname(self.recipe.image.path)
+        self.assertEqual(len(os.listdir(directory)), 2)  # File + variants.
+
+    def test_replace_image_deletes_previous_blob(self):
+        """Test uploading a different image releases the previous one."""
+        self._upload(self.recipe)
+        first = ImageBlob.objects.get()
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (20, 30)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.image_bytes = image_file.read()
+
+        res = self._upload(self.recipe)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(ImageBlob.objects.filter(pk=first.pk).exists())
+        self.assertFalse(default_storage.exists(first.file.name))
+        second = ImageBlob.objects.get()
+        self.assertEqual(self.recipe.image_blob, second)
+        self.assertEqual(second.ref_count, 1)
+
+    def test_reupload_keeps_reference_count(self):
+        """Test re-uploading the same image to a recipe is a no-op."""
+        self._upload(self.recipe)
+        self._upload(self.recipe)
+
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_blob_deleted_with_last_reference(self):
+        """Test a blob and its files go once no recipe uses it."""
+        self._upload(self.recipe)
+        self._upload(self.other_recipe)
+        path = self.recipe.image.path
+        thumbnail = self.recipe.image_variants['thumbnail']['jpeg']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_recipe.delete()
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.media_root, thumbnail))
+        )
+
+    def test_precheck_attaches_existing_blob(self):
+        """Test a known hash attaches the image without an upload."""
+        self._upload(self.recipe)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                get_image_precheck_url(self.other_recipe.pk),
+                {'sha256': self.sha256.upper()}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], 'ready')
+        self.other_recipe.refresh_from_db()
+        self.assertEqual(self.other_recipe.image.name, self.recipe.image.name)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+
+    def test_precheck_unknown_hash(self):
+        """Test an unknown hash asks for an upload."""
+        res = self.client.post(get_image_precheck_url(self.recipe.pk),
+                               {'sha256': self.sha256})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_precheck_ignores_other_users_blobs(self):
+        """Test the pre-check does not match other users' uploads."""
+        other_user = create_user(email='other@example.com',
+                                 password='testpass1234')
+        other_client = APIClient()
+        other_client.force_authenticate(user=other_user)
+        self._upload(create_recipe(user=other_user), client=other_client)
+
+        res = self.client.post(get_image_precheck_url(self.recipe.pk),
+                               {'sha256': self.sha256})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_precheck_invalid_hash(self):
+        """Test a malformed hash is rejected."""
+        res = self.client.post(get_image_precheck_url(self.recipe.pk),
+                               {'sha256': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
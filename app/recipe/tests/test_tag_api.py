@@ -4,11 +4,13 @@ Test tag apis.
 from decimal import Decimal
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Tag, Recipe
-from ..serializers import TagSerializer
+from ..serializers import TagUsageSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
 User = get_user_model()
@@ -66,7 +68,7 @@ class PrivateTagAPITest(TestCase):
         res = self.client.get(TAGS_URL)
 
         tags = Tag.objects.all().order_by('-name')
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagUsageSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
@@ -118,8 +120,9 @@ class PrivateTagAPITest(TestCase):
         params = {'assigned_only': True}
         res = self.client.get(TAGS_URL, data=params)
 
-        s1 = TagSerializer(tag1)
-        s2 = TagSerializer(tag2)
+        tag1.refresh_from_db()
+        s1 = TagUsageSerializer(tag1)
+        s2 = TagUsageSerializer(tag2)
         self.assertIn(s1.data, res.data)
         self.assertNotIn(s2.data, res.data)
 
@@ -136,3 +139,62 @@ class PrivateTagAPITest(TestCase):
         res = self.client.get(TAGS_URL, data=params)
 
         self.assertEqual(len(res.data), 1)
+
+
+class TagAutocompleteTests(TestCase):
+    """Test the `q` autocomplete parameter of the tag list."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'test@example.com',
+            'testpass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_autocomplete_tags(self):
+        """Test tags are suggested by prefix and similarity."""
+        for name in ('Vegan', 'Vegetarian', 'Dessert'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'q': 'vega'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+
+    def test_autocomplete_ignores_pagination(self):
+        """Test suggestions are a plain list even with `page_size`."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'q': 'veg', 'page_size': 5})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.data, list)
+
+    def test_tags_ordered_by_popularity(self):
+        """Test tags can be ordered by how many recipes use them."""
+        rare = Tag.objects.create(user=self.user, name='Rare')
+        common = Tag.objects.create(user=self.user, name='Common')
+        for _ in range(2):
+            create_recipe(user=self.user).tags.add(common)
+        create_recipe(user=self.user).tags.add(rare)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Common', 2), ('Rare', 1)]
+        )
+
+    def test_assigned_only_uses_counter(self):
+        """Test `assigned_only` filters on the counter, without a join."""
+        create_recipe(user=self.user).tags.add(
+            Tag.objects.create(user=self.user, name='Used')
+        )
+        Tag.objects.create(user=self.user, name='Unused')
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(TAGS_URL, {'assigned_only': True})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Used'])
+        self.assertNotIn('core_recipe_tags', ctx.captured_queries[-1]['sql'])
@@ -0,0 +1,31 @@
+"""
+Upload handlers for recipe APIs.
+"""
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Compute the SHA-256 of each uploaded file while it streams in.
+
+    Chunks are passed on untouched, so the handler goes in front of the
+    ones that store the upload. Digests are kept by form field name.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.digests = {}
+        self._hash = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hash.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = self._hash.hexdigest()
+        return None
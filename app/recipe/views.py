@@ -3,58 +3,143 @@ Views for the recipe APIs.
 """
 from rest_framework import viewsets, mixins, status
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.serializers import ModelSerializer
 from rest_framework.decorators import action
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from core.models import Recipe, Tag, Ingredient
+from core.models import ImageBlob, Recipe, Tag, Ingredient
+from core.renderers import CSVRenderer, NDJSONRenderer
+from user.authentication import CachedTokenAuthentication
+from .bulk import RecipeBatch
+from .export import EXPORT_CHUNK_SIZE, iter_recipe_chunks
+from .facets import get_recipe_facets
 from .filters import RecipeFilter, TagFilter, IngredientFilter
+from .images import attach_image_blob
+from .mixins import (
+    CachedListMixin,
+    ConditionalGetMixin,
+    FastListMixin,
+    PrefetchQuerysetMixin,
+    SparseFieldsetMixin,
+    TracedFilterMixin,
+)
+from .uploadhandlers import HashingUploadHandler
 from .serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
+    RecipeExportSerializer,
     RecipeImagesSerializer,
-    TagSerializer,
-    IngredientSerializer
+    RecipeImagePrecheckSerializer,
+    TagUsageSerializer,
+    IngredientUsageSerializer
 )
 
 
-class BaseRecipeAttrViewSet(mixins.ListModelMixin,
+class BaseRecipeAttrViewSet(CachedListMixin,
+                            SparseFieldsetMixin,
+                            PrefetchQuerysetMixin,
+                            TracedFilterMixin,
+                            mixins.ListModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.DestroyModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for user owned recipe attributes."""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     filter_backends = (DjangoFilterBackend,)
+    ordering = '-name'
+    ordering_fields = ('id', 'name', 'recipe_count')
+    autocomplete_query_param = 'q'
+    autocomplete_limit_query_param = 'limit'
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
 
     def get_queryset(self):
         """Return objects for the current user authenticated."""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        return self.prefetch_queryset(queryset.order_by('-name'))
+
+    def is_autocomplete(self):
+        """Return True if the request lists the top matches of `q`."""
+        return (self.action == 'list' and bool(
+            self.request.query_params.get(self.autocomplete_query_param)
+        ))
+
+    def get_autocomplete_limit(self):
+        """Return the number of matches to return."""
+        limit = self.request.query_params.get(
+            self.autocomplete_limit_query_param
+        )
+        if limit is None:
+            return self.autocomplete_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.autocomplete_max_limit:
+            raise ValidationError({self.autocomplete_limit_query_param: [
+                f'Enter a number between 1 and '
+                f'{self.autocomplete_max_limit}.'
+            ]})
+        return limit
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_autocomplete():
+            queryset = queryset[:self.get_autocomplete_limit()]
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # Autocomplete returns a short top-k list, never pages.
+        if self.is_autocomplete():
+            return None
+        return super().paginate_queryset(queryset)
 
     def perform_create(self, serializer):
         """Create a new object"""
         serializer.save(user=self.request.user)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin,
+                    CachedListMixin,
+                    SparseFieldsetMixin,
+                    FastListMixin,
+                    PrefetchQuerysetMixin,
+                    TracedFilterMixin,
+                    viewsets.ModelViewSet):
     """view for manage recipe APIs."""
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    ordering = '-id'
+    ordering_fields = ('id', 'title', 'price', 'time_minutes')
+    bulk_max_items = 10000
+    export_chunk_size = EXPORT_CHUNK_SIZE
+    sparse_fieldset_actions = ('list', 'retrieve', 'export')
+    prefetch_related_fields = {
+        'list': ('tags', 'ingredients'),
+        'retrieve': ('tags', 'ingredients'),
+    }
 
     def get_queryset(self):
         """Return objects for authenticated user."""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user)
+        return self.prefetch_queryset(queryset.order_by('-id'))
 
     def get_serializer_class(self):
         if self.action == 'list':
             return RecipeSerializer
         elif self.action == 'upload_image':
             return RecipeImagesSerializer
+        elif self.action == 'image_precheck':
+            return RecipeImagePrecheckSerializer
+        elif self.action == 'export':
+            return RecipeExportSerializer
 
         return RecipeDetailSerializer
 
@@ -65,6 +150,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """upload an image to recipe."""
+        # Hash the upload as it is parsed, before it is written anywhere.
+        hasher = HashingUploadHandler(request)
+        request.upload_handlers.insert(0, hasher)
         recipe = self.get_object()
         serializer: ModelSerializer = self.get_serializer(
                                                           recipe,
@@ -72,21 +160,115 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                                         )
 
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(image_sha256=hasher.digests.get('image'))
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['POST'], detail=True, url_path='image-precheck')
+    def image_precheck(self, request, pk=None):
+        """Attach an already uploaded image by its SHA-256."""
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Only the user's own uploads match, so the endpoint cannot reveal
+        # which images other users have.
+        blob = ImageBlob.objects.filter(
+            sha256=serializer.validated_data['sha256'],
+            recipes__user=request.user
+        ).first()
+        if blob is None or not attach_image_blob(recipe, blob):
+            return Response({'detail': 'Upload required.'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        serializer = RecipeImagesSerializer(
+            recipe, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """Count the filtered recipes per tag, ingredient, price and time."""
+        def get_response():
+            queryset = self.filter_queryset(self.get_queryset())
+            return Response(get_recipe_facets(queryset, request.user))
+
+        return self.get_cached_response(request, get_response)
+
+    @action(methods=['GET'], detail=False,
+            renderer_classes=(NDJSONRenderer, CSVRenderer))
+    def export(self, request):
+        """Stream the filtered recipes as NDJSON or CSV."""
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        chunks = iter_recipe_chunks(queryset, serializer,
+                                    self.export_chunk_size)
+
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.render_stream(chunks, list(serializer.fields)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{renderer.format}"'
+        )
+        # Let proxies pass chunks through as they are produced.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """
+        Create or update a batch of recipes in one transaction.
+
+        By default the valid items are applied: the response is 200 when
+        every item is valid and 207 with per-item results when some are
+        not. With `atomic=1` any invalid item rejects the whole batch.
+        A batch that writes nothing because of invalid items is a 400.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'non_field_errors': ['Expected a list of recipes.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'non_field_errors': [
+                    f'Ensure this list has no more than '
+                    f'{self.bulk_max_items} recipes.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        atomic = request.query_params.get('atomic') in ('1', 'true')
+        batch = RecipeBatch(items, context=self.get_serializer_context())
+        valid = batch.validate()
+        if not valid and (atomic or not batch.has_valid_items):
+            batch.skip()
+            return Response(batch.results,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        batch.save()
+        if not valid:
+            return Response(batch.results,
+                            status=status.HTTP_207_MULTI_STATUS)
+        return Response(batch.results, status=status.HTTP_200_OK)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags."""
     queryset = Tag.objects.all()
-    serializer_class = TagSerializer
+    serializer_class = TagUsageSerializer
     filterset_class = TagFilter
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients."""
     queryset = Ingredient.objects.all()
-    serializer_class = IngredientSerializer
+    serializer_class = IngredientUsageSerializer
     filterset_class = IngredientFilter
@@ -0,0 +1,270 @@
+"""
+Cached token authentication for the APIs.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from core.tracing import span
+
+DEFAULT_SETTINGS = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE_ALIAS': None,
+    'SHARED_TTL': 300,
+    'ALLOW_LOCAL': False,
+}
+# Sentinel for "read the generation from the shared tier".
+UNKNOWN = object()
+
+
+def build_instance(model, **values):
+    """Return a `model` instance loaded with `values`, the rest deferred."""
+    names = [field.attname for field in model._meta.concrete_fields
+             if field.attname in values]
+    return model.from_db(router.db_for_read(model), names,
+                         [values[name] for name in names])
+
+
+class TokenCache:
+    """
+    Two-tier cache of token key -> (user, token).
+
+    Only the user's pk, `is_active` and `is_staff` are stored, never the
+    user row itself; `get()` rebuilds the user and token as instances
+    whose other fields load from the database on access.
+
+    The first tier is a bounded in-process LRU whose entries expire after
+    `ttl` seconds. The optional second tier is a shared Django cache, so
+    processes can reuse each other's lookups. With the shared tier, each
+    key also has a generation in it that `invalidate()` bumps, and every
+    local hit is checked against it, so a deleted token or deactivated
+    user is rejected by all processes at once, at the cost of one shared
+    cache read per request. Without it, `invalidate()` only reaches the
+    calling process, so the cache is off unless `allow_local` says the
+    API runs in one process.
+    """
+
+    def __init__(self, max_size=10000, ttl=60, shared_alias=None,
+                 shared_ttl=300, allow_local=False):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self.shared_ttl = shared_ttl
+        self.allow_local = allow_local
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ('hits', 'shared_hits', 'misses', 'evictions', 'expirations',
+             'revocations'), 0
+        )
+
+    @classmethod
+    def from_settings(cls):
+        """Build the cache from the `TOKEN_AUTH_CACHE` setting."""
+        options = dict(DEFAULT_SETTINGS)
+        options.update(getattr(settings, 'TOKEN_AUTH_CACHE', {}))
+        return cls(
+            max_size=options['MAX_SIZE'],
+            ttl=options['TTL'],
+            shared_alias=options['SHARED_CACHE_ALIAS'],
+            shared_ttl=options['SHARED_TTL'],
+            allow_local=options['ALLOW_LOCAL'],
+        )
+
+    @property
+    def enabled(self):
+        """Return True if lookups may be cached."""
+        return self.shared_alias is not None or self.allow_local
+
+    @property
+    def shared(self):
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
+
+    @staticmethod
+    def _shared_key(key, kind='entry'):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return f'authtoken:{kind}:{digest}'
+
+    @staticmethod
+    def _pack(value):
+        user, _ = value
+        return (user.pk, user.is_active, user.is_staff)
+
+    @staticmethod
+    def _unpack(key, packed):
+        user_id, is_active, is_staff = packed
+        user = build_instance(get_user_model(), id=user_id,
+                              is_active=is_active, is_staff=is_staff)
+        token = build_instance(Token, key=key, user_id=user_id)
+        return user, token
+
+    def _count(self, counter):
+        self._counters[counter] += 1
+
+    def get_generation(self, key):
+        """Return the shared generation of `key`, or None without one."""
+        shared = self.shared
+        if shared is None:
+            return None
+        generation_key = self._shared_key(key, 'gen')
+        generation = shared.get(generation_key)
+        if generation is None:
+            # Seed from the clock so an evicted generation never restarts
+            # at a number an older entry was stored under.
+            shared.add(generation_key, time.time_ns() // 1000, timeout=None)
+            generation = shared.get(generation_key)
+        return generation
+
+    def _bump_generations(self, keys):
+        shared = self.shared
+        for key in keys:
+            generation_key = self._shared_key(key, 'gen')
+            try:
+                shared.incr(generation_key)
+            except ValueError:
+                shared.add(generation_key, time.time_ns() // 1000,
+                           timeout=None)
+
+    def _get_local(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, stored_generation, packed = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self._count('expirations')
+                return None
+            if stored_generation != generation:
+                del self._entries[key]
+                self._count('revocations')
+                return None
+            self._entries.move_to_end(key)
+            self._count('hits')
+            return packed
+
+    def _set_local(self, key, packed, generation):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, generation,
+                                  packed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._count('evictions')
+
+    def get(self, key, generation=UNKNOWN):
+        """
+        Return the cached `(user, token)` pair, or None.
+
+        `generation` is the result of `get_generation(key)` when the
+        caller already read it.
+        """
+        if generation is UNKNOWN:
+            generation = self.get_generation(key)
+        packed = self._get_local(key, generation)
+        if packed is None and self.shared is not None:
+            entry = self.shared.get(self._shared_key(key))
+            if entry is not None and entry[0] == generation:
+                packed = entry[1]
+                with self._lock:
+                    self._count('shared_hits')
+                self._set_local(key, packed, generation)
+        if packed is None:
+            with self._lock:
+                self._count('misses')
+            return None
+        return self._unpack(key, packed)
+
+    def set(self, key, value, generation=UNKNOWN):
+        """
+        Cache the `(user, token)` pair of `key` in both tiers.
+
+        Pass the generation read before the pair was loaded, so a pair
+        invalidated in the meantime is never cached as current.
+        """
+        if generation is UNKNOWN:
+            generation = self.get_generation(key)
+        packed = self._pack(value)
+        self._set_local(key, packed, generation)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), (generation, packed),
+                            self.shared_ttl)
+
+    def invalidate(self, *keys):
+        """Drop `keys` from both tiers and from other processes' tier."""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.shared is not None and keys:
+            self._bump_generations(keys)
+            self.shared.delete_many([self._shared_key(key) for key in keys])
+
+    def invalidate_user(self, user_id, keys=()):
+        """Drop every cached token of a user, plus `keys`."""
+        with self._lock:
+            local_keys = [
+                key for key, (_, _, packed) in self._entries.items()
+                if packed[0] == user_id
+            ]
+        self.invalidate(*set(local_keys) | set(keys))
+
+    def clear(self):
+        """Drop every local entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            for counter in self._counters:
+                self._counters[counter] = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['max_size'] = self.max_size
+        stats['hit_ratio'] = (
+            (stats['hits'] + stats['shared_hits']) / lookups
+            if lookups else 0.0
+        )
+        return stats
+
+
+token_cache = TokenCache.from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in `TokenAuthentication` that caches the token -> user lookup.
+
+    Only successful lookups are cached, so unknown or inactive tokens
+    always reach the database. Entries are invalidated when a token is
+    deleted or its user is saved (see `user.signals`). Users from the
+    cache have only `id`, `is_active` and `is_staff` loaded. Nothing is
+    cached while `TokenCache.enabled` is false.
+    """
+    cache = token_cache
+
+    def authenticate(self, request):
+        with span('auth', {'auth.scheme': self.keyword}):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.cache.enabled:
+            return super().authenticate_credentials(key)
+        generation = self.cache.get_generation(key)
+        cached = self.cache.get(key, generation)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        self.cache.set(key, (user, token), generation)
+        return user, token
@@ -0,0 +1,31 @@
+"""
+System checks for user APIs.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+from .authentication import token_cache
+
+
+@register()
+def check_token_cache(app_configs, **kwargs):
+    """Warn when the token cache is off or cannot reach other processes."""
+    if not token_cache.enabled:
+        return [Warning(
+            'The token authentication cache is disabled: without a shared '
+            'cache, revoked tokens would stay valid in other workers.',
+            hint="Set TOKEN_AUTH_CACHE['SHARED_CACHE_ALIAS'] "
+                 '(TOKEN_AUTH_SHARED_CACHE) or TOKEN_AUTH_CACHE_ALLOW_LOCAL '
+                 'when running a single process.',
+            id='user.W001',
+        )]
+    if token_cache.shared_alias is not None and isinstance(
+            caches[token_cache.shared_alias], LocMemCache):
+        return [Warning(
+            'The shared token cache '
+            f'{token_cache.shared_alias!r} is local to each process, so '
+            'revoked tokens stay valid in other workers until they expire.',
+            hint='Point SHARED_CACHE_ALIAS at a cache shared by all workers.',
+            id='user.W002',
+        )]
+    return []
@@ -0,0 +1,26 @@
+"""
+Signal handlers for the user API.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached tokens so deactivation and edits apply at once."""
+    if created:
+        return
+    keys = ()
+    if token_cache.shared is not None:
+        keys = Token.objects.filter(user=instance).values_list(
+            'key', flat=True
+        )
+    token_cache.invalidate_user(instance.pk, keys)
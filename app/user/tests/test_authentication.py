@@ -0,0 +1,250 @@
+"""
+Test cached token authentication.
+"""
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.exceptions import AuthenticationFailed
+from ..authentication import (
+    CachedTokenAuthentication,
+    TokenCache,
+    token_cache,
+)
+from ..checks import check_token_cache
+
+TOKEN_DISCARD_URL = reverse('user:token-discard')
+TOKEN_CACHE_STATS_URL = reverse('user:token-cache-stats')
+ME_URL = reverse('user:me')
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the token -> user lookup cache on API requests."""
+
+    def setUp(self):
+        token_cache.clear()
+        allow_local = patch.object(token_cache, 'allow_local', True)
+        allow_local.start()
+        self.addCleanup(allow_local.stop)
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass1234',
+            name='Test Name'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_cached_lookup_skips_database(self):
+        """Test a second request authenticates without a token query."""
+        self.client.get(ME_URL)
+
+        # The profile itself is still read from the database.
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], 'test@example.com')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('authtoken_token', ctx.captured_queries[0]['sql'])
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_disabled_without_shared_tier(self):
+        """Test nothing is cached without a shared tier or opt-in."""
+        token_cache.allow_local = False
+        self.client.get(ME_URL)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('authtoken_token', ctx.captured_queries[0]['sql'])
+        self.assertEqual(token_cache.stats()['size'], 0)
+        self.assertEqual([error.id for error in check_token_cache(None)],
+                         ['user.W001'])
+
+    def test_discard_reaches_other_processes(self):
+        """Test a token discarded in one process is rejected by another."""
+        other_process = CachedTokenAuthentication()
+        other_process.cache = TokenCache(shared_alias='default')
+        with patch.object(token_cache, 'shared_alias', 'default'):
+            self.client.get(ME_URL)
+            other_process.authenticate_credentials(self.token.key)
+            self.assertIsNotNone(other_process.cache.get(self.token.key))
+
+            self.client.post(TOKEN_DISCARD_URL)
+
+        with self.assertRaises(AuthenticationFailed):
+            other_process.authenticate_credentials(self.token.key)
+
+    def test_discarded_token_rejected(self):
+        """Test a discarded token is rejected even if it was cached."""
+        self.client.get(ME_URL)
+        self.client.post(TOKEN_DISCARD_URL)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates their cached token."""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_visible(self):
+        """Test a profile update is not masked by the cached user."""
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'New Name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New Name')
+
+    def test_invalid_token_not_cached(self):
+        """Test failed lookups are not cached."""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        self.client.get(ME_URL)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_stats_require_admin(self):
+        """Test only staff users can read the cache counters."""
+        res = self.client.get(TOKEN_CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(TOKEN_CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('hit_ratio', res.data)
+
+
+class TokenCacheTests(TestCase):
+    """Test the token cache tiers."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass1234'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first."""
+        token_cache = TokenCache(max_size=2)
+        token_cache.set('a', (self.user, self.token))
+        token_cache.set('b', (self.user, self.token))
+        token_cache.get('a')
+        token_cache.set('c', (self.user, self.token))
+
+        self.assertIsNone(token_cache.get('b'))
+        self.assertIsNotNone(token_cache.get('a'))
+        self.assertEqual(token_cache.stats()['evictions'], 1)
+
+    @patch('user.authentication.time.monotonic')
+    def test_ttl_expiry(self, patched_monotonic):
+        """Test entries expire after the TTL."""
+        patched_monotonic.return_value = 100
+        token_cache = TokenCache(ttl=60)
+        token_cache.set('a', (self.user, self.token))
+
+        patched_monotonic.return_value = 161
+
+        self.assertIsNone(token_cache.get('a'))
+        self.assertEqual(token_cache.stats()['expirations'], 1)
+
+    def test_returns_copies(self):
+        """Test callers never receive the cached instances."""
+        token_cache = TokenCache()
+        token_cache.set('a', (self.user, self.token))
+
+        user, _ = token_cache.get('a')
+        user.name = 'Changed'
+
+        self.assertNotEqual(token_cache.get('a')[0].name, 'Changed')
+
+    def test_shared_tier(self):
+        """Test a process reuses lookups stored by another process."""
+        first = TokenCache(shared_alias='default')
+        second = TokenCache(shared_alias='default')
+        first.set(self.token.key, (self.user, self.token))
+
+        user, token = second.get(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(second.stats()['shared_hits'], 1)
+
+        first.invalidate(self.token.key)
+        self.assertIsNone(second.get(self.token.key))
+
+    def test_shared_tier_stores_no_user_row(self):
+        """Test only the pk and flags of the user are cached."""
+        token_cache = TokenCache(shared_alias='default')
+        token_cache.set(self.token.key, (self.user, self.token))
+
+        generation, packed = cache.get(
+            TokenCache._shared_key(self.token.key)
+        )
+        self.assertEqual(generation, token_cache.get_generation(
+            self.token.key
+        ))
+        self.assertEqual(packed, (self.user.pk, True, False))
+
+        user, token = token_cache.get(self.token.key)
+        self.assertEqual(user.get_deferred_fields() & {'password'},
+                         {'password'})
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(token.user_id, self.user.pk)
+
+    def test_invalidation_reaches_other_processes(self):
+        """Test local entries of other processes are revoked at once."""
+        first = TokenCache(shared_alias='default')
+        second = TokenCache(shared_alias='default')
+        first.set(self.token.key, (self.user, self.token))
+        self.assertIsNotNone(second.get(self.token.key))
+        self.assertIsNotNone(first.get(self.token.key))
+
+        second.invalidate(self.token.key)
+
+        self.assertIsNone(first.get(self.token.key))
+        self.assertEqual(first.stats()['revocations'], 1)
+
+    def test_deactivation_reaches_other_processes(self):
+        """Test deactivating a user revokes other processes' entries."""
+        other_process = TokenCache(shared_alias='default')
+        other_process.set(self.token.key, (self.user, self.token))
+
+        with patch.object(token_cache, 'shared_alias', 'default'):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertIsNone(other_process.get(self.token.key))
+
+    def test_stale_lookup_not_cached(self):
+        """Test a pair read before an invalidation is not served."""
+        token_cache = TokenCache(shared_alias='default')
+        generation = token_cache.get_generation(self.token.key)
+        token_cache.invalidate(self.token.key)
+
+        token_cache.set(self.token.key, (self.user, self.token), generation)
+
+        self.assertIsNone(token_cache.get(self.token.key))
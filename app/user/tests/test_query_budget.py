@@ -0,0 +1,102 @@
+"""
+Test the query budgets of the user APIs.
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.models import Recipe
+from core.querybudget import QueryBudgetMixin
+from ..authentication import token_cache
+
+ME_URL = reverse('user:me')
+User = get_user_model()
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test user routes run a bounded number of queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass1234',
+            name='Test Name',
+            is_staff=True
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+        self.created = 0
+
+    def cold(self, request):
+        """Return `request` sent with an empty token cache."""
+        def send():
+            token_cache.clear()
+            res = request()
+            self.assertLess(res.status_code, 400, res.data)
+            return res
+        return send
+
+    def grow_recipes(self, size):
+        """Give the user `size` more recipes."""
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'Recipe {self.created + n}',
+                   time_minutes=5, price=Decimal('1.00'))
+            for n in range(size)
+        ])
+        self.created += size
+
+    def test_me(self):
+        """Test the profile costs the same for users with more recipes."""
+        self.assertQueryBudget(
+            'user:me', 'GET', self.cold(lambda: self.client.get(ME_URL)),
+            self.grow_recipes
+        )
+        self.assertQueryBudget(
+            'user:me', 'PATCH',
+            self.cold(lambda: self.client.patch(ME_URL, {'name': 'New'})),
+            self.grow_recipes
+        )
+
+    def test_token_cache_stats(self):
+        """Test the token cache stats are served from memory."""
+        self.assertQueryBudget(
+            'user:token-cache-stats', 'GET',
+            self.cold(lambda: self.client.get(
+                reverse('user:token-cache-stats')
+            ))
+        )
+
+    def test_token_create_and_discard(self):
+        """Test creating and discarding a token."""
+        client = APIClient()
+        payload = {'email': 'test@example.com', 'password': 'testpass1234'}
+
+        self.assertQueryBudget(
+            'user:token-create', 'POST',
+            lambda: client.post(reverse('user:token-create'), payload),
+            self.grow_recipes
+        )
+        self.assertQueryBudget(
+            'user:token-discard', 'POST',
+            self.cold(lambda: self.client.post(
+                reverse('user:token-discard')
+            ))
+        )
+
+    def test_create(self):
+        """Test creating a user."""
+        res, = self.assertQueryBudget(
+            'user:create', 'POST',
+            lambda: APIClient().post(reverse('user:create'), {
+                'email': 'new@example.com',
+                'password': 'testpass1234',
+                'name': 'New',
+            })
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
@@ -14,5 +14,8 @@ urlpatterns = [
     path('token/discard/',
          views.DiscardTokenAPIView.as_view(),
          name='token-discard'),
+    path('token/cache-stats/',
+         views.TokenCacheStatsAPIView.as_view(),
+         name='token-cache-stats'),
     path('me/', views.ManageUserAPIView.as_view(), name='me'),
 ]
@@ -1,14 +1,15 @@
 """
 Views for the user API.
 """
+from django.contrib.auth import get_user_model
 from rest_framework.views import Response, APIView
 from rest_framework.generics import CreateAPIView, RetrieveUpdateAPIView
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status
 from .serializers import UserSerializer, AuthTokenSerializer
-from rest_framework.authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication, token_cache
 
 
 class CreateUserAPIView(CreateAPIView):
@@ -25,7 +26,7 @@ class CreateTokenAPIView(ObtainAuthToken):
 
 class DiscardTokenAPIView(APIView):
     """Discard auth token if user is authenticated"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -33,11 +34,24 @@ class DiscardTokenAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class TokenCacheStatsAPIView(APIView):
+    """Report token cache counters to size it."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache.stats())
+
+
 class ManageUserAPIView(RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        # Users from the token cache have only a few fields loaded.
+        if user.get_deferred_fields():
+            user = get_user_model().objects.get(pk=user.pk)
+        return user